@@ -1,10 +1,20 @@
+import hashlib
+import json
 from enum import Enum
 from typing import Any, Callable, List, Optional, Tuple, Type
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_init, post_save
 from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.translation import get_language
 from ninja import Schema
 
 from common.api import *
+from takahe.db_routes import use_primary
 
 from .common import *
 from .models import *
@@ -27,6 +37,155 @@ class SearchResult(Schema):
     count: int
 
 
+# bump version when item schemas are changed
+_ITEM_DOC_CACHE_KEY = "item_api:v1:{}:{}"
+_ITEM_DOC_CACHE_TIMEOUT = 86400
+
+_ITEM_SCHEMAS: dict[type[Item], type[Schema]] = {
+    Edition: EditionSchema,
+    Movie: MovieSchema,
+    TVShow: TVShowSchema,
+    TVSeason: TVSeasonSchema,
+    TVEpisode: TVEpisodeSchema,
+    Podcast: PodcastSchema,
+    Album: AlbumSchema,
+    Game: GameSchema,
+    Performance: PerformanceSchema,
+    PerformanceProduction: PerformanceProductionSchema,
+}
+
+
+def _get_item_schema(item: Item) -> type[Schema]:
+    return _ITEM_SCHEMAS.get(item.__class__, ItemSchema)
+
+
+def _get_item_doc_cache_key(uuid: str) -> str | None:
+    """
+    cache key of serialized item in current language, as localized title and
+    description differ by language; None if the language is not cacheable
+    """
+    lang = get_language()
+    if lang not in dict(settings.LANGUAGES):
+        return None
+    return _ITEM_DOC_CACHE_KEY.format(lang, uuid)
+
+
+def _get_item_doc_cache_keys(uuid: str) -> list[str]:
+    return [_ITEM_DOC_CACHE_KEY.format(lang, uuid) for lang, _ in settings.LANGUAGES]
+
+
+def _build_item_doc(item: Item, cached: bool = True) -> dict[str, Any]:
+    """
+    serialized item with its etag and last modified time, it's cached until the item,
+    its parent or child items, external resources or rating summary is changed;
+    last modified time is when it's built, as content may come from any of them.
+
+    item should be loaded in use_primary() if cached is True, so that data from a
+    lagging replica is not cached after the cache is cleared.
+    """
+    data = _get_item_schema(item).from_orm(item).model_dump(mode="json")
+    content = json.dumps(data, sort_keys=True).encode()
+    doc = {
+        "class": item.__class__.__name__,
+        "data": data,
+        "etag": f'"{hashlib.sha1(content).hexdigest()}"',
+        "last_modified": timezone.now().timestamp(),
+    }
+    key = _get_item_doc_cache_key(item.uuid) if cached else None
+    if key:
+        cache.set(key, doc, timeout=_ITEM_DOC_CACHE_TIMEOUT)
+    return doc
+
+
+def get_item_docs(items: list[Item]) -> list[dict[str, Any]]:
+    """
+    serialized items, loaded from cache if available;
+    items not cached are reloaded from primary database before building and caching,
+    as they may come from a replica not yet updated after the cache was cleared
+    """
+    keys = [_get_item_doc_cache_key(i.uuid) for i in items]
+    docs = cache.get_many([k for k in keys if k])
+    missing = [
+        i
+        for key, i in zip(keys, items)
+        if not (key in docs and docs[key]["class"] == i.__class__.__name__)
+    ]
+    built = {}
+    if missing:
+        with use_primary():
+            reloaded = Item.objects.filter(
+                pk__in=[i.pk for i in missing]
+            ).prefetch_related("external_resources")
+            built = {i.pk: _build_item_doc(i) for i in reloaded}
+    return [
+        (
+            docs[key]
+            if key in docs and docs[key]["class"] == i.__class__.__name__
+            else built.get(i.pk) or _build_item_doc(i, cached=False)
+        )["data"]
+        for key, i in zip(keys, items)
+    ]
+
+
+def clear_item_doc_cache(*item_pks: int):
+    items = Item.objects.filter(pk__in=item_pks).non_polymorphic().only("uid")
+    cache.delete_many([k for i in items for k in _get_item_doc_cache_keys(i.uuid)])
+
+
+def _get_related_item_ids(instance) -> set[int]:
+    # parent item may embed data of child items, e.g. TVSeasonSchema.episode_uuids
+    return {
+        instance.__dict__.get(f.attname)
+        for f in instance._meta.concrete_fields
+        if f.is_relation
+        and not f.remote_field.parent_link
+        and f.name != "merged_to_item"
+        and issubclass(f.related_model, Item)
+    } - {None}
+
+
+def _item_loaded_handler(sender, instance, **kwargs):
+    instance._api_related_item_ids = _get_related_item_ids(instance)
+
+
+def _item_changed_handler(sender, instance, **kwargs):
+    cache.delete_many(_get_item_doc_cache_keys(instance.uuid))
+    # clear both old and new parent items, in case it's moved to another parent
+    related_ids = getattr(instance, "_api_related_item_ids", set())
+    instance._api_related_item_ids = _get_related_item_ids(instance)
+    related_ids |= instance._api_related_item_ids
+    if related_ids:
+        clear_item_doc_cache(*related_ids)
+
+
+def _item_related_changed_handler(sender, instance, **kwargs):
+    if instance.item_id:
+        clear_item_doc_cache(instance.item_id)
+
+
+def init_catalog_api_cache():
+    for cls in Item.__subclasses__():
+        post_init.connect(_item_loaded_handler, sender=cls)
+        post_save.connect(_item_changed_handler, sender=cls)
+        post_delete.connect(_item_changed_handler, sender=cls)
+    for model in [ExternalResource, "journal.RatingSummary"]:
+        post_save.connect(_item_related_changed_handler, sender=model)
+        post_delete.connect(_item_related_changed_handler, sender=model)
+
+
+def _item_doc_response(request, doc: dict[str, Any]) -> HttpResponse:
+    etag = doc["etag"]
+    last_modified = int(doc["last_modified"])
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(
+            json.dumps(doc["data"]), content_type="application/json; charset=utf-8"
+        )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
 class SearchableItemCategory(Enum):
     Book = "book"
     Movie = "movie"
@@ -66,7 +225,10 @@ def search_item(
         categories=categories,
         prepare_external=False,
     )
-    return 200, {"data": items, "pages": num_pages, "count": count}
+    data = {"data": get_item_docs(items), "pages": num_pages, "count": count}
+    return HttpResponse(
+        json.dumps(data), content_type="application/json; charset=utf-8"
+    )
 
 
 @api.get(
@@ -96,19 +258,24 @@ def fetch_item(request, url: str):
     return 202, {"message": "Fetch in progress"}
 
 
-def _get_item(cls, uuid, response):
-    item = Item.get_by_url(uuid)
-    if not item:
-        return 404, {"message": "Item not found"}
-    if item.merged_to_item:
-        response["Location"] = item.merged_to_item.api_url
-        return 302, {"message": "Item merged", "url": item.merged_to_item.api_url}
-    if item.is_deleted:
-        return 404, {"message": "Item not found"}
-    if item.__class__ != cls:
-        response["Location"] = item.api_url
-        return 302, {"message": "Item recasted", "url": item.api_url}
-    return item
+def _get_item(cls, uuid, request, response):
+    key = _get_item_doc_cache_key(uuid)
+    doc = cache.get(key) if key else None
+    if doc and doc["class"] == cls.__name__:
+        return _item_doc_response(request, doc)
+    with use_primary():
+        item = Item.get_by_url(uuid)
+        if not item:
+            return 404, {"message": "Item not found"}
+        if item.merged_to_item:
+            response["Location"] = item.merged_to_item.api_url
+            return 302, {"message": "Item merged", "url": item.merged_to_item.api_url}
+        if item.is_deleted:
+            return 404, {"message": "Item not found"}
+        if item.__class__ != cls:
+            response["Location"] = item.api_url
+            return 302, {"message": "Item recasted", "url": item.api_url}
+        return _item_doc_response(request, _build_item_doc(item))
 
 
 @api.get(
@@ -118,7 +285,7 @@ def _get_item(cls, uuid, response):
     tags=["catalog"],
 )
 def get_book(request, uuid: str, response: HttpResponse):
-    return _get_item(Edition, uuid, response)
+    return _get_item(Edition, uuid, request, response)
 
 
 @api.get(
@@ -128,7 +295,7 @@ def get_book(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_movie(request, uuid: str, response: HttpResponse):
-    return _get_item(Movie, uuid, response)
+    return _get_item(Movie, uuid, request, response)
 
 
 @api.get(
@@ -138,7 +305,7 @@ def get_movie(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_tv_show(request, uuid: str, response: HttpResponse):
-    return _get_item(TVShow, uuid, response)
+    return _get_item(TVShow, uuid, request, response)
 
 
 @api.get(
@@ -148,7 +315,7 @@ def get_tv_show(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_tv_season(request, uuid: str, response: HttpResponse):
-    return _get_item(TVSeason, uuid, response)
+    return _get_item(TVSeason, uuid, request, response)
 
 
 @api.get(
@@ -158,7 +325,7 @@ def get_tv_season(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_tv_episode(request, uuid: str, response: HttpResponse):
-    return _get_item(TVEpisode, uuid, response)
+    return _get_item(TVEpisode, uuid, request, response)
 
 
 @api.get(
@@ -168,7 +335,7 @@ def get_tv_episode(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_podcast(request, uuid: str, response: HttpResponse):
-    return _get_item(Podcast, uuid, response)
+    return _get_item(Podcast, uuid, request, response)
 
 
 @api.get(
@@ -178,7 +345,7 @@ def get_podcast(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_album(request, uuid: str, response: HttpResponse):
-    return _get_item(Album, uuid, response)
+    return _get_item(Album, uuid, request, response)
 
 
 @api.get(
@@ -188,7 +355,7 @@ def get_album(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_game(request, uuid: str, response: HttpResponse):
-    return _get_item(Game, uuid, response)
+    return _get_item(Game, uuid, request, response)
 
 
 @api.get(
@@ -198,7 +365,7 @@ def get_game(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_performance(request, uuid: str, response: HttpResponse):
-    return _get_item(Performance, uuid, response)
+    return _get_item(Performance, uuid, request, response)
 
 
 @api.get(
@@ -208,4 +375,4 @@ def get_performance(request, uuid: str, response: HttpResponse):
     tags=["catalog"],
 )
 def get_performance_production(request, uuid: str, response: HttpResponse):
-    return _get_item(PerformanceProduction, uuid, response)
+    return _get_item(PerformanceProduction, uuid, request, response)
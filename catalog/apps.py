@@ -8,7 +8,11 @@ class CatalogConfig(AppConfig):
     def ready(self):
         # load key modules in proper order, make sure class inject and signal works as expected
         from catalog import api, models, sites
-        from catalog.models import init_catalog_audit_log, init_catalog_search_models
+        from catalog.models import (
+            init_catalog_audit_log,
+            init_catalog_search_models,
+            init_catalog_thumbnails,
+        )
         from journal import models as journal_models
 
         # register cron jobs
@@ -16,3 +20,5 @@ class CatalogConfig(AppConfig):
 
         init_catalog_search_models()
         init_catalog_audit_log()
+        init_catalog_thumbnails()
+        api.init_catalog_api_cache()
@@ -7,6 +7,7 @@ a Site may scrape a url and store result in ResourceContent
 ResourceContent persists as an ExternalResource which may link to an Item
 """
 
+import hashlib
 import json
 import re
 from dataclasses import dataclass, field
@@ -14,6 +15,7 @@ from typing import Any, Callable, Type, TypeVar
 
 import django_rq
 import requests
+from django.core.cache import cache
 from loguru import logger
 from validators import url as url_validate
 
@@ -269,9 +271,66 @@ class AbstractSite:
 
 T = TypeVar("T", bound=AbstractSite)
 
+_PATTERN_HOST = re.compile(r"^\^?[^/]*://([^/]+)/")
+_LITERAL_HOST = re.compile(r"^[a-z0-9\-]+(\.[a-z0-9\-]+)+$")
+_URL_HOST = re.compile(r"^[^:/?#]*://([^/?#:@]+)")
+_FALLBACK_MISS_CACHE_TIMEOUT = 3600
+_validate_url = AbstractSite.validate_url.__func__  # type:ignore
+
+
+class SiteDispatcher:
+    """
+    Match url to site class in the same order as iterating the site registry,
+    URL_PATTERNS with a literal hostname are indexed by hostname and compiled into one regex per host,
+    other patterns or sites with custom validate_url() are checked one by one
+    """
+
+    def __init__(self, sites: list[type[AbstractSite]]):
+        self.sites = sites
+        self.generic_sites: list[int] = []
+        host_patterns: dict[str, list[str]] = {}
+        for idx, site in enumerate(sites):
+            if getattr(site.validate_url, "__func__", None) is not _validate_url:
+                self.generic_sites.append(idx)
+                continue
+            for n, pattern in enumerate(site.URL_PATTERNS):
+                host = self.get_pattern_host(pattern)
+                if host:
+                    host_patterns.setdefault(host, []).append(
+                        f"(?P<s{idx}_{n}>{pattern})"
+                    )
+                elif idx not in self.generic_sites:
+                    self.generic_sites.append(idx)
+        self.host_regex = {h: re.compile("|".join(p)) for h, p in host_patterns.items()}
+
+    @staticmethod
+    def get_pattern_host(pattern: str) -> str | None:
+        m = _PATTERN_HOST.match(pattern)
+        if not m:
+            return None
+        host = m[1].replace("\\.", ".").replace("\\-", "-")
+        return host if _LITERAL_HOST.match(host) else None
+
+    def match(self, url: str) -> type[AbstractSite] | None:
+        matched = len(self.sites)
+        m = _URL_HOST.match(url)
+        host_regex = self.host_regex.get(m[1].lower()) if m else None
+        if host_regex:
+            m = host_regex.match(url)
+            if m and m.lastgroup:
+                matched = int(m.lastgroup[1:].split("_")[0])
+        for idx in self.generic_sites:
+            if idx >= matched:
+                break
+            if self.sites[idx].validate_url(url):
+                matched = idx
+                break
+        return self.sites[matched] if matched < len(self.sites) else None
+
 
 class SiteManager:
     registry = {}
+    _dispatcher: SiteDispatcher | None = None
 
     @staticmethod
     def register(target: Type[T]) -> Type[T]:
@@ -279,6 +338,7 @@ class SiteManager:
         if id_type in SiteManager.registry:
             raise ValueError(f"Site for {id_type} already exists")
         SiteManager.registry[id_type] = target
+        SiteManager._dispatcher = None
         return target
 
     @staticmethod
@@ -288,38 +348,50 @@ class SiteManager:
         else:
             raise ValueError(f"Site for {typ} not found")
 
+    @staticmethod
+    def get_site_cls_by_url(url: str) -> type[AbstractSite] | None:
+        """find site by URL_PATTERNS only, without network fallback"""
+        if SiteManager._dispatcher is None:
+            SiteManager._dispatcher = SiteDispatcher(
+                list(SiteManager.registry.values())
+            )
+        return SiteManager._dispatcher.match(url)
+
+    @staticmethod
+    def get_site_cls_by_url_fallback(url: str) -> type[AbstractSite] | None:
+        """find site by validate_url_fallback(), which may access network, so misses are cached"""
+        cache_key = "site_fallback_miss:" + hashlib.md5(url.encode()).hexdigest()
+        if cache.get(cache_key):
+            return None
+        cls = next(
+            filter(
+                lambda p: p.validate_url_fallback(url),
+                SiteManager.registry.values(),
+            ),
+            None,
+        )
+        if cls is None:
+            cache.set(cache_key, 1, timeout=_FALLBACK_MISS_CACHE_TIMEOUT)
+        return cls
+
     @staticmethod
     def get_site_by_url(url: str) -> AbstractSite | None:
         if not url or not url_validate(
             url, skip_ipv6_addr=True, skip_ipv4_addr=True, may_have_port=False
         ):
             return None
-        cls = next(
-            filter(lambda p: p.validate_url(url), SiteManager.registry.values()), None
-        )
+        cls = SiteManager.get_site_cls_by_url(url)
         if cls is None and re.match(r"^https?://(spotify.link|t.co).+", url):
             try:
                 url2 = requests.head(url, allow_redirects=True, timeout=1).url
                 if url2 != url:
-                    cls = next(
-                        filter(
-                            lambda p: p.validate_url(url2),
-                            SiteManager.registry.values(),
-                        ),
-                        None,
-                    )
+                    cls = SiteManager.get_site_cls_by_url(url2)
                     if cls:
                         url = url2
             except Exception:
                 pass
         if cls is None:
-            cls = next(
-                filter(
-                    lambda p: p.validate_url_fallback(url),
-                    SiteManager.registry.values(),
-                ),
-                None,
-            )
+            cls = SiteManager.get_site_cls_by_url_fallback(url)
         return cls(url) if cls else None
 
     @staticmethod
@@ -13,3 +13,22 @@ class CommonTestCase(TestCase):
         self.assertEqual(lang, "zh-cn")
         lang = detect_language("巫师3：狂猎 The Witcher 3: Wild Hunt")
         self.assertEqual(lang, "zh-cn")
+
+
+class SiteDispatcherTestCase(TestCase):
+    def test_dispatch(self):
+        from catalog.common.sites import SiteManager
+        from catalog.sites import IMDB, RSS, DoubanBook, Goodreads
+
+        sites = list(SiteManager.registry.values())
+        for url, site in [
+            ("https://www.imdb.com/title/tt0436992/", IMDB),
+            ("https://book.douban.com/subject/35902899/", DoubanBook),
+            ("https://www.goodreads.com/book/show/77566", Goodreads),
+            ("https://anchor.fm/s/64d6bbe0/podcast/rss", RSS),
+            ("https://www.imdb.com/name/nm0000001/", None),
+        ]:
+            self.assertEqual(SiteManager.get_site_cls_by_url(url), site)
+            self.assertEqual(
+                next(filter(lambda p: p.validate_url(url), sites), None), site
+            )
@@ -3,7 +3,7 @@ from datetime import timedelta
 
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models import Count, F, Q
+from django.db.models import Count, F, Q, Sum
 from django.utils import timezone
 from loguru import logger
 
@@ -14,8 +14,8 @@ from common.models.lang import PREFERRED_LOCALES
 from journal.models import (
     Collection,
     Comment,
+    ItemMarkCount,
     Review,
-    ShelfMember,
     TagManager,
     q_item_in_category,
 )
@@ -35,12 +35,10 @@ class DiscoverGenerator(BaseJob):
 
     def get_popular_marked_item_ids(self, category, days, exisiting_ids):
         qs = (
-            ShelfMember.objects.filter(q_item_in_category(category))
-            .filter(created_time__gt=timezone.now() - timedelta(days=days))
+            ItemMarkCount.recent(days)
+            .filter(category=category)
             .exclude(item_id__in=exisiting_ids)
         )
-        if settings.DISCOVER_SHOW_LOCAL_ONLY:
-            qs = qs.filter(local=True)
         if settings.DISCOVER_FILTER_LANGUAGE:
             q = None
             for loc in PREFERRED_LOCALES:
@@ -50,10 +48,11 @@ class DiscoverGenerator(BaseJob):
                     q = Q(item__metadata__localized_title__contains=[{"lang": loc}])
             if q:
                 qs = qs.filter(q)
+        count_field = "local_count" if settings.DISCOVER_SHOW_LOCAL_ONLY else "count"
         item_ids = [
             m["item_id"]
             for m in qs.values("item_id")
-            .annotate(num=Count("item_id"))
+            .annotate(num=Sum(count_field))
             .filter(num__gte=MIN_MARKS)
             .order_by("-num")[:MAX_ITEMS_PER_PERIOD]
         ]
@@ -113,7 +112,8 @@ class DiscoverGenerator(BaseJob):
                     f"Most commented podcast in last {days} days: {len(extra_ids)}"
                 )
                 item_ids = extra_ids + item_ids
-            items = [Item.objects.get(pk=i) for i in item_ids]
+            items_by_id = Item.objects.in_bulk(item_ids)
+            items = [items_by_id[i] for i in item_ids if i in items_by_id]
             if category == ItemCategory.TV:
                 items = self.cleanup_shows(items)
             gallery_list.append(
@@ -130,10 +130,15 @@ class DiscoverGenerator(BaseJob):
                 item_ids += self.get_popular_commented_podcast_ids(
                     DAYS_FOR_TRENDS, item_ids
                 )[:3]
+            counts = dict(
+                ItemMarkCount.recent(7)
+                .filter(item_id__in=set(item_ids))
+                .values("item_id")
+                .annotate(num=Sum("count"))
+                .values_list("item_id", "num")
+            )
             for i in Item.objects.filter(pk__in=set(item_ids)):
-                cnt = ShelfMember.objects.filter(
-                    item=i, created_time__gt=timezone.now() - timedelta(days=7)
-                ).count()
+                cnt = counts.get(i.pk, 0)
                 trends.append(
                     {
                         "title": i.display_title,
@@ -1,7 +1,10 @@
-import pprint
+import asyncio
 from datetime import timedelta
-from time import sleep
+from urllib.parse import urlparse
 
+import httpx
+from django.conf import settings
+from django.core.cache import cache
 from loguru import logger
 
 from catalog.common.models import IdType
@@ -9,27 +12,109 @@ from catalog.models import Podcast
 from catalog.sites import RSS
 from common.models import BaseJob, JobManager
 
+_VALIDATORS_CACHE_KEY = "rss_validators:{}"
+_VALIDATORS_CACHE_TIMEOUT = 86400 * 30
+
 
 @JobManager.register
 class PodcastUpdater(BaseJob):
     interval = timedelta(hours=2)
+    batch_size = 200  # feeds fetched into memory before being saved
+    concurrency = 20
+    concurrency_per_host = 2
+    timeout = 10
+
+    async def fetch_feed(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        limit: asyncio.Semaphore,
+        host_limits: dict[str, asyncio.Semaphore],
+    ):
+        """
+        fetch a feed with conditional request,
+        return (content, validators) or (None, None) if feed is not modified or unavailable
+        """
+        validators = cache.get(_VALIDATORS_CACHE_KEY.format(url)) or {}
+        headers = {"User-Agent": settings.NEODB_USER_AGENT}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        host = urlparse(url).hostname or ""
+        host_limit = host_limits.setdefault(
+            host, asyncio.Semaphore(self.concurrency_per_host)
+        )
+        async with host_limit, limit:
+            for u in [url, url.replace("https://", "http://")]:
+                try:
+                    r = await client.get(u, headers=headers, follow_redirects=True)
+                except httpx.HTTPError as e:
+                    logger.debug(f"unable to fetch {u}: {e}")
+                    continue
+                if r.status_code == 304:
+                    return None, None
+                if r.status_code != 200:
+                    logger.debug(f"unable to fetch {u}: {r.status_code}")
+                    continue
+                validators = {
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                }
+                return r.content, validators
+        return None, None
+
+    async def fetch_feeds(self, urls: list[str]):
+        limit = asyncio.Semaphore(self.concurrency)
+        host_limits = {}
+        async with httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency),
+        ) as client:
+            return await asyncio.gather(
+                *[self.fetch_feed(client, url, limit, host_limits) for url in urls]
+            )
+
+    def update_podcast(self, podcast: Podcast, url: str, content: bytes) -> int:
+        feed = RSS.parse_feed_from_content(url, content)
+        return RSS.update_episodes(podcast, feed)
 
     def run(self):
         logger.info("Podcasts update start.")
         count = 0
+        updated = 0
         qs = Podcast.objects.filter(
-            is_deleted=False, merged_to_item__isnull=True
+            is_deleted=False,
+            merged_to_item__isnull=True,
+            primary_lookup_id_type=IdType.RSS,
+            primary_lookup_id_value__isnull=False,
         ).order_by("pk")
-        for p in qs:
-            if (
-                p.primary_lookup_id_type == IdType.RSS
-                and p.primary_lookup_id_value is not None
-            ):
-                logger.info(f"updating {p}")
-                c = p.episodes.count()
-                site = RSS(p.feed_url)
-                site.scrape_additional_data()
-                c2 = p.episodes.count()
-                logger.info(f"updated {p}, {c2-c} new episodes.")
-                count += c2 - c
-        logger.info(f"Podcasts update finished, {count} new episodes total.")
+        podcasts = list(qs)
+        loop = asyncio.new_event_loop()
+        try:
+            for i in range(0, len(podcasts), self.batch_size):
+                batch = podcasts[i : i + self.batch_size]
+                urls = [RSS.id_to_url(p.primary_lookup_id_value) for p in batch]
+                results = loop.run_until_complete(self.fetch_feeds(urls))
+                for p, url, (content, validators) in zip(batch, urls, results):
+                    if content is None:
+                        continue
+                    try:
+                        c = self.update_podcast(p, url, content)
+                    except Exception as e:
+                        logger.warning(f"unable to update {p}: {e}")
+                        continue
+                    cache.set(
+                        _VALIDATORS_CACHE_KEY.format(url),
+                        validators,
+                        timeout=_VALIDATORS_CACHE_TIMEOUT,
+                    )
+                    updated += 1
+                    if c:
+                        logger.info(f"updated {p}, {c} new episodes.")
+                    count += c
+        finally:
+            loop.close()
+        logger.info(
+            f"Podcasts update finished, {updated} of {len(podcasts)} feeds changed, {count} new episodes total."
+        )
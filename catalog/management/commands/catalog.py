@@ -1,5 +1,7 @@
 import pprint
 import re
+import timeit
+from pathlib import Path
 
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
@@ -7,6 +9,7 @@ from django.db.models import Count, F
 from tqdm import tqdm
 
 from catalog.book.tests import uniq
+from catalog.common.sites import SiteManager
 from catalog.models import *
 from common.models.lang import detect_language
 from journal.models import update_journal_for_merged_item
@@ -39,6 +42,11 @@ class Command(BaseCommand):
             action="store_true",
             help="check and fix integrity for merged and deleted items",
         )
+        parser.add_argument(
+            "--benchmark-sites",
+            action="store_true",
+            help="benchmark matching url to site with urls in catalog tests",
+        )
 
     def handle(self, *args, **options):
         self.verbose = options["verbose"]
@@ -49,6 +57,8 @@ class Command(BaseCommand):
             self.integrity()
         if options["localize"]:
             self.localize()
+        if options["benchmark_sites"]:
+            self.benchmark_sites()
         self.stdout.write(self.style.SUCCESS(f"Done."))
 
     def localize(self):
@@ -87,6 +97,32 @@ class Command(BaseCommand):
             i.localized_description = localized_desc
             i.save(update_fields=["metadata"])
 
+    def benchmark_sites(self, rounds=100):
+        urls = set()
+        for f in (Path(__file__).parent.parent.parent).glob("**/tests.py"):
+            urls.update(re.findall(r"https?://[^\s\"'\\]+", f.read_text()))
+        urls = sorted(urls)
+        sites = list(SiteManager.registry.values())
+        linear = [next(filter(lambda p: p.validate_url(u), sites), None) for u in urls]
+        indexed = [SiteManager.get_site_cls_by_url(u) for u in urls]
+        for u, a, b in zip(urls, linear, indexed):
+            if a != b:
+                self.stdout.write(self.style.ERROR(f"! {u} : {a} != {b}"))
+        t1 = timeit.timeit(
+            lambda: [
+                next(filter(lambda p: p.validate_url(u), sites), None) for u in urls
+            ],
+            number=rounds,
+        )
+        t2 = timeit.timeit(
+            lambda: [SiteManager.get_site_cls_by_url(u) for u in urls],
+            number=rounds,
+        )
+        n = len(urls) * rounds
+        self.stdout.write(f"{len(urls)} urls x {rounds} rounds")
+        self.stdout.write(f"linear scan: {t1 * 1000000 / n:.2f}µs per url")
+        self.stdout.write(f"dispatcher: {t2 * 1000000 / n:.2f}µs per url")
+
     def purge(self):
         for cls in Item.__subclasses__():
             if self.fix:
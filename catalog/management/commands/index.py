@@ -1,11 +1,11 @@
 import pprint
-from datetime import timedelta
-from time import sleep
-from typing import TYPE_CHECKING
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.management.base import BaseCommand
-from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min
 from django.utils import timezone
 from tqdm import tqdm
 
@@ -13,6 +13,38 @@ from catalog.models import Item
 from catalog.search.typesense import Indexer
 
 BATCH_SIZE = 1000
+SEGMENT_BATCHES = 10  # batches of primary key range handled by a worker at a time
+_CHECKPOINT_CACHE_KEY = "index:reindex:checkpoint"
+_CHECKPOINT_CACHE_TIMEOUT = 86400 * 7
+
+
+def _indexable_items():
+    return Item.objects.filter(is_deleted=False, merged_to_item_id__isnull=True)
+
+
+def _reindex_segment(start, end, batch_size, collection_name):
+    """index items with start <= pk < end, walking with keyset pagination"""
+    last_pk = start - 1
+    count = 0
+    failures = 0
+    while True:
+        batch = list(
+            _indexable_items()
+            .filter(pk__gt=last_pk, pk__lt=end)
+            .order_by("pk")[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        items = Indexer.objs_to_dicts(batch)
+        failures += Indexer.import_dicts(items, collection_name)
+        count += len(items)
+    return start, count, failures
+
+
+def _init_worker():
+    # connections inherited from parent process must not be shared
+    connections.close_all()
 
 
 class Command(BaseCommand):
@@ -41,6 +73,28 @@ class Command(BaseCommand):
             "--delete",
             action="store_true",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="number of items per import for --reindex",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="number of worker processes for --reindex",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="resume previous --reindex from its checkpoint",
+        )
+        parser.add_argument(
+            "--swap",
+            action="store_true",
+            help="--reindex into a new collection and alias index name to it when finished",
+        )
 
     def init_index(self):
         Indexer.init()
@@ -58,19 +112,78 @@ class Command(BaseCommand):
         stats = Indexer.get_stats()
         pprint.pp(stats)
 
-    def reindex(self):
-        if Indexer.busy():
-            self.stdout.write("Please wait for previous updates")
-        # Indexer.update_settings()
-        # self.stdout.write(self.style.SUCCESS('Index settings updated.'))
-        qs = Item.objects.filter(
-            is_deleted=False, merged_to_item_id__isnull=True
-        )  # if h == 0 else c.objects.filter(edited_time__gt=timezone.now() - timedelta(hours=h))
-        pg = Paginator(qs.order_by("id"), BATCH_SIZE)
-        for p in tqdm(pg.page_range):
-            Indexer.replace_batch(pg.get_page(p).object_list)
-            while Indexer.busy():
-                sleep(0.5)
+    def reindex(self, batch_size, workers, resume, swap):
+        step = batch_size * SEGMENT_BATCHES
+        checkpoint = cache.get(_CHECKPOINT_CACHE_KEY) if resume else None
+        if resume and not checkpoint:
+            self.stdout.write("No checkpoint found, starting over.")
+        if checkpoint and checkpoint.get("step") != step:
+            # segments done are keyed by start pk, which only match with same step
+            self.stderr.write(
+                self.style.ERROR(
+                    f"Checkpoint was made with segments of {checkpoint.get('step')} "
+                    f"items instead of {step}, resume with the same --batch-size "
+                    "or start over without --resume."
+                )
+            )
+            return
+        if not checkpoint:
+            checkpoint = {"collection": None, "step": step, "done": []}
+            if swap:
+                checkpoint["collection"] = (
+                    f"{settings.TYPESENSE_INDEX_NAME}_{timezone.now():%Y%m%d%H%M%S}"
+                )
+                Indexer.create_collection(checkpoint["collection"])
+            cache.set(_CHECKPOINT_CACHE_KEY, checkpoint, _CHECKPOINT_CACHE_TIMEOUT)
+        collection_name = checkpoint["collection"]
+        done = set(checkpoint["done"])
+        r = _indexable_items().aggregate(min_pk=Min("pk"), max_pk=Max("pk"))
+        if r["min_pk"] is None:
+            self.stdout.write("No item to index.")
+            return
+        # keep segment boundaries of the checkpoint even if the lowest pk changed
+        first_pk = checkpoint.setdefault("first_pk", r["min_pk"])
+        segments = [
+            (start, start + step)
+            for start in range(first_pk, r["max_pk"] + 1, step)
+            if start not in done
+        ]
+        count = 0
+        failures = 0
+        pbar = tqdm(total=len(segments))
+
+        def segment_finished(start, c, f):
+            nonlocal count, failures
+            count += c
+            failures += f
+            done.add(start)
+            checkpoint["done"] = sorted(done)
+            cache.set(_CHECKPOINT_CACHE_KEY, checkpoint, _CHECKPOINT_CACHE_TIMEOUT)
+            pbar.update(1)
+
+        if workers > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(workers, initializer=_init_worker) as executor:
+                futures = [
+                    executor.submit(
+                        _reindex_segment, start, end, batch_size, collection_name
+                    )
+                    for start, end in segments
+                ]
+                for future in as_completed(futures):
+                    segment_finished(*future.result())
+        else:
+            for start, end in segments:
+                segment_finished(
+                    *_reindex_segment(start, end, batch_size, collection_name)
+                )
+        pbar.close()
+        if collection_name:
+            Indexer.swap_alias(collection_name)
+        cache.delete(_CHECKPOINT_CACHE_KEY)
+        self.stdout.write(
+            self.style.SUCCESS(f"{count} items indexed, {failures} failed.")
+        )
 
     def handle(self, *args, **options):
         if options["init"]:
@@ -80,7 +193,12 @@ class Command(BaseCommand):
         elif options["stat"]:
             self.stat()
         elif options["reindex"]:
-            self.reindex()
+            self.reindex(
+                options["batch_size"],
+                options["workers"],
+                options["resume"],
+                options["swap"],
+            )
         elif options["delete"]:
             self.delete()
         # else:
@@ -73,6 +73,13 @@ def init_catalog_search_models():
     # Indexer.update_model_indexable(CatalogCollection)
 
 
+def init_catalog_thumbnails():
+    from common.thumbnail import register_image_model
+
+    for cls in Item.__subclasses__():
+        register_image_model(cls, "cover")
+
+
 def init_catalog_audit_log():
     for cls in Item.__subclasses__():
         auditlog.register(
@@ -1,7 +1,14 @@
+from functools import partial
+from unittest import mock
+
+import httpx
+from django.core.cache import cache
 from django.test import TestCase
 
 from catalog.common import *
+from catalog.jobs.podcast import _VALIDATORS_CACHE_KEY, PodcastUpdater
 from catalog.podcast.models import *
+from catalog.sites import RSS
 
 # class ApplePodcastTestCase(TestCase):
 #     def setUp(self):
@@ -142,3 +149,65 @@ class PodcastRSSFeedTestCase(TestCase):
     #     self.assertIsNotNone(site.get_item().recent_episodes[0].title)
     #     self.assertIsNotNone(site.get_item().recent_episodes[0].link)
     #     self.assertIsNotNone(site.get_item().recent_episodes[0].media_url)
+
+
+class PodcastUpdaterTestCase(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.podcast = Podcast.objects.create(
+            title="Test Podcast",
+            primary_lookup_id_type=IdType.RSS,
+            primary_lookup_id_value="example.org/feed.xml",
+        )
+        self.url = RSS.id_to_url(self.podcast.primary_lookup_id_value)
+        cache.delete(_VALIDATORS_CACHE_KEY.format(self.url))
+        self.addCleanup(cache.delete, _VALIDATORS_CACHE_KEY.format(self.url))
+        self.guids = ["ep1", "ep2", "ep1"]
+        self.requests = []
+
+    def get_feed(self):
+        items = "".join(
+            f"<item><title>Episode {guid}</title><guid>{guid}</guid>"
+            f'<enclosure url="https://example.org/{guid}.mp3" type="audio/mpeg"'
+            ' length="1"/><pubDate>Mon, 01 Jan 2024 00:00:00 +0000</pubDate></item>'
+            for guid in self.guids
+        )
+        return (
+            '<?xml version="1.0"?><rss version="2.0"><channel>'
+            f"<title>Test Podcast</title>{items}</channel></rss>"
+        ).encode()
+
+    def handle_request(self, request: httpx.Request):
+        self.requests.append(request)
+        etag = f'"{len(self.guids)}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, content=self.get_feed(), headers={"ETag": etag})
+
+    def run_updater(self):
+        transport = httpx.MockTransport(self.handle_request)
+        with mock.patch(
+            "httpx.AsyncClient", partial(httpx.AsyncClient, transport=transport)
+        ):
+            PodcastUpdater().run()
+
+    def get_guids(self):
+        return sorted(self.podcast.episodes.values_list("guid", flat=True))
+
+    def test_update(self):
+        self.run_updater()
+        self.assertEqual(self.get_guids(), ["ep1", "ep2"])
+        self.assertNotIn("If-None-Match", self.requests[-1].headers)
+
+        # not modified since the stored etag
+        with mock.patch.object(RSS, "parse_feed_from_content") as parse:
+            self.run_updater()
+            parse.assert_not_called()
+        self.assertEqual(self.requests[-1].headers["If-None-Match"], '"3"')
+        self.assertEqual(self.get_guids(), ["ep1", "ep2"])
+
+        # only new episode is added
+        self.guids.append("ep3")
+        self.run_updater()
+        self.assertEqual(self.get_guids(), ["ep1", "ep2", "ep3"])
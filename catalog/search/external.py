@@ -1,11 +1,12 @@
 import asyncio
+import hashlib
 import logging
-import time
 from urllib.parse import quote_plus, urlparse
 
 import httpx
-import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 from lxml import html
 
 from catalog.common import *
@@ -14,6 +15,8 @@ from catalog.sites.spotify import get_spotify_token
 from catalog.sites.tmdb import TMDB_DEFAULT_LANG
 
 SEARCH_PAGE_SIZE = 5  # not all apis support page size
+SEARCH_DEADLINE = 3  # seconds to wait for all sources, slower ones are dropped
+SEARCH_CACHE_TIMEOUT = 300
 logger = logging.getLogger(__name__)
 
 
@@ -54,223 +57,172 @@ class SearchResultItem:
 
 class Goodreads:
     @classmethod
-    def search(cls, q: str, page=1):
+    async def search(cls, client: httpx.AsyncClient, q: str, page=1):
         results = []
         search_url = f"https://www.goodreads.com/search?page={page}&q={quote_plus(q)}"
-        try:
-            r = requests.get(
-                search_url,
-                timeout=3,
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:107.0) Gecko/20100101 Firefox/107.0",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-                    "Accept-Language": BasicDownloader.get_accept_language(),
-                    "Accept-Encoding": "gzip, deflate",
-                    "Connection": "keep-alive",
-                    "DNT": "1",
-                    "Upgrade-Insecure-Requests": "1",
-                    "Cache-Control": "no-cache",
-                },
-            )
-            if r.url.startswith("https://www.goodreads.com/book/show/"):
-                # Goodreads will 302 if only one result matches ISBN
-                site = SiteManager.get_site_by_url(r.url)
-                if site:
-                    res = site.get_resource_ready()
-                    if res:
-                        subtitle = f"{res.metadata.get('pub_year')} {', '.join(res.metadata.get('author', []))} {', '.join(res.metadata.get('translator', []))}"
-                        results.append(
-                            SearchResultItem(
-                                ItemCategory.Book,
-                                SiteName.Goodreads,
-                                res.url,
-                                res.metadata["title"],
-                                subtitle,
-                                res.metadata.get("brief"),
-                                res.metadata.get("cover_image_url"),
-                            )
-                        )
-            else:
-                h = html.fromstring(r.content.decode("utf-8"))
-                books = h.xpath('//tr[@itemtype="http://schema.org/Book"]')
-                for c in books:  # type:ignore
-                    el_cover = c.xpath('.//img[@class="bookCover"]/@src')
-                    cover = el_cover[0] if el_cover else None
-                    el_title = c.xpath('.//a[@class="bookTitle"]//text()')
-                    title = "".join(el_title).strip() if el_title else None
-                    el_url = c.xpath('.//a[@class="bookTitle"]/@href')
-                    url = "https://www.goodreads.com" + el_url[0] if el_url else None
-                    el_authors = c.xpath('.//a[@class="authorName"]//text()')
-                    subtitle = ", ".join(el_authors) if el_authors else None
+        r = await client.get(
+            search_url,
+            timeout=3,
+            headers={
+                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:107.0) Gecko/20100101 Firefox/107.0",
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": BasicDownloader.get_accept_language(),
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+                "DNT": "1",
+                "Upgrade-Insecure-Requests": "1",
+                "Cache-Control": "no-cache",
+            },
+        )
+        if str(r.url).startswith("https://www.goodreads.com/book/show/"):
+            # Goodreads will 302 if only one result matches ISBN
+            site = SiteManager.get_site_by_url(str(r.url))
+            if site:
+                res = await sync_to_async(site.get_resource_ready)()
+                if res:
+                    subtitle = f"{res.metadata.get('pub_year')} {', '.join(res.metadata.get('author', []))} {', '.join(res.metadata.get('translator', []))}"
                     results.append(
                         SearchResultItem(
                             ItemCategory.Book,
                             SiteName.Goodreads,
-                            url,
-                            title,
+                            res.url,
+                            res.metadata["title"],
                             subtitle,
-                            "",
-                            cover,
+                            res.metadata.get("brief"),
+                            res.metadata.get("cover_image_url"),
                         )
                     )
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Search {search_url} error: {e}")
-        except Exception as e:
-            logger.error("Goodreads search error", extra={"query": q, "exception": e})
+        else:
+            h = html.fromstring(r.content.decode("utf-8"))
+            books = h.xpath('//tr[@itemtype="http://schema.org/Book"]')
+            for c in books:  # type:ignore
+                el_cover = c.xpath('.//img[@class="bookCover"]/@src')
+                cover = el_cover[0] if el_cover else None
+                el_title = c.xpath('.//a[@class="bookTitle"]//text()')
+                title = "".join(el_title).strip() if el_title else None
+                el_url = c.xpath('.//a[@class="bookTitle"]/@href')
+                url = "https://www.goodreads.com" + el_url[0] if el_url else None
+                el_authors = c.xpath('.//a[@class="authorName"]//text()')
+                subtitle = ", ".join(el_authors) if el_authors else None
+                results.append(
+                    SearchResultItem(
+                        ItemCategory.Book,
+                        SiteName.Goodreads,
+                        url,
+                        title,
+                        subtitle,
+                        "",
+                        cover,
+                    )
+                )
         return results
 
 
 class GoogleBooks:
     @classmethod
-    def search(cls, q, page=1):
+    async def search(cls, client: httpx.AsyncClient, q, page=1):
         results = []
         api_url = f"https://www.googleapis.com/books/v1/volumes?country=us&q={quote_plus(q)}&startIndex={SEARCH_PAGE_SIZE*(page-1)}&maxResults={SEARCH_PAGE_SIZE}&maxAllowedMaturityRating=MATURE"
-        try:
-            j = requests.get(api_url, timeout=2).json()
-            if "items" in j:
-                for b in j["items"]:
-                    if "title" not in b["volumeInfo"]:
-                        continue
-                    title = b["volumeInfo"]["title"]
-                    subtitle = ""
-                    if "publishedDate" in b["volumeInfo"]:
-                        subtitle += b["volumeInfo"]["publishedDate"] + " "
-                    if "authors" in b["volumeInfo"]:
-                        subtitle += ", ".join(b["volumeInfo"]["authors"])
-                    if "description" in b["volumeInfo"]:
-                        brief = b["volumeInfo"]["description"]
-                    elif "textSnippet" in b["volumeInfo"]:
-                        brief = b["volumeInfo"]["textSnippet"]["searchInfo"]
-                    else:
-                        brief = ""
-                    category = ItemCategory.Book
-                    # b['volumeInfo']['infoLink'].replace('http:', 'https:')
-                    url = "https://books.google.com/books?id=" + b["id"]
-                    cover = (
-                        b["volumeInfo"]["imageLinks"]["thumbnail"]
-                        if "imageLinks" in b["volumeInfo"]
-                        else None
-                    )
-                    results.append(
-                        SearchResultItem(
-                            category,
-                            SiteName.GoogleBooks,
-                            url,
-                            title,
-                            subtitle,
-                            brief,
-                            cover,
-                        )
+        j = (await client.get(api_url, timeout=2)).json()
+        if "items" in j:
+            for b in j["items"]:
+                if "title" not in b["volumeInfo"]:
+                    continue
+                title = b["volumeInfo"]["title"]
+                subtitle = ""
+                if "publishedDate" in b["volumeInfo"]:
+                    subtitle += b["volumeInfo"]["publishedDate"] + " "
+                if "authors" in b["volumeInfo"]:
+                    subtitle += ", ".join(b["volumeInfo"]["authors"])
+                if "description" in b["volumeInfo"]:
+                    brief = b["volumeInfo"]["description"]
+                elif "textSnippet" in b["volumeInfo"]:
+                    brief = b["volumeInfo"]["textSnippet"]["searchInfo"]
+                else:
+                    brief = ""
+                category = ItemCategory.Book
+                # b['volumeInfo']['infoLink'].replace('http:', 'https:')
+                url = "https://books.google.com/books?id=" + b["id"]
+                cover = (
+                    b["volumeInfo"]["imageLinks"]["thumbnail"]
+                    if "imageLinks" in b["volumeInfo"]
+                    else None
+                )
+                results.append(
+                    SearchResultItem(
+                        category,
+                        SiteName.GoogleBooks,
+                        url,
+                        title,
+                        subtitle,
+                        brief,
+                        cover,
                     )
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Search {api_url} error: {e}")
-        except Exception as e:
-            logger.error("GoogleBooks search error", extra={"query": q, "exception": e})
+                )
         return results
 
 
 class TheMovieDatabase:
     @classmethod
-    def search(cls, q, page=1):
+    async def search(cls, client: httpx.AsyncClient, q, page=1):
         results = []
         api_url = f"https://api.themoviedb.org/3/search/multi?query={quote_plus(q)}&page={page}&api_key={settings.TMDB_API3_KEY}&language={TMDB_DEFAULT_LANG}&include_adult=true"
-        try:
-            j = requests.get(api_url, timeout=2).json()
-            if j.get("results"):
-                for m in j["results"]:
-                    if m["media_type"] in ["tv", "movie"]:
-                        url = f"https://www.themoviedb.org/{m['media_type']}/{m['id']}"
-                        if m["media_type"] == "tv":
-                            cat = ItemCategory.TV
-                            title = m["name"]
-                            subtitle = f"{m.get('first_air_date', '')} {m.get('original_name', '')}"
-                        else:
-                            cat = ItemCategory.Movie
-                            title = m["title"]
-                            subtitle = f"{m.get('release_date', '')} {m.get('original_name', '')}"
-                        cover = (
-                            f"https://image.tmdb.org/t/p/w500/{m.get('poster_path')}"
-                            if m.get("poster_path")
-                            else None
-                        )
-                        results.append(
-                            SearchResultItem(
-                                cat,
-                                SiteName.TMDB,
-                                url,
-                                title,
-                                subtitle,
-                                m.get("overview"),
-                                cover,
-                            )
+        j = (await client.get(api_url, timeout=2)).json()
+        if j.get("results"):
+            for m in j["results"]:
+                if m["media_type"] in ["tv", "movie"]:
+                    url = f"https://www.themoviedb.org/{m['media_type']}/{m['id']}"
+                    if m["media_type"] == "tv":
+                        cat = ItemCategory.TV
+                        title = m["name"]
+                        subtitle = f"{m.get('first_air_date', '')} {m.get('original_name', '')}"
+                    else:
+                        cat = ItemCategory.Movie
+                        title = m["title"]
+                        subtitle = (
+                            f"{m.get('release_date', '')} {m.get('original_name', '')}"
                         )
-            else:
-                logger.warning(f"TMDB search '{q}' no results found.")
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Search {api_url} error: {e}")
-        except Exception as e:
-            logger.error("TMDb search error", extra={"query": q, "exception": e})
-        return results
-
-
-class Spotify:
-    @classmethod
-    def search(cls, q, page=1):
-        results = []
-        api_url = f"https://api.spotify.com/v1/search?q={q}&type=album&limit={SEARCH_PAGE_SIZE}&offset={page*SEARCH_PAGE_SIZE}"
-        try:
-            headers = {"Authorization": f"Bearer {get_spotify_token()}"}
-            j = requests.get(api_url, headers=headers, timeout=2).json()
-            if j.get("albums"):
-                for a in j["albums"]["items"]:
-                    title = a["name"]
-                    subtitle = a["release_date"]
-                    for artist in a["artists"]:
-                        subtitle += " " + artist["name"]
-                    url = a["external_urls"]["spotify"]
-                    cover = a["images"][0]["url"] if a.get("images") else None
+                    cover = (
+                        f"https://image.tmdb.org/t/p/w500/{m.get('poster_path')}"
+                        if m.get("poster_path")
+                        else None
+                    )
                     results.append(
                         SearchResultItem(
-                            ItemCategory.Music,
-                            SiteName.Spotify,
+                            cat,
+                            SiteName.TMDB,
                             url,
                             title,
                             subtitle,
-                            "",
+                            m.get("overview"),
                             cover,
                         )
                     )
-            else:
-                logger.warning(f"Spotify search '{q}' no results found.")
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Search {api_url} error: {e}")
-        except Exception as e:
-            logger.error("Spotify search error", extra={"query": q, "exception": e})
+        else:
+            logger.warning(f"TMDB search '{q}' no results found.")
         return results
 
 
-class Bandcamp:
+class Spotify:
     @classmethod
-    def search(cls, q, page=1):
+    async def search(cls, client: httpx.AsyncClient, q, page=1):
         results = []
-        search_url = f"https://bandcamp.com/search?from=results&item_type=a&page={page}&q={quote_plus(q)}"
-        try:
-            r = requests.get(search_url, timeout=2)
-            h = html.fromstring(r.content.decode("utf-8"))
-            albums = h.xpath('//li[@class="searchresult data-search"]')
-            for c in albums:  # type:ignore
-                el_cover = c.xpath('.//div[@class="art"]/img/@src')
-                cover = el_cover[0] if el_cover else None
-                el_title = c.xpath('.//div[@class="heading"]//text()')
-                title = "".join(el_title).strip() if el_title else None
-                el_url = c.xpath('..//div[@class="itemurl"]/a/@href')
-                url = el_url[0] if el_url else None
-                el_authors = c.xpath('.//div[@class="subhead"]//text()')
-                subtitle = ", ".join(el_authors) if el_authors else None
+        api_url = f"https://api.spotify.com/v1/search?q={q}&type=album&limit={SEARCH_PAGE_SIZE}&offset={page*SEARCH_PAGE_SIZE}"
+        token = await sync_to_async(get_spotify_token)()
+        headers = {"Authorization": f"Bearer {token}"}
+        j = (await client.get(api_url, headers=headers, timeout=2)).json()
+        if j.get("albums"):
+            for a in j["albums"]["items"]:
+                title = a["name"]
+                subtitle = a["release_date"]
+                for artist in a["artists"]:
+                    subtitle += " " + artist["name"]
+                url = a["external_urls"]["spotify"]
+                cover = a["images"][0]["url"] if a.get("images") else None
                 results.append(
                     SearchResultItem(
                         ItemCategory.Music,
-                        SiteName.Bandcamp,
+                        SiteName.Spotify,
                         url,
                         title,
                         subtitle,
@@ -278,120 +230,172 @@ class Bandcamp:
                         cover,
                     )
                 )
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Search {search_url} error: {e}")
-        except Exception as e:
-            logger.error("Bandcamp search error", extra={"query": q, "exception": e})
+        else:
+            logger.warning(f"Spotify search '{q}' no results found.")
+        return results
+
+
+class Bandcamp:
+    @classmethod
+    async def search(cls, client: httpx.AsyncClient, q, page=1):
+        results = []
+        search_url = f"https://bandcamp.com/search?from=results&item_type=a&page={page}&q={quote_plus(q)}"
+        r = await client.get(search_url, timeout=2)
+        h = html.fromstring(r.content.decode("utf-8"))
+        albums = h.xpath('//li[@class="searchresult data-search"]')
+        for c in albums:  # type:ignore
+            el_cover = c.xpath('.//div[@class="art"]/img/@src')
+            cover = el_cover[0] if el_cover else None
+            el_title = c.xpath('.//div[@class="heading"]//text()')
+            title = "".join(el_title).strip() if el_title else None
+            el_url = c.xpath('..//div[@class="itemurl"]/a/@href')
+            url = el_url[0] if el_url else None
+            el_authors = c.xpath('.//div[@class="subhead"]//text()')
+            subtitle = ", ".join(el_authors) if el_authors else None
+            results.append(
+                SearchResultItem(
+                    ItemCategory.Music,
+                    SiteName.Bandcamp,
+                    url,
+                    title,
+                    subtitle,
+                    "",
+                    cover,
+                )
+            )
         return results
 
 
 class ApplePodcast:
     @classmethod
-    def search(cls, q, page=1):
+    async def search(cls, client: httpx.AsyncClient, q, page=1):
         results = []
         search_url = f"https://itunes.apple.com/search?entity=podcast&limit={page*SEARCH_PAGE_SIZE}&term={quote_plus(q)}"
-        try:
-            r = requests.get(search_url, timeout=2).json()
-            for p in r["results"][(page - 1) * SEARCH_PAGE_SIZE :]:
-                if p.get("feedUrl"):
-                    results.append(
-                        SearchResultItem(
-                            ItemCategory.Podcast,
-                            SiteName.RSS,
-                            p["feedUrl"],
-                            p["trackName"],
-                            p["artistName"],
-                            "",
-                            p["artworkUrl600"],
-                        )
+        r = (await client.get(search_url, timeout=2)).json()
+        for p in r["results"][(page - 1) * SEARCH_PAGE_SIZE :]:
+            if p.get("feedUrl"):
+                results.append(
+                    SearchResultItem(
+                        ItemCategory.Podcast,
+                        SiteName.RSS,
+                        p["feedUrl"],
+                        p["trackName"],
+                        p["artistName"],
+                        "",
+                        p["artworkUrl600"],
                     )
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Search {search_url} error: {e}")
-        except Exception as e:
-            logger.error(
-                "ApplePodcast search error", extra={"query": q, "exception": e}
-            )
+                )
         return results
 
 
 class Fediverse:
     @staticmethod
-    async def search_task(host, q, category=None):
+    async def search(client: httpx.AsyncClient, host, q, category=None):
         api_url = f"https://{host}/api/catalog/search?query={quote_plus(q)}{'&category='+category if category else ''}"
-        async with httpx.AsyncClient() as client:
-            results = []
-            try:
-                response = await client.get(
-                    api_url,
-                    timeout=2,
-                )
-                r = response.json()
-            except Exception as e:
-                logger.error(
-                    f"Fediverse search {host} error",
-                    extra={"url": api_url, "query": q, "exception": e},
+        results = []
+        r = (await client.get(api_url, timeout=2)).json()
+        if "data" in r:
+            for item in r["data"]:
+                if any(
+                    urlparse(res["url"]).hostname in settings.SITE_DOMAINS
+                    for res in item.get("external_resources", [])
+                ):
+                    continue
+                url = (
+                    f"https://{host}{item['url']}"  # FIXME update API and use abs urls
                 )
-                return []
-            if "data" in r:
-                for item in r["data"]:
-                    if any(
-                        urlparse(res["url"]).hostname in settings.SITE_DOMAINS
-                        for res in item.get("external_resources", [])
-                    ):
-                        continue
-                    url = f"https://{host}{item['url']}"  # FIXME update API and use abs urls
-                    try:
-                        cat = ItemCategory(item["category"])
-                    except Exception:
-                        cat = ""
-                    results.append(
-                        SearchResultItem(
-                            cat,
-                            host,
-                            url,
-                            item["display_title"],
-                            "",
-                            item["brief"],
-                            item["cover_image_url"],
-                        )
+                try:
+                    cat = ItemCategory(item["category"])
+                except Exception:
+                    cat = ""
+                results.append(
+                    SearchResultItem(
+                        cat,
+                        host,
+                        url,
+                        item["display_title"],
+                        "",
+                        item["brief"],
+                        item["cover_image_url"],
                     )
+                )
         return results
 
-    @classmethod
-    def search(cls, q: str, page: int = 1, category: str | None = None):
-        from takahe.utils import Takahe
 
-        peers = Takahe.get_neodb_peers()
-        c = category if category != "movietv" else "movie,tv"
-        tasks = [Fediverse.search_task(host, q, c) for host in peers]
-        # loop = asyncio.get_event_loop()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        results = []
-        for r in loop.run_until_complete(asyncio.gather(*tasks)):
-            results.extend(r)
+class ExternalSources:
+    @staticmethod
+    def get_cache_key(source: str, c: str, q: str, page: int):
+        h = hashlib.md5(q.encode()).hexdigest()
+        return f"search_external:{source}:{c}:{h}:{page}"
+
+    @classmethod
+    async def search_source(cls, client: httpx.AsyncClient, source: tuple, key: str):
+        """run one search source, results are cached unless there is an error"""
+        name, search, args = source
+        try:
+            results = await search(client, *args)
+        except httpx.HTTPError as e:
+            logger.warning(f"Search {name} error: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"{name} search error", extra={"exception": e})
+            return []
+        cache.set(key, results, timeout=SEARCH_CACHE_TIMEOUT)
         return results
 
+    @classmethod
+    async def search_sources(cls, sources: list[tuple], keys: list[str]):
+        """run search sources concurrently with one client, until SEARCH_DEADLINE"""
+        async with httpx.AsyncClient(
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=len(sources) * 2),
+        ) as client:
+            tasks = [
+                asyncio.create_task(cls.search_source(client, source, key))
+                for source, key in zip(sources, keys)
+            ]
+            done, pending = await asyncio.wait(tasks, timeout=SEARCH_DEADLINE)
+            for source, task in zip(sources, tasks):
+                if task in pending:
+                    logger.warning(f"Search {source[0]} timed out")
+                    task.cancel()
+            return [t.result() if t in done else [] for t in tasks]
 
-class ExternalSources:
     @classmethod
     def search(cls, c, q, page=1):
         if not q:
             return []
-        results = []
-        results.extend(
-            Fediverse.search(q, page, category=c if c and c != "all" else None)
-        )
+        from takahe.utils import Takahe
+
+        fc = c if c and c != "all" else None
+        fc = fc if fc != "movietv" else "movie,tv"
+        sources = [
+            (host, Fediverse.search, (host, q, fc)) for host in Takahe.get_neodb_peers()
+        ]
         if c == "" or c is None:
             c = "all"
         if c == "all" or c == "movietv":
-            results.extend(TheMovieDatabase.search(q, page))
+            sources.append((SiteName.TMDB, TheMovieDatabase.search, (q, page)))
         if c == "all" or c == "book":
-            results.extend(GoogleBooks.search(q, page))
-            results.extend(Goodreads.search(q, page))
+            sources.append((SiteName.GoogleBooks, GoogleBooks.search, (q, page)))
+            sources.append((SiteName.Goodreads, Goodreads.search, (q, page)))
         if c == "all" or c == "music":
-            results.extend(Spotify.search(q, page))
-            results.extend(Bandcamp.search(q, page))
+            sources.append((SiteName.Spotify, Spotify.search, (q, page)))
+            sources.append((SiteName.Bandcamp, Bandcamp.search, (q, page)))
         if c == "podcast":
-            results.extend(ApplePodcast.search(q, page))
+            sources.append((SiteName.RSS, ApplePodcast.search, (q, page)))
+        keys = [cls.get_cache_key(s[0], c, q, page) for s in sources]
+        cached = cache.get_many(keys)
+        missing = [i for i, k in enumerate(keys) if k not in cached]
+        if missing:
+            fetched = asyncio.run(
+                cls.search_sources(
+                    [sources[i] for i in missing], [keys[i] for i in missing]
+                )
+            )
+            for i, r in zip(missing, fetched):
+                cached[keys[i]] = r
+        results = []
+        for k in keys:
+            results.extend(cached[k])
         return results
@@ -5,6 +5,7 @@ import django_rq
 from auditlog.context import set_actor
 from django.conf import settings
 from django.core.cache import cache
+from django.db.models import prefetch_related_objects
 from django.utils.translation import gettext_lazy as _
 from loguru import logger
 from rq.job import Job
@@ -69,7 +70,7 @@ def query_index(keywords, categories=None, tag=None, page=1, prepare_external=Tr
     duplicated_items = []
     urls = []
     for i in result.items:
-        if i.is_deleted or i.merged_to_item:  # only happen if index is delayed
+        if i.is_deleted or i.merged_to_item_id:  # only happen if index is delayed
             continue
         if i.class_name == "work":  # TODO: add searchable_item_class global config
             continue
@@ -79,7 +80,7 @@ def query_index(keywords, categories=None, tag=None, page=1, prepare_external=Tr
             else ([i.imdb_code] if hasattr(i, "imdb_code") else [])
         )
         if hasattr(i, "works"):
-            my_key += [i[0] for i in i.works.all().values_list("id")]
+            my_key += [w.pk for w in i.works.all()]
         if len(my_key):
             sl = len(keys) + len(my_key)
             keys.update(my_key)
@@ -94,6 +95,7 @@ def query_index(keywords, categories=None, tag=None, page=1, prepare_external=Tr
             urls.append(res.url)
     # hide show if its season exists
     seasons = [i for i in items if i.__class__ == TVSeason]
+    prefetch_related_objects(seasons, "show")
     for season in seasons:
         if season.show in items:
             duplicated_items.append(season.show)
@@ -1,4 +1,6 @@
+import json
 import types
+import uuid
 from datetime import timedelta
 from pprint import pprint
 from time import sleep
@@ -6,6 +8,8 @@ from time import sleep
 import django_rq
 import typesense
 from django.conf import settings
+from django.core.signing import b62_decode
+from django.db.models import prefetch_related_objects
 from django.db.models.signals import post_delete, post_save
 from django_redis import get_redis_connection
 from loguru import logger
@@ -224,6 +228,42 @@ class Indexer:
         except Exception as e:
             logger.error(f"Typesense: server error {e}")
 
+    @classmethod
+    def get_alias_target(cls) -> str | None:
+        """name of the collection which index name is aliased to, None if not aliased"""
+        client = typesense.Client(settings.TYPESENSE_CONNECTION)
+        try:
+            return client.aliases[settings.TYPESENSE_INDEX_NAME].retrieve()[
+                "collection_name"
+            ]
+        except ObjectNotFound:
+            return None
+
+    @classmethod
+    def create_collection(cls, name):
+        """create a new collection with index schema, to be swapped in later with swap_alias()"""
+        client = typesense.Client(settings.TYPESENSE_CONNECTION)
+        client.collections.create(cls.config() | {"name": name})
+        logger.info(f"Typesense: collection {name} created")
+
+    @classmethod
+    def swap_alias(cls, name):
+        """point index name to the given collection, and drop the collection it pointed to"""
+        client = typesense.Client(settings.TYPESENSE_CONNECTION)
+        old_name = cls.get_alias_target()
+        client.aliases.upsert(settings.TYPESENSE_INDEX_NAME, {"collection_name": name})
+        cls._instance = None
+        logger.info(f"Typesense: index {settings.TYPESENSE_INDEX_NAME} -> {name}")
+        if not old_name:
+            # index was a plain collection, which takes precedence over alias
+            old_name = settings.TYPESENSE_INDEX_NAME
+        if old_name != name:
+            try:
+                client.collections[old_name].delete()
+                logger.info(f"Typesense: collection {old_name} deleted")
+            except ObjectNotFound:
+                pass
+
     @classmethod
     def delete_index(cls):
         idx = cls.instance()
@@ -284,10 +324,17 @@ class Indexer:
         post_delete.connect(_piece_post_delete_handler, sender=model)
 
     @classmethod
-    def obj_to_dict(cls, obj):
+    def obj_to_dict(cls, obj, rating_count=None, tags=None):
+        """
+        convert item to document,
+        rating_count and tags are loaded from db if not provided by caller
+        """
         item = {}
         for field in obj.__class__.indexable_fields:
-            item[field] = getattr(obj, field)
+            if field == "tags" and tags is not None:
+                item[field] = tags
+            else:
+                item[field] = getattr(obj, field)
         for field in obj.__class__.indexable_fields_time:
             item[field] = (
                 getattr(obj, field).timestamp() if getattr(obj, field) else None
@@ -308,9 +355,55 @@ class Indexer:
             and (k in SEARCHABLE_ATTRIBUTES or k in FILTERABLE_ATTRIBUTES or k == "id")
         }
         # typesense requires primary key to be named 'id', type string
-        item["rating_count"] = obj.rating_count
+        item["rating_count"] = (
+            obj.rating_count if rating_count is None else rating_count
+        )
         return item
 
+    @classmethod
+    def objs_to_dicts(cls, objects) -> list[dict]:
+        """convert items to documents, rating counts and tags are loaded in bulk"""
+        from journal.models import RatingSummary, TagManager
+
+        objs = [x for x in objects if hasattr(x, "indexable_fields")]
+        if not objs:
+            return []
+        item_ids = [o.pk for o in objs]
+        rating_counts = dict(
+            RatingSummary.objects.filter(item_id__in=item_ids).values_list(
+                "item_id", "count"
+            )
+        )
+        tags = TagManager.indexable_tags_for_items(item_ids)
+        return [
+            cls.obj_to_dict(
+                o, rating_count=rating_counts.get(o.pk, 0), tags=tags.get(o.pk, [])
+            )
+            for o in objs
+        ]
+
+    @classmethod
+    def import_dicts(cls, items, collection_name=None) -> int:
+        """import documents as JSONL into index or the given collection, return number of failures"""
+        if not items:
+            return 0
+        if collection_name:
+            idx = typesense.Client(settings.TYPESENSE_CONNECTION).collections[
+                collection_name
+            ]
+        else:
+            idx = cls.instance()
+        jsonl = "\n".join(json.dumps(i, ensure_ascii=False) for i in items)
+        r = idx.documents.import_(
+            jsonl.encode(), {"action": "upsert", "dirty_values": "coerce_or_drop"}
+        )
+        failures = [
+            x for x in (json.loads(line) for line in r.splitlines()) if not x["success"]
+        ]
+        for f in failures[:3]:
+            logger.warning(f"import document error: {f}")
+        return len(failures)
+
     @classmethod
     def replace_item(cls, obj):
         if obj.is_deleted or obj.merged_to_item_id:
@@ -325,15 +418,9 @@ class Indexer:
     @classmethod
     def replace_batch(cls, objects):
         try:
-            items = list(
-                map(
-                    lambda o: cls.obj_to_dict(o),
-                    [x for x in objects if hasattr(x, "indexable_fields")],
-                )
-            )
+            items = cls.objs_to_dicts(objects)
             # TODO check is_deleted=False, merged_to_item_id__isnull=True and call delete_batch()
-            if items:
-                cls.instance().documents.import_(items, {"action": "upsert"})
+            cls.import_dicts(items)
         except Exception as e:
             logger.error(f"replace batch error: \n{e}")
 
@@ -371,13 +458,7 @@ class Indexer:
 
         try:
             r = cls.instance().documents.search(options)
-            results.items = list(
-                [
-                    x
-                    for x in map(lambda i: cls.item_to_obj(i["document"]), r["hits"])
-                    if x is not None
-                ]
-            )
+            results.items = cls.items_to_objs([i["document"] for i in r["hits"]])
             results.count = r["found"]
             results.num_pages = (r["found"] + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
         except ObjectNotFound:
@@ -386,6 +467,28 @@ class Indexer:
             logger.error(e)
         return results
 
+    @classmethod
+    def items_to_objs(cls, items) -> list[Item]:
+        """load search hits from db in one query, keep the order of hits"""
+        uids = []
+        for item in items:
+            try:
+                uids.append(uuid.UUID(int=b62_decode(item["id"])))
+            except Exception as e:
+                logger.error(f"unable to decode search result item id:{item}\n{e}")
+        if not uids:
+            return []
+        objs = {
+            o.uid: o
+            for o in Item.objects.filter(uid__in=uids).prefetch_related(
+                "external_resources"
+            )
+        }
+        prefetch_related_objects(
+            [o for o in objs.values() if hasattr(o, "works")], "works"
+        )
+        return [objs[u] for u in uids if u in objs]
+
     @classmethod
     def item_to_obj(cls, item):
         try:
@@ -17,7 +17,7 @@ from common.utils import (
     PageLinksGenerator,
     user_identity_required,
 )
-from journal.models import Tag
+from journal.models import Tag, prefetch_viewer_state
 from users.views import query_identity
 
 from ..models import *
@@ -139,6 +139,7 @@ def search(request):
 
     keywords = re.sub(r"[^\w-]+", " ", keywords)
     items, num_pages, __, dup_items = query_index(keywords, categories, tag, p)
+    prefetch_viewer_state(request, items=items + dup_items)
     return render(
         request,
         "search_results.html",
@@ -1,3 +1,4 @@
+import io
 import logging
 import pickle
 import urllib.request
@@ -9,6 +10,7 @@ from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
+from django.db import transaction
 from django.utils.timezone import make_aware
 
 from catalog.common import *
@@ -65,6 +67,10 @@ class RSS(AbstractSite):
         cache.set(cache_key, feed, timeout=settings.DOWNLOADER_CACHE_TIMEOUT)
         return feed
 
+    @staticmethod
+    def parse_feed_from_content(url, content: bytes):
+        return podcastparser.parse(url, io.BytesIO(content))
+
     @classmethod
     def id_to_url(cls, id_value):
         return f"https://{id_value}"
@@ -113,26 +119,45 @@ class RSS(AbstractSite):
     def scrape_additional_data(self):
         item = self.get_item()
         feed = self.parse_feed_from_url(self.url)
-        if not feed:
+        if not item or not feed:
             return
+        self.update_episodes(item, feed)
+
+    @staticmethod
+    def get_episode_defaults(episode) -> dict:
+        return {
+            "title": episode["title"],
+            "brief": bleach.clean(episode.get("description"), strip=True),
+            "description_html": episode.get("description_html"),
+            "cover_url": episode.get("episode_art_url"),
+            "media_url": (
+                episode.get("enclosures")[0].get("url")
+                if episode.get("enclosures")
+                else None
+            ),
+            "pub_date": make_aware(datetime.fromtimestamp(episode.get("published"))),
+            "duration": episode.get("duration"),
+            "link": episode.get("link"),
+        }
+
+    @classmethod
+    def update_episodes(cls, podcast: Podcast, feed) -> int:
+        """create episodes with guid not yet in db, return the number of new episodes"""
+        guids = set(podcast.episodes.all().values_list("guid", flat=True))
+        episodes = []
         for episode in feed["episodes"]:
-            PodcastEpisode.objects.get_or_create(
-                program=item,
-                guid=episode.get("guid"),
-                defaults={
-                    "title": episode["title"],
-                    "brief": bleach.clean(episode.get("description"), strip=True),
-                    "description_html": episode.get("description_html"),
-                    "cover_url": episode.get("episode_art_url"),
-                    "media_url": (
-                        episode.get("enclosures")[0].get("url")
-                        if episode.get("enclosures")
-                        else None
-                    ),
-                    "pub_date": make_aware(
-                        datetime.fromtimestamp(episode.get("published"))
-                    ),
-                    "duration": episode.get("duration"),
-                    "link": episode.get("link"),
-                },
-            )
+            guid = episode.get("guid")
+            if guid not in guids:
+                guids.add(guid)
+                episodes.append(episode)
+        if not episodes:
+            return 0
+        with transaction.atomic():
+            # PodcastEpisode is a multi-table model which can't be bulk_create()d
+            for episode in episodes:
+                PodcastEpisode.objects.create(
+                    program=podcast,
+                    guid=episode.get("guid"),
+                    **cls.get_episode_defaults(episode),
+                )
+        return len(episodes)
@@ -1,4 +1,10 @@
-from django.test import TestCase
+import asyncio
+import time
+import uuid
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
 
 from catalog.book.tests import *
 from catalog.common.jsondata import decrypt_str, encrypt_str
@@ -46,3 +52,116 @@ class CatalogCase(TestCase):
         e = encrypt_str(o)
         d = decrypt_str(e)
         self.assertEqual(o, d)
+
+    def test_search_hits_to_objs(self):
+        from catalog.search.typesense import Indexer
+
+        self.hyperion_hardcover.works.add(self.hyperion)
+        hits = [
+            {"id": self.hyperion_print.uuid},
+            {"id": "not_a_valid_id"},
+            {"id": self.hyperion_hardcover.uuid},
+        ]
+        items = Indexer.items_to_objs(hits)
+        self.assertEqual(items, [self.hyperion_print, self.hyperion_hardcover])
+        with self.assertNumQueries(0):
+            self.assertEqual(list(items[1].works.all()), [self.hyperion])
+            self.assertEqual(list(items[0].external_resources.all()), [])
+
+    def test_api_item_etag(self):
+        url = self.hyperion_print.api_url
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["title"], "Hyperion")
+        etag = r["ETag"]
+        self.assertTrue(r["Last-Modified"])
+        r = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 304)
+        self.hyperion_print.title = "Hyperion Cantos"
+        self.hyperion_print.save()
+        r = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["title"], "Hyperion Cantos")
+        self.assertNotEqual(r["ETag"], etag)
+
+    def test_api_item_etag_of_parent(self):
+        season = TVSeason.objects.create(title="S1")
+        url = season.api_url
+        r = self.client.get(url)
+        self.assertEqual(r.json()["episode_uuids"], [])
+        episode = TVEpisode.objects.create(title="E1", season=season, episode_number=1)
+        r = self.client.get(url)
+        self.assertEqual(r.json()["episode_uuids"], [episode.uuid])
+        episode = TVEpisode.objects.get(pk=episode.pk)
+        episode.delete()
+        r = self.client.get(url)
+        self.assertEqual(r.json()["episode_uuids"], [])
+
+    def test_api_item_language(self):
+        book = Edition.objects.create(
+            title="Hyperion",
+            localized_title=[
+                {"lang": "en", "text": "Hyperion"},
+                {"lang": "zh-cn", "text": "海伯利安"},
+            ],
+        )
+        url = book.api_url
+        r = self.client.get(url, headers={"Accept-Language": "zh-hans"})
+        self.assertEqual(r.json()["display_title"], "海伯利安")
+        etag = r["ETag"]
+        r = self.client.get(url, headers={"Accept-Language": "en"})
+        self.assertEqual(r.json()["display_title"], "Hyperion")
+        self.assertNotEqual(r["ETag"], etag)
+        book.localized_title = [
+            {"lang": "en", "text": "Hyperion Cantos"},
+            {"lang": "zh-cn", "text": "海伯利安诗篇"},
+        ]
+        book.save()
+        r = self.client.get(url, headers={"Accept-Language": "zh-hans"})
+        self.assertEqual(r.json()["display_title"], "海伯利安诗篇")
+        r = self.client.get(url, headers={"Accept-Language": "en"})
+        self.assertEqual(r.json()["display_title"], "Hyperion Cantos")
+
+
+class ExternalSearchTest(SimpleTestCase):
+    def setUp(self):
+        from catalog.search.external import ExternalSources
+
+        self.query = uuid.uuid4().hex
+        self.calls = {"fast": 0, "slow": 0}
+        self.addCleanup(
+            cache.delete_many,
+            [
+                ExternalSources.get_cache_key(s, "book", self.query, 1)
+                for s in [SiteName.GoogleBooks, SiteName.Goodreads]
+            ],
+        )
+
+    async def fast_search(self, client, q, page):
+        self.calls["fast"] += 1
+        return [f"fast:{q}"]
+
+    async def slow_search(self, client, q, page):
+        self.calls["slow"] += 1
+        await asyncio.sleep(5)
+        return [f"slow:{q}"]
+
+    def search(self):
+        from catalog.search.external import ExternalSources
+
+        with (
+            mock.patch("catalog.search.external.SEARCH_DEADLINE", 0.5),
+            mock.patch("takahe.utils.Takahe.get_neodb_peers", return_value=[]),
+            mock.patch("catalog.search.external.GoogleBooks.search", self.fast_search),
+            mock.patch("catalog.search.external.Goodreads.search", self.slow_search),
+        ):
+            return ExternalSources.search("book", self.query)
+
+    def test_deadline_and_cache(self):
+        start = time.monotonic()
+        self.assertEqual(self.search(), [f"fast:{self.query}"])
+        self.assertLess(time.monotonic() - start, 3)
+        self.assertEqual(self.calls, {"fast": 1, "slow": 1})
+        # results of fast source are cached, slow one is tried again
+        self.assertEqual(self.search(), [f"fast:{self.query}"])
+        self.assertEqual(self.calls, {"fast": 1, "slow": 2})
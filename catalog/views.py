@@ -19,6 +19,7 @@ from journal.models import (
     ShelfManager,
     ShelfMember,
     ShelfType,
+    prefetch_viewer_state,
     q_piece_in_home_feed_of_user,
     q_piece_visible_to_user,
 )
@@ -97,9 +98,12 @@ def retrieve(request, item_path, item_uuid):
     if request.user.is_authenticated:
         visible = q_piece_visible_to_user(request.user)
         mark = Mark(request.user.identity, item)
-        child_item_comments = Comment.objects.filter(
-            owner=request.user.identity, item__in=item.child_items.all()
+        child_item_comments = list(
+            Comment.objects.filter(
+                owner=request.user.identity, item__in=item.child_items.all()
+            )
         )
+        prefetch_viewer_state(request, pieces=child_item_comments)
         review = mark.review
         my_collections = item.collections.all().filter(owner=request.user.identity)
         collection_list = (
@@ -174,6 +178,7 @@ def review_list(request, item_path, item_uuid):
     paginator = Paginator(queryset, NUM_REVIEWS_ON_LIST_PAGE)
     page_number = request.GET.get("page", default=1)
     reviews = paginator.get_page(page_number)
+    prefetch_viewer_state(request, pieces=reviews)
     pagination = PageLinksGenerator(page_number, paginator.num_pages, request.GET)
     return render(
         request,
@@ -194,12 +199,14 @@ def comments(request, item_path, item_uuid):
     before_time = request.GET.get("last")
     if before_time:
         queryset = queryset.filter(created_time__lte=before_time)
+    pieces = list(queryset[:11])
+    prefetch_viewer_state(request, pieces=pieces)
     return render(
         request,
         "_item_comments.html",
         {
             "item": item,
-            "comments": queryset[:11],
+            "comments": pieces,
         },
     )
 
@@ -217,13 +224,15 @@ def comments_by_episode(request, item_path, item_uuid):
     before_time = request.GET.get("last")
     if before_time:
         queryset = queryset.filter(created_time__lte=before_time)
+    pieces = list(queryset[:11])
+    prefetch_viewer_state(request, pieces=pieces)
     return render(
         request,
         "_item_comments_by_episode.html",
         {
             "item": item,
             "episode_uuid": episode_uuid,
-            "comments": queryset[:11],
+            "comments": pieces,
         },
     )
 
@@ -236,12 +245,14 @@ def reviews(request, item_path, item_uuid):
     before_time = request.GET.get("last")
     if before_time:
         queryset = queryset.filter(created_time__lte=before_time)
+    pieces = list(queryset[:11])
+    prefetch_viewer_state(request, pieces=pieces)
     return render(
         request,
         "_item_reviews.html",
         {
             "item": item,
-            "reviews": queryset[:11],
+            "reviews": pieces,
         },
     )
 
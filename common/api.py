@@ -1,29 +1,65 @@
 from typing import Any, Callable, List, Optional, Tuple, Type
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import QuerySet
+from django.utils.functional import SimpleLazyObject
 from loguru import logger
 from ninja import NinjaAPI, Schema
 from ninja.pagination import PageNumberPagination as NinjaPageNumberPagination
 from ninja.security import HttpBearer
 
 from takahe.utils import Takahe
-from users.models.apidentity import APIdentity
+from users.models import APIdentity, User
 
 PERMITTED_WRITE_METHODS = ["PUT", "POST", "DELETE", "PATCH"]
 PERMITTED_READ_METHODS = ["GET", "HEAD", "OPTIONS"]
 
 
 class OAuthAccessTokenAuth(HttpBearer):
+    # tokens may also be revoked by takahe in its own process, which can't clear
+    # the cache here, so this limits how long a token revoked there still works
+    cache_timeout = 300
+
+    @classmethod
+    def load_token(cls, token: str) -> dict | None:
+        """
+        load what authentication needs of a token, its identity and user, cached;
+        cache is cleared when any of them is changed or deleted in this process
+        """
+        key = Takahe.get_token_auth_cache_key(token)
+        r = cache.get(key)
+        if r is not None:
+            return r
+        tk = Takahe.get_token(token)
+        if not tk:
+            return None
+        identity = (
+            APIdentity.objects.select_related("user").filter(pk=tk.identity_id).first()
+            if tk.identity_id
+            else None
+        )
+        user = identity.user if identity else None
+        r = {
+            "scopes": list(tk.scopes),
+            "revoked": bool(tk.revoked),
+            "identity_id": identity.pk if identity else None,
+            "deleted": bool(identity.deleted) if identity else False,
+            "user_id": user.pk if user else None,
+            "active": user.is_active if user else False,
+        }
+        cache.set(key, r, timeout=cls.cache_timeout)
+        return r
+
     def authenticate(self, request, token) -> bool:
         if not token:
             logger.debug("API auth: no access token provided")
             return False
-        tk = Takahe.get_token(token)
+        tk = self.load_token(token)
         if not tk:
             logger.debug("API auth: access token not found")
             return False
-        if tk.revoked:
+        if tk["revoked"]:
             logger.debug("API auth: access token revoked")
             return False
         request_scope = ""
@@ -35,21 +71,24 @@ class OAuthAccessTokenAuth(HttpBearer):
         else:
             logger.debug("API auth: unsupported HTTP method")
             return False
-        if request_scope not in tk.scopes:
+        if request_scope not in tk["scopes"]:
             logger.debug("API auth: scope not allowed")
             return False
-        identity = APIdentity.objects.filter(pk=tk.identity_id).first()
-        if not identity:
+        if not tk["identity_id"]:
             logger.debug("API auth: identity not found")
             return False
-        if identity.deleted:
+        if tk["deleted"]:
             logger.debug("API auth: identity deleted")
             return False
-        user = identity.user
-        if not user:
+        user_id = tk["user_id"]
+        if not user_id:
             logger.debug("API auth: user not found")
             return False
-        request.user = user
+        if not tk["active"]:
+            logger.debug("API auth: user inactive")
+            return False
+        # user is loaded only when used, so a cached token needs no query
+        request.user = SimpleLazyObject(lambda: User.objects.get(pk=user_id))
         return True
 
 
@@ -0,0 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import batched
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from tqdm import tqdm
+
+from catalog.models import Item
+from common.thumbnail import (
+    generate_thumbnails_task,
+    get_cached_images,
+    is_thumbnailable,
+)
+from journal.models import Collection
+
+BATCH_SIZE = 100
+
+
+def _init_worker():
+    # connections inherited from parent process must not be shared
+    connections.close_all()
+
+
+def _image_names():
+    names = set()
+    for qs in [
+        Item.objects.filter(is_deleted=False).non_polymorphic(),
+        Collection.objects.all(),
+    ]:
+        names.update(qs.exclude(cover="").values_list("cover", flat=True).distinct())
+    return sorted(n for n in names if is_thumbnailable(n))
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails for all covers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="regenerate thumbnails even if they are cached",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--workers", type=int, default=4, help="number of worker processes"
+        )
+
+    def handle(self, *args, **options):
+        names = _image_names()
+        if not options["all"]:
+            cached = set()
+            for batch in batched(names, options["batch_size"]):
+                cached.update(get_cached_images(list(batch)))
+            names = [n for n in names if n not in cached]
+        self.stdout.write(f"Generating thumbnails for {len(names)} images")
+        count = 0
+        batches = [list(batch) for batch in batched(names, options["batch_size"])]
+        with tqdm(total=len(names)) as pbar:
+            if options["workers"] > 1:
+                connections.close_all()
+                with ProcessPoolExecutor(
+                    options["workers"], initializer=_init_worker
+                ) as ex:
+                    futures = {
+                        ex.submit(generate_thumbnails_task, batch): len(batch)
+                        for batch in batches
+                    }
+                    for future in as_completed(futures):
+                        count += future.result()
+                        pbar.update(futures[future])
+            else:
+                for batch in batches:
+                    count += generate_thumbnails_task(batch)
+                    pbar.update(len(batch))
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated thumbnails for {count} images")
+        )
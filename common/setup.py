@@ -4,6 +4,7 @@ from loguru import logger
 
 from catalog.search.models import Indexer
 from common.models import JobManager
+from journal.models import ItemMarkCount, Rating, RatingSummary, ShelfCount, ShelfMember
 from takahe.models import Config as TakaheConfig
 from takahe.models import Domain as TakaheDomain
 from takahe.models import Identity as TakaheIdentity
@@ -118,6 +119,27 @@ class Setup:
                     defaults={"state": "new"},
                 )
 
+    def sync_rating_summary(self):
+        if RatingSummary.objects.exists() or not Rating.objects.exists():
+            return
+        logger.info("Rating summary not found, rebuilding...")
+        cnt = RatingSummary.rebuild()
+        logger.info(f"Rating summary rebuilt for {cnt} items")
+
+    def sync_mark_count(self):
+        if ItemMarkCount.objects.exists() or not ShelfMember.objects.exists():
+            return
+        logger.info("Mark count not found, rebuilding...")
+        cnt = ItemMarkCount.rebuild()
+        logger.info(f"Mark count rebuilt with {cnt} daily counts")
+
+    def sync_shelf_count(self):
+        if ShelfCount.objects.exists() or not ShelfMember.objects.exists():
+            return
+        logger.info("Shelf count not found, rebuilding...")
+        cnt = ShelfCount.rebuild()
+        logger.info(f"Shelf count rebuilt with {cnt} counters")
+
     def run(self):
         if settings.TESTING:
             # Only do necessary initialization when testing
@@ -142,6 +164,15 @@ class Setup:
         # Create search index if not exists
         Indexer.init()
 
+        # Build rating summary if not yet
+        self.sync_rating_summary()
+
+        # Build mark count for discover if not yet
+        self.sync_mark_count()
+
+        # Build shelf count for profile if not yet
+        self.sync_shelf_count()
+
         # Register cron jobs if not yet
         if settings.DISABLE_CRON_JOBS and "*" in settings.DISABLE_CRON_JOBS:
             logger.info("Cron jobs are disabled.")
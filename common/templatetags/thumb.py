@@ -1,5 +1,6 @@
 from django import template
-from easy_thumbnails.templatetags.thumbnail import thumbnail_url
+
+from common.thumbnail import get_thumbnail_url
 
 register = template.Library()
 
@@ -7,13 +8,10 @@ register = template.Library()
 @register.filter
 def thumb(source, alias):
     """
-    This filter modifies that from `easy_thumbnails` so that
-    it can neglect .svg file.
+    url of precomputed thumbnail from `common.thumbnail`,
+    original image is used for .svg file or if thumbnail is not ready yet.
     """
     try:
-        if source.url.endswith(".svg"):
-            return source.url
-        else:
-            return thumbnail_url(source, alias)
+        return get_thumbnail_url(source, alias)
     except Exception:
         return ""
@@ -0,0 +1,71 @@
+import io
+import uuid
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from easy_thumbnails.files import get_thumbnailer
+from PIL import Image
+
+from catalog.models import Edition
+from common.templatetags.thumb import thumb
+from common.thumbnail import (
+    _CACHE_KEY,
+    _PENDING_CACHE_KEY,
+    generate_thumbnails,
+    get_cached_images,
+)
+
+
+class ThumbnailTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (400, 600), "red").save(buf, "PNG")
+        self.name = default_storage.save(
+            f"test/{uuid.uuid4().hex}.png", ContentFile(buf.getvalue())
+        )
+        self.addCleanup(self.delete_image, self.name)
+        patcher = mock.patch("common.thumbnail.django_rq.get_queue")
+        self.get_queue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def delete_image(name):
+        get_thumbnailer(default_storage, name).delete_thumbnails()
+        default_storage.delete(name)
+        cache.delete_many([_CACHE_KEY.format(name), _PENDING_CACHE_KEY.format(name)])
+
+    def test_enqueue_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Edition.objects.create(title="Hyperion", cover=self.name)
+        self.get_queue.return_value.enqueue.assert_called_once()
+        self.assertEqual(
+            self.get_queue.return_value.enqueue.call_args.args[1], [self.name]
+        )
+        self.get_queue.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = "Hyperion Cantos"
+            book.save()
+        self.get_queue.return_value.enqueue.assert_not_called()
+
+    def test_thumb(self):
+        book = Edition.objects.create(title="Hyperion", cover=self.name)
+        self.assertEqual(thumb(book.cover, "normal"), book.cover.url)
+        self.get_queue.return_value.enqueue.assert_called_once()
+        # queued only once until done
+        self.assertEqual(thumb(book.cover, "normal"), book.cover.url)
+        self.get_queue.return_value.enqueue.assert_called_once()
+        urls = generate_thumbnails(self.name)
+        self.assertNotEqual(urls["normal"], book.cover.url)
+        self.assertEqual(thumb(book.cover, "normal"), urls["normal"])
+
+    def test_command(self):
+        Edition.objects.create(title="Hyperion", cover=self.name)
+        self.assertEqual(get_cached_images([self.name]), set())
+        call_command("thumbnail", workers=1)
+        self.assertEqual(get_cached_images([self.name]), {self.name})
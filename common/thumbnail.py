@@ -0,0 +1,95 @@
+"""
+Precomputed thumbnails
+
+thumbnails of all aliases in THUMBNAIL_ALIASES are generated in background when an image
+is saved, and their urls are kept in cache so that rendering a page needs no file access;
+the original image is served until thumbnails are ready.
+"""
+
+import django_rq
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+from loguru import logger
+
+_CACHE_KEY = "thumb:{}"
+_PENDING_CACHE_KEY = "thumb_pending:{}"
+_PENDING_CACHE_TIMEOUT = 3600
+_QUEUE = "fetch"
+
+
+def is_thumbnailable(name: str | None) -> bool:
+    return bool(name) and not name.lower().endswith(".svg")  # type: ignore
+
+
+def get_thumbnail_url(source, alias: str) -> str:
+    """url of precomputed thumbnail, or of the original image if it's not ready yet"""
+    if not is_thumbnailable(source.name):
+        return source.url
+    urls = cache.get(_CACHE_KEY.format(source.name))
+    if urls and alias in urls:
+        return urls[alias]
+    enqueue_thumbnails(source.name)
+    return source.url
+
+
+def get_cached_images(names: list[str]) -> set[str]:
+    """images with thumbnail urls in cache"""
+    keys = {_CACHE_KEY.format(n): n for n in names}
+    return {keys[k] for k in cache.get_many(list(keys.keys()))}
+
+
+def generate_thumbnails(name: str) -> dict[str, str]:
+    """generate thumbnails of all aliases for an image and cache their urls"""
+    thumbnailer = get_thumbnailer(default_storage, name)
+    urls = {alias: thumbnailer[alias].url for alias in aliases.all()}
+    cache.set(_CACHE_KEY.format(name), urls, timeout=None)
+    cache.delete(_PENDING_CACHE_KEY.format(name))
+    return urls
+
+
+def generate_thumbnails_task(names: list[str]) -> int:
+    count = 0
+    for name in names:
+        try:
+            generate_thumbnails(name)
+            count += 1
+        except Exception as e:
+            logger.warning(f"unable to generate thumbnails for {name}: {e}")
+    return count
+
+
+def enqueue_thumbnails(name: str):
+    # an image is queued at most once until it's done or pending state expires
+    if is_thumbnailable(name) and cache.add(
+        _PENDING_CACHE_KEY.format(name), 1, timeout=_PENDING_CACHE_TIMEOUT
+    ):
+        django_rq.get_queue(_QUEUE).enqueue(generate_thumbnails_task, [name])
+
+
+def _image_loaded_handler(sender, instance, **kwargs):
+    if sender._thumbnail_field not in instance.get_deferred_fields():
+        instance._thumbnail_state = getattr(instance, sender._thumbnail_field).name
+
+
+def _image_saved_handler(sender, instance, created, **kwargs):
+    if sender._thumbnail_field in instance.get_deferred_fields():
+        return
+    name = getattr(instance, sender._thumbnail_field).name
+    if created or name != getattr(instance, "_thumbnail_state", None):
+        instance._thumbnail_state = name
+        if is_thumbnailable(name):
+            transaction.on_commit(lambda: enqueue_thumbnails(name))
+
+
+def register_image_model(model, field: str = "cover"):
+    """generate thumbnails when image field of model is changed"""
+    if settings.DISABLE_MODEL_SIGNAL:
+        return
+    model._thumbnail_field = field
+    post_init.connect(_image_loaded_handler, sender=model)
+    post_save.connect(_image_saved_handler, sender=model)
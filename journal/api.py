@@ -11,6 +11,7 @@ from common.api import *
 from .models import (
     Collection,
     Mark,
+    MarkSet,
     Review,
     ShelfType,
     Tag,
@@ -41,12 +42,20 @@ class MarkInSchema(Schema):
     post_to_fediverse: bool = False
 
 
+class MarkPagination(PageNumberPagination):
+    def paginate_queryset(self, queryset, pagination, **params):
+        val = super().paginate_queryset(queryset, pagination, **params)
+        val["data"] = list(val["data"])
+        MarkSet.attach(val["data"])
+        return val
+
+
 @api.get(
     "/me/shelf/{type}",
     response={200: List[MarkSchema], 401: Result, 403: Result},
     tags=["mark"],
 )
-@paginate(PageNumberPagination)
+@paginate(MarkPagination)
 def list_marks_on_shelf(
     request, type: ShelfType, category: AvailableItemCategory | None = None
 ):
@@ -8,9 +8,24 @@ class JournalConfig(AppConfig):
     def ready(self):
         # load key modules in proper order, make sure class inject and signal works as expected
         from catalog.models import Indexer
+        from common.thumbnail import register_image_model
 
         from . import api
-        from .models import Rating, Tag
+        from .models import (
+            Collection,
+            ItemMarkCount,
+            Rating,
+            RatingSummary,
+            ShelfCount,
+            ShelfManager,
+            Tag,
+        )
 
         Indexer.register_list_model(Tag)
+        RatingSummary.register_rating_model()
+        ItemMarkCount.register_shelfmember_model()
+        ShelfCount.register_piece_models()
+        ShelfManager.register_calendar_models()
         Indexer.register_piece_model(Rating)
+        register_image_model(Collection, "cover")
+        Collection.register_stats_models()
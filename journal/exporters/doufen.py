@@ -1,5 +1,8 @@
 import os
 from datetime import datetime
+from functools import reduce
+from itertools import batched
+from operator import or_
 
 from django.conf import settings
 from openpyxl import Workbook
@@ -8,29 +11,170 @@ from catalog.models import *
 from common.utils import GenerateDateUUIDMediaFilePath
 from journal.models import *
 
+_BATCH_SIZE = 500
+_DOUBAN_ID_TYPES = [
+    IdType.DoubanBook,
+    IdType.DoubanMovie,
+    IdType.DoubanMusic,
+    IdType.DoubanGame,
+    IdType.DoubanDrama,
+]
 
-def _get_source_url(item):
-    res = (
-        item.external_resources.all()
-        .filter(
-            id_type__in=[
-                IdType.DoubanBook,
-                IdType.DoubanMovie,
-                IdType.DoubanMusic,
-                IdType.DoubanGame,
-                IdType.DoubanDrama,
-            ]
-        )
-        .first()
+
+def _get_source_urls(item_ids: list[int]) -> dict[int, str]:
+    """source url for each item, douban url is preferred if there is one"""
+    douban_urls = {}
+    other_urls = {}
+    for item_id, id_type, url in (
+        ExternalResource.objects.filter(item_id__in=item_ids)
+        .order_by("pk")
+        .values_list("item_id", "id_type", "url")
+    ):
+        urls = douban_urls if id_type in _DOUBAN_ID_TYPES else other_urls
+        urls.setdefault(item_id, url)
+    return {i: douban_urls.get(i) or other_urls.get(i) or "" for i in item_ids}
+
+
+def _movie_summary(movie):
+    return (
+        str(movie.year or "")
+        + " / "
+        + ",".join(movie.area or [])
+        + " / "
+        + ",".join(movie.genre or [])
+        + " / "
+        + ",".join(movie.director or [])
+        + " / "
+        + ",".join(movie.actor or [])
     )
-    if not res:
-        res = item.external_resources.all().first()
-    return res.url if res else ""
 
 
-def export_marks_task(user):
-    user.preference.export_status["marks_pending"] = True
+def _album_summary(album):
+    return (
+        ",".join(album.artist or [])
+        + " / "
+        + (album.release_date.strftime("%Y") if album.release_date else "")
+    )
+
+
+def _book_summary(book):
+    return (
+        ",".join(book.author or [])
+        + " / "
+        + str(book.pub_year or "")
+        + " / "
+        + (book.pub_house or "")
+    )
+
+
+def _game_summary(game):
+    return (
+        ",".join(game.genre or [])
+        + " / "
+        + ",".join(game.platform or [])
+        + " / "
+        + (game.release_date.strftime("%Y-%m-%d") if game.release_date else "")
+    )
+
+
+def _podcast_summary(podcast):
+    return ",".join(podcast.host or [])
+
+
+# categories, sheet names for complete/progress/wishlist, summary, other id
+_MARK_SHEETS = [
+    (
+        [ItemCategory.Movie, ItemCategory.TV],
+        ["看过", "在看", "想看"],
+        _movie_summary,
+        lambda i: i.imdb,
+    ),
+    (
+        [ItemCategory.Music],
+        ["听过", "在听", "想听"],
+        _album_summary,
+        lambda i: i.barcode,
+    ),
+    ([ItemCategory.Book], ["读过", "在读", "想读"], _book_summary, lambda i: i.isbn),
+    ([ItemCategory.Game], ["玩过", "在玩", "想玩"], _game_summary, lambda i: ""),
+    (
+        [ItemCategory.Podcast],
+        ["听过的播客", "在听的播客", "想听的播客"],
+        _podcast_summary,
+        lambda i: "",
+    ),
+]
+_MARK_SHEET_SHELF_TYPES = [ShelfType.COMPLETE, ShelfType.PROGRESS, ShelfType.WISHLIST]
+_REVIEW_SHEETS = [
+    (ItemCategory.Movie, "影评"),
+    (ItemCategory.Book, "书评"),
+    (ItemCategory.Music, "乐评"),
+    (ItemCategory.Game, "游戏评论"),
+    (ItemCategory.Podcast, "播客评论"),
+]
+
+
+def _q_item_in_categories(categories):
+    return reduce(or_, [q_item_in_category(c) for c in categories])
+
+
+def _append_row(ws, line):
+    # write empty string instead of None so that each row has all columns,
+    # otherwise rows may be truncated when read by DoubanImporter in read_only mode
+    ws.append(["" if v is None else v for v in line])
+
+
+def _iter_marks(owner, members):
+    """
+    yield (shelf member, item, my rating, comment, tags, item rating summary, source url),
+    journal data for each batch of members are loaded in a few queries
+    """
+    for batch in batched(
+        members.prefetch_related("item").iterator(_BATCH_SIZE), _BATCH_SIZE
+    ):
+        item_ids = [m.item_id for m in batch]
+        marks = MarkSet(owner, [m.item for m in batch], batch)
+        summaries = {
+            s.item_id: s for s in RatingSummary.objects.filter(item_id__in=item_ids)
+        }
+        source_urls = _get_source_urls(item_ids)
+        for m in batch:
+            mark = marks[m.item_id]
+            yield (
+                m,
+                m.item,
+                mark.rating_grade,
+                mark.comment_text,
+                mark.tags,
+                summaries.get(m.item_id) or RatingSummary(item_id=m.item_id),
+                source_urls[m.item_id],
+            )
+
+
+def _update_export_status(user, **kwargs):
+    user.preference.export_status.update(kwargs)
     user.preference.save(update_fields=["export_status"])
+
+
+def export_marks_task(user):
+    owner = user.identity
+    all_categories = [c for cats, _, _, _ in _MARK_SHEETS for c in cats]
+    total = (
+        ShelfMember.objects.filter(
+            owner=owner, parent__shelf_type__in=_MARK_SHEET_SHELF_TYPES
+        )
+        .filter(_q_item_in_categories(all_categories))
+        .count()
+    )
+    total += (
+        Review.objects.filter(owner=owner)
+        .filter(_q_item_in_categories([c for c, _ in _REVIEW_SHEETS]))
+        .count()
+    )
+    processed = 0
+    _update_export_status(
+        user, marks_pending=True, marks_total=total, marks_processed=processed
+    )
     filename = GenerateDateUUIDMediaFilePath(
         "f.xlsx", settings.MEDIA_ROOT + "/" + settings.EXPORT_FILE_PATH_ROOT
     )
@@ -48,213 +192,36 @@ def export_marks_task(user):
         "NeoDB链接",
         "其它ID",
     ]
-    wb = Workbook()
-    # adding write_only=True will speed up but corrupt the xlsx and won't be importable
-    for status, label in [
-        (ShelfType.COMPLETE, "看过"),
-        (ShelfType.PROGRESS, "在看"),
-        (ShelfType.WISHLIST, "想看"),
-    ]:
-        ws = wb.create_sheet(title=label)
-        shelf = user.shelf_manager.get_shelf(status)
-        q = q_item_in_category(ItemCategory.Movie) | q_item_in_category(ItemCategory.TV)
-        marks = shelf.members.all().filter(q).order_by("created_time")
-        ws.append(heading)
-        for mm in marks:
-            mark = mm.mark
-            movie = mark.item
-            title = movie.title
-            summary = (
-                str(movie.year or "")
-                + " / "
-                + ",".join(movie.area or [])
-                + " / "
-                + ",".join(movie.genre or [])
-                + " / "
-                + ",".join(movie.director or [])
-                + " / "
-                + ",".join(movie.actor or [])
-            )
-            tags = ",".join(mark.tags)
-            world_rating = (movie.rating / 2) if movie.rating else None
-            timestamp = mark.created_time.strftime("%Y-%m-%d %H:%M:%S")
-            my_rating = (mark.rating_grade / 2) if mark.rating_grade else None
-            text = mark.comment_text
-            source_url = _get_source_url(movie)
-            url = movie.absolute_url
-            line = [
-                title,
-                summary,
-                world_rating,
-                source_url,
-                timestamp,
-                my_rating,
-                tags,
-                text,
-                url,
-                movie.imdb,
-            ]
-            ws.append(line)
-
-    for status, label in [
-        (ShelfType.COMPLETE, "听过"),
-        (ShelfType.PROGRESS, "在听"),
-        (ShelfType.WISHLIST, "想听"),
-    ]:
-        ws = wb.create_sheet(title=label)
-        shelf = user.shelf_manager.get_shelf(status)
-        q = q_item_in_category(ItemCategory.Music)
-        marks = shelf.members.all().filter(q).order_by("created_time")
-        ws.append(heading)
-        for mm in marks:
-            mark = mm.mark
-            album = mark.item
-            title = album.title
-            summary = (
-                ",".join(album.artist)
-                + " / "
-                + (album.release_date.strftime("%Y") if album.release_date else "")
-            )
-            tags = ",".join(mark.tags)
-            world_rating = (album.rating / 2) if album.rating else None
-            timestamp = mark.created_time.strftime("%Y-%m-%d %H:%M:%S")
-            my_rating = (mark.rating_grade / 2) if mark.rating_grade else None
-            text = mark.comment_text
-            source_url = _get_source_url(album)
-            url = album.absolute_url
-            line = [
-                title,
-                summary,
-                world_rating,
-                source_url,
-                timestamp,
-                my_rating,
-                tags,
-                text,
-                url,
-                album.barcode,
-            ]
-            ws.append(line)
-
-    for status, label in [
-        (ShelfType.COMPLETE, "读过"),
-        (ShelfType.PROGRESS, "在读"),
-        (ShelfType.WISHLIST, "想读"),
-    ]:
-        ws = wb.create_sheet(title=label)
-        shelf = user.shelf_manager.get_shelf(status)
-        q = q_item_in_category(ItemCategory.Book)
-        marks = shelf.members.all().filter(q).order_by("created_time")
-        ws.append(heading)
-        for mm in marks:
-            mark = mm.mark
-            book = mark.item
-            title = book.title
-            summary = (
-                ",".join(book.author or [])
-                + " / "
-                + str(book.pub_year or "")
-                + " / "
-                + (book.pub_house or "")
-            )
-            tags = ",".join(mark.tags)
-            world_rating = (book.rating / 2) if book.rating else None
-            timestamp = mark.created_time.strftime("%Y-%m-%d %H:%M:%S")
-            my_rating = (mark.rating_grade / 2) if mark.rating_grade else None
-            text = mark.comment_text
-            source_url = _get_source_url(book)
-            url = book.absolute_url
-            line = [
-                title,
-                summary,
-                world_rating,
-                source_url,
-                timestamp,
-                my_rating,
-                tags,
-                text,
-                url,
-                book.isbn,
-            ]
-            ws.append(line)
-
-    for status, label in [
-        (ShelfType.COMPLETE, "玩过"),
-        (ShelfType.PROGRESS, "在玩"),
-        (ShelfType.WISHLIST, "想玩"),
-    ]:
-        ws = wb.create_sheet(title=label)
-        shelf = user.shelf_manager.get_shelf(status)
-        q = q_item_in_category(ItemCategory.Game)
-        marks = shelf.members.all().filter(q).order_by("created_time")
-        ws.append(heading)
-        for mm in marks:
-            mark = mm.mark
-            game = mark.item
-            title = game.title
-            summary = (
-                ",".join(game.genre or [])
-                + " / "
-                + ",".join(game.platform or [])
-                + " / "
-                + (game.release_date.strftime("%Y-%m-%d") if game.release_date else "")
-            )
-            tags = ",".join(mark.tags)
-            world_rating = (game.rating / 2) if game.rating else None
-            timestamp = mark.created_time.strftime("%Y-%m-%d %H:%M:%S")
-            my_rating = (mark.rating_grade / 2) if mark.rating_grade else None
-            text = mark.comment_text
-            source_url = _get_source_url(game)
-            url = game.absolute_url
-            line = [
-                title,
-                summary,
-                world_rating,
-                source_url,
-                timestamp,
-                my_rating,
-                tags,
-                text,
-                url,
-                "",
-            ]
-            ws.append(line)
-
-    for status, label in [
-        (ShelfType.COMPLETE, "听过的播客"),
-        (ShelfType.PROGRESS, "在听的播客"),
-        (ShelfType.WISHLIST, "想听的播客"),
-    ]:
-        ws = wb.create_sheet(title=label)
-        shelf = user.shelf_manager.get_shelf(status)
-        q = q_item_in_category(ItemCategory.Podcast)
-        marks = shelf.members.all().filter(q).order_by("created_time")
-        ws.append(heading)
-        for mm in marks:
-            mark = mm.mark
-            podcast = mark.item
-            title = podcast.title
-            summary = ",".join(podcast.host or [])
-            tags = ",".join(mark.tags)
-            world_rating = (podcast.rating / 2) if podcast.rating else None
-            timestamp = mark.created_time.strftime("%Y-%m-%d %H:%M:%S")
-            my_rating = (mark.rating_grade / 2) if mark.rating_grade else None
-            text = mark.comment_text
-            source_url = _get_source_url(podcast)
-            url = podcast.absolute_url
-            line = [
-                title,
-                summary,
-                world_rating,
-                source_url,
-                timestamp,
-                my_rating,
-                tags,
-                text,
-                url,
-                "",
-            ]
-            ws.append(line)
+    # rows are streamed to file, they must be padded by _append_row() to be importable
+    wb = Workbook(write_only=True)
+    for categories, labels, get_summary, get_other_id in _MARK_SHEETS:
+        for status, label in zip(_MARK_SHEET_SHELF_TYPES, labels):
+            ws = wb.create_sheet(title=label)
+            shelf = user.shelf_manager.get_shelf(status)
+            q = _q_item_in_categories(categories)
+            members = shelf.members.all().filter(q).order_by("created_time")
+            ws.append(heading)
+            for mm, item, rating_grade, text, tags, stat, source_url in _iter_marks(
+                owner, members
+            ):
+                world_rating = (stat.rating / 2) if stat.rating else None
+                timestamp = mm.created_time.strftime("%Y-%m-%d %H:%M:%S")
+                my_rating = (rating_grade / 2) if rating_grade else None
+                line = [
+                    item.title,
+                    get_summary(item),
+                    world_rating,
+                    source_url,
+                    timestamp,
+                    my_rating,
+                    ",".join(tags),
+                    text,
+                    item.absolute_url,
+                    get_other_id(item),
+                ]
+                _append_row(ws, line)
+                processed += 1
+            _update_export_status(user, marks_processed=processed)
 
     review_heading = [
         "标题",
@@ -267,47 +234,48 @@ def export_marks_task(user):
         "评论对象原始链接",
         "评论对象NeoDB链接",
     ]
-    for category, label in [
-        (ItemCategory.Movie, "影评"),
-        (ItemCategory.Book, "书评"),
-        (ItemCategory.Music, "乐评"),
-        (ItemCategory.Game, "游戏评论"),
-        (ItemCategory.Podcast, "播客评论"),
-    ]:
+    for category, label in _REVIEW_SHEETS:
         ws = wb.create_sheet(title=label)
         q = q_item_in_category(category)
         reviews = (
-            Review.objects.filter(owner=user.identity)
+            Review.objects.filter(owner=owner)
             .filter(q)
             .order_by("created_time")
+            .prefetch_related("item")
         )
         ws.append(review_heading)
-        for review in reviews:
-            title = review.title
-            target = "《" + review.item.title + "》"
-            url = review.absolute_url
-            timestamp = review.created_time.strftime("%Y-%m-%d %H:%M:%S")
-            my_rating = None  # (mark.rating_grade / 2) if mark.rating_grade else None
-            content = review.body
-            target_source_url = _get_source_url(review.item)
-            target_url = review.item.absolute_url
-            line = [
-                title,
-                target,
-                url,
-                timestamp,
-                my_rating,
-                label,
-                content,
-                target_source_url,
-                target_url,
-            ]
-            ws.append(line)
+        for batch in batched(reviews.iterator(_BATCH_SIZE), _BATCH_SIZE):
+            source_urls = _get_source_urls([r.item_id for r in batch])
+            for review in batch:
+                title = review.title
+                target = "《" + review.item.title + "》"
+                url = review.absolute_url
+                timestamp = review.created_time.strftime("%Y-%m-%d %H:%M:%S")
+                my_rating = (
+                    None  # (mark.rating_grade / 2) if mark.rating_grade else None
+                )
+                content = review.body
+                target_source_url = source_urls[review.item_id]
+                target_url = review.item.absolute_url
+                line = [
+                    title,
+                    target,
+                    url,
+                    timestamp,
+                    my_rating,
+                    label,
+                    content,
+                    target_source_url,
+                    target_url,
+                ]
+                _append_row(ws, line)
+                processed += 1
+        _update_export_status(user, marks_processed=processed)
 
     wb.save(filename=filename)
-    user.preference.export_status["marks_pending"] = False
-    user.preference.export_status["marks_file"] = filename
-    user.preference.export_status["marks_date"] = datetime.now().strftime(
-        "%Y-%m-%d %H:%M"
+    _update_export_status(
+        user,
+        marks_pending=False,
+        marks_file=filename,
+        marks_date=datetime.now().strftime("%Y-%m-%d %H:%M"),
     )
-    user.preference.save(update_fields=["export_status"])
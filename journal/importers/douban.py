@@ -1,5 +1,6 @@
 import os
 import re
+import time as timer
 from datetime import datetime
 
 import django_rq
@@ -18,6 +19,8 @@ from catalog.sites.douban import DoubanDownloader
 from common.utils import GenerateDateUUIDMediaFilePath
 from journal.models import *
 
+from .pipeline import ItemResolver, apply_marks
+
 _tz_sh = pytz.timezone("Asia/Shanghai")
 
 
@@ -55,7 +58,18 @@ class DoubanImporter:
         self.visibility = visibility
         self.mode = mode
 
-    def update_user_import_status(self, status):
+    status_interval = 5  # seconds between saving status while importing
+
+    def update_user_import_status(self, status, force=False):
+        # status is saved at most every status_interval seconds while importing (1)
+        now = timer.monotonic()
+        if (
+            status == 1
+            and not force
+            and now - getattr(self, "_status_time", 0) < self.status_interval
+        ):
+            return
+        self._status_time = now
         self.user.preference.import_status["douban_pending"] = status
         self.user.preference.import_status["douban_file"] = self.file
         self.user.preference.import_status["douban_visibility"] = self.visibility
@@ -138,6 +152,7 @@ class DoubanImporter:
     mark_data = {}
     review_data = {}
     entity_lookup = {}
+    items = {}
 
     def load_sheets(self):
         """Load data into mark_data / review_data / entity_lookup"""
@@ -196,7 +211,11 @@ class DoubanImporter:
         with set_actor(self.user):
             self.load_sheets()
             logger.info(f"{self.user} sheet loaded, {self.total} lines total")
-            self.update_user_import_status(1)
+            self.update_user_import_status(1, force=True)
+            # resolve items of all marks first, then mark them in batches
+            self.items = ItemResolver(self.get_item_by_url).resolve(
+                cells[3] for sheet in self.mark_data.values() for cells in sheet
+            )
             for name, param in self.mark_sheet_config.items():
                 self.import_mark_sheet(self.mark_data[name], param[0], name)
             for name, param in self.review_sheet_config.items():
@@ -217,42 +236,46 @@ class DoubanImporter:
         if worksheet is None:  # or worksheet.max_row < 2:
             logger.warning(f"{prefix} empty sheet")
             return
-        for cells in worksheet:
-            if len(cells) < 6:
-                continue
-            # title = cells[0] or ""
-            url = cells[3]
-            time = cells[4]
-            rating = cells[5]
-            try:
-                rating_grade = int(rating) * 2 if rating else None
-            except Exception:
-                rating_grade = None
-            tags = cells[6] if len(cells) >= 7 else ""
-            try:
-                tags = tags.split(",") if tags else []
-            except Exception:
-                tags = []
-            comment = cells[7] if len(cells) >= 8 else None
-            self.processed += 1
-            try:
-                if type(time) == str:
-                    time = datetime.strptime(time, "%Y-%m-%d %H:%M:%S")
-                time = time.replace(tzinfo=_tz_sh)
-            except Exception:
-                time = None
-            r = self.import_mark(url, shelf_type, comment, rating_grade, tags, time)
-            if r == 1:
-                self.imported += 1
-            elif r == 2:
-                self.skipped += 1
-            self.update_user_import_status(1)
+        apply_marks(
+            [cells for cells in worksheet if len(cells) >= 6],
+            lambda cells: self.import_mark_row(cells, shelf_type),
+            on_batch=lambda _: self.update_user_import_status(1),
+        )
+
+    def import_mark_row(self, cells, shelf_type):
+        # title = cells[0] or ""
+        url = cells[3]
+        time = cells[4]
+        rating = cells[5]
+        try:
+            rating_grade = int(rating) * 2 if rating else None
+        except Exception:
+            rating_grade = None
+        tags = cells[6] if len(cells) >= 7 else ""
+        try:
+            tags = tags.split(",") if tags else []
+        except Exception:
+            tags = []
+        comment = cells[7] if len(cells) >= 8 else None
+        self.processed += 1
+        try:
+            if type(time) == str:
+                time = datetime.strptime(time, "%Y-%m-%d %H:%M:%S")
+            time = time.replace(tzinfo=_tz_sh)
+        except Exception:
+            time = None
+        mark = self.import_mark(url, shelf_type, comment, rating_grade, tags, time)
+        if mark:
+            self.imported += 1
+        elif mark is False:
+            self.skipped += 1
+        return mark or None
 
     def import_mark(self, url, shelf_type, comment, rating_grade, tags, time):
         """
-        Import one mark: return 1: done / 2: skipped / None: failed
+        Import one mark: return updated Mark with post deferred / False: skipped / None: failed
         """
-        item = self.get_item_by_url(url)
+        item = self.items.get(url) if url in self.items else self.get_item_by_url(url)
         if not item:
             logger.warning(f"{self.user} | match/fetch {url} failed")
             return
@@ -266,12 +289,18 @@ class DoubanImporter:
             )
         ):
             print("-", end="", flush=True)
-            return 2
+            return False
         mark.update(
-            shelf_type, comment, rating_grade, tags, self.visibility, created_time=time
+            shelf_type,
+            comment,
+            rating_grade,
+            tags,
+            self.visibility,
+            created_time=time,
+            defer_post=True,
         )
         print("+", end="", flush=True)
-        return 1
+        return mark
 
     def import_review_sheet(self, worksheet, sheet_name):
         prefix = f"{self.user} {sheet_name}|"
@@ -402,4 +431,7 @@ class DoubanImporter:
             )
             if r:
                 Review.objects.filter(pk=r.pk).update(**params)
+                if r.visibility != self.visibility:
+                    for v in [r.visibility, self.visibility]:
+                        ShelfCount.update_for_reviews(r.owner_id, item.category, v)
         return 1
@@ -12,6 +12,8 @@ from catalog.common.downloaders import *
 from catalog.models import *
 from journal.models import *
 
+from .pipeline import ItemResolver, apply_marks
+
 re_list = r"^https://www\.goodreads\.com/list/show/\d+"
 re_shelf = r"^https://www\.goodreads\.com/review/list/\d+[^\?]*\?shelf=[^&]+"
 re_profile = r"^https://www\.goodreads\.com/user/show/(\d+)"
@@ -61,9 +63,10 @@ class GoodreadsImporter:
                         + ")",
                         owner=user.identity,
                     )
-                    for book in shelf["books"]:
-                        collection.append_item(book["book"], note=book["review"])
-                        total += 1
+                    collection.append_items(
+                        [(b["book"], {"note": b["review"]}) for b in shelf["books"]]
+                    )
+                    total += len(shelf["books"])
                     collection.save()
                 msg.success(
                     user,
@@ -79,36 +82,51 @@ class GoodreadsImporter:
                 for shelf_type in shelves:
                     shelf_url = shelves.get(shelf_type)
                     shelf = cls.parse_shelf(shelf_url, user)
-                    for book in shelf["books"]:
-                        mark = Mark(user.identity, book["book"])
-                        if (
-                            (
-                                mark.shelf_type == shelf_type
-                                and mark.comment_text == book["review"]
-                            )
-                            or (
-                                mark.shelf_type == ShelfType.COMPLETE
-                                and shelf_type != ShelfType.COMPLETE
-                            )
-                            or (
-                                mark.shelf_type == ShelfType.PROGRESS
-                                and shelf_type == ShelfType.WISHLIST
-                            )
-                        ):
-                            print(
-                                f'Skip {shelf_type}/{book["book"]} bc it was marked {mark.shelf_type}'
-                            )
-                        else:
-                            mark.update(
-                                shelf_type,
-                                book["review"],
-                                book["rating"],
-                                visibility=visibility,
-                                created_time=book["last_updated"] or timezone.now(),
-                            )
-                        total += 1
+                    apply_marks(
+                        shelf["books"],
+                        lambda book: cls.mark_book(user, book, shelf_type, visibility),
+                    )
+                    total += len(shelf["books"])
                 msg.success(user, f"Imported {total} records from Goodreads profile.")
 
+    @classmethod
+    def mark_book(cls, user, book, shelf_type, visibility):
+        mark = Mark(user.identity, book["book"])
+        if (
+            (mark.shelf_type == shelf_type and mark.comment_text == book["review"])
+            or (
+                mark.shelf_type == ShelfType.COMPLETE
+                and shelf_type != ShelfType.COMPLETE
+            )
+            or (
+                mark.shelf_type == ShelfType.PROGRESS
+                and shelf_type == ShelfType.WISHLIST
+            )
+        ):
+            print(
+                f'Skip {shelf_type}/{book["book"]} bc it was marked {mark.shelf_type}'
+            )
+            return None
+        mark.update(
+            shelf_type,
+            book["review"],
+            book["rating"],
+            visibility=visibility,
+            created_time=book["last_updated"] or timezone.now(),
+            defer_post=True,
+        )
+        return mark
+
+    @classmethod
+    def resolve_books(cls, books, user):
+        """resolve urls of books to items concurrently, and drop unresolved ones"""
+        items = ItemResolver(lambda url: cls.get_book(url, user)).resolve(
+            b["url"] for b in books
+        )
+        for b in books:
+            b["book"] = items.get(b["url"])
+        return [b for b in books if b["book"]]
+
     @classmethod
     def get_book(cls, url, user):
         site = SiteManager.get_site_by_url(url)
@@ -193,26 +211,21 @@ class GoodreadsImporter:
                             )
                 except Exception:
                     print(f"Error loading/parsing review{url_review}, ignored")
-                try:
-                    book = cls.get_book(url_book, user)
-                    books.append(
-                        {
-                            "url": url_book,
-                            "book": book,
-                            "rating": rating,
-                            "review": review,
-                            "last_updated": last_updated,
-                        }
-                    )
-                except Exception as e:
-                    print(f"Error adding {url_book} {e}")
-                    pass  # likely just download error
+                books.append(
+                    {
+                        "url": url_book,
+                        "rating": rating,
+                        "review": review,
+                        "last_updated": last_updated,
+                    }
+                )
             next_elem = content.xpath("//a[@class='next_page']/@href")
             url_shelf = (
                 f"https://www.goodreads.com{next_elem[0].strip()}"  # type:ignore
                 if next_elem
                 else None
             )
+        books = cls.resolve_books(books, user)
         return {"title": title, "description": "", "books": books}
 
     @classmethod
@@ -236,22 +249,12 @@ class GoodreadsImporter:
             links = content.xpath('//a[@class="bookTitle"]/@href')
             for link in links:  # type:ignore
                 url_book = "https://www.goodreads.com" + link
-                try:
-                    book = cls.get_book(url_book, user)
-                    books.append(
-                        {
-                            "url": url_book,
-                            "book": book,
-                            "review": "",
-                        }
-                    )
-                except Exception:
-                    print("Error adding " + url_book)
-                    pass  # likely just download error
+                books.append({"url": url_book, "review": ""})
             next_elem = content.xpath("//a[@class='next_page']/@href")
             url_shelf = (
                 f"https://www.goodreads.com{next_elem[0].strip()}"  # type:ignore
                 if next_elem
                 else None
             )
+        books = cls.resolve_books(books, user)
         return {"title": title, "description": description, "books": books}
@@ -14,6 +14,8 @@ from catalog.models import *
 from journal.models import *
 from users.models import *
 
+from .pipeline import ItemResolver, apply_marks
+
 _tz_sh = pytz.timezone("Asia/Shanghai")
 
 
@@ -34,6 +36,8 @@ class LetterboxdImporter(Task):
     class Meta:
         proxy = True
 
+    items: dict[str, Item | None]
+
     def get_item_by_url(self, url):
         try:
             h = BasicDownloader(url).download().html()
@@ -72,7 +76,7 @@ class LetterboxdImporter(Task):
             logger.error(f"Fetching {url}: error {e}")
 
     def mark(self, url, shelf_type, date, rating=None, text=None, tags=None):
-        item = self.get_item_by_url(url)
+        item = self.items.get(url)
         if not item:
             logger.error(f"Unable to get item for {url}")
             self.progress(-1, url)
@@ -115,11 +119,18 @@ class LetterboxdImporter(Task):
             tags=tag_titles,
             visibility=visibility,
             created_time=dt,
+            defer_post=True,
         )
         self.progress(1)
+        return mark
+
+    def resolved(self, url, item):
+        resolved = len(self.items) + 1
+        self.items[url] = item
+        self.message = f"{resolved} of {self.metadata['total']} resolved"
+        self.save_progress()
 
     def progress(self, mark_state: int, url=None):
-        self.metadata["total"] += 1
         self.metadata["processed"] += 1
         match mark_state:
             case 1:
@@ -131,10 +142,10 @@ class LetterboxdImporter(Task):
                 if url:
                     self.metadata["failed_urls"].append(url)
         self.message = f"{self.metadata['imported']} imported, {self.metadata['skipped']} skipped, {self.metadata['failed']} failed"
-        self.save(update_fields=["metadata", "message"])
+        self.save_progress()
 
     def run(self):
-        uris = set()
+        rows = {}  # url: (url, shelf_type, date, rating, text, tags)
         filename = self.metadata["file"]
         with zipfile.ZipFile(filename, "r") as zipref:
             with tempfile.TemporaryDirectory() as tmpdirname:
@@ -143,8 +154,8 @@ class LetterboxdImporter(Task):
                 with open(tmpdirname + "/reviews.csv") as f:
                     reader = csv.DictReader(f, delimiter=",")
                     for row in reader:
-                        uris.add(row["Letterboxd URI"])
-                        self.mark(
+                        # the last review of a film wins, as if each is applied in order
+                        rows[row["Letterboxd URI"]] = (
                             row["Letterboxd URI"],
                             ShelfType.COMPLETE,
                             row["Watched Date"],
@@ -155,34 +166,35 @@ class LetterboxdImporter(Task):
                 with open(tmpdirname + "/ratings.csv") as f:
                     reader = csv.DictReader(f, delimiter=",")
                     for row in reader:
-                        if row["Letterboxd URI"] in uris:
-                            continue
-                        uris.add(row["Letterboxd URI"])
-                        self.mark(
+                        rows.setdefault(
                             row["Letterboxd URI"],
-                            ShelfType.COMPLETE,
-                            row["Date"],
-                            row["Rating"],
+                            (
+                                row["Letterboxd URI"],
+                                ShelfType.COMPLETE,
+                                row["Date"],
+                                row["Rating"],
+                            ),
                         )
                 with open(tmpdirname + "/watched.csv") as f:
                     reader = csv.DictReader(f, delimiter=",")
                     for row in reader:
-                        if row["Letterboxd URI"] in uris:
-                            continue
-                        uris.add(row["Letterboxd URI"])
-                        self.mark(
+                        rows.setdefault(
                             row["Letterboxd URI"],
-                            ShelfType.COMPLETE,
-                            row["Date"],
+                            (row["Letterboxd URI"], ShelfType.COMPLETE, row["Date"]),
                         )
                 with open(tmpdirname + "/watchlist.csv") as f:
                     reader = csv.DictReader(f, delimiter=",")
                     for row in reader:
-                        if row["Letterboxd URI"] in uris:
-                            continue
-                        uris.add(row["Letterboxd URI"])
-                        self.mark(
+                        rows.setdefault(
                             row["Letterboxd URI"],
-                            ShelfType.WISHLIST,
-                            row["Date"],
+                            (row["Letterboxd URI"], ShelfType.WISHLIST, row["Date"]),
                         )
+        self.metadata["total"] = len(rows)
+        self.items = {}
+        # resolve all films first, then mark them in batches
+        ItemResolver(self.get_item_by_url).resolve(rows.keys(), self.resolved)
+        apply_marks(
+            rows.values(),
+            lambda row: self.mark(*row),
+            on_error=lambda row: self.progress(-1, row[0]),
+        )
@@ -31,6 +31,7 @@ class OPMLImporter:
         logger.info(f"{self.user} import opml start")
         skip = 0
         collection = None
+        collection_items = []
         with set_actor(self.user):
             if self.mode == 1:
                 title = _("{username}'s podcast subscriptions").format(
@@ -59,7 +60,9 @@ class OPMLImporter:
                             ShelfType.PROGRESS, None, None, visibility=self.visibility
                         )
                 elif self.mode == 1 and collection:
-                    collection.append_item(item)
+                    collection_items.append(item)
+            if collection:
+                collection.append_items(collection_items)
         logger.info(f"{self.user} import opml end")
         msg.success(
             self.user,
@@ -0,0 +1,158 @@
+"""
+Two-stage import pipeline
+
+stage one: ItemResolver resolves unique urls to items concurrently
+stage two: apply_marks() applies marks in transactions and publishes posts after commit
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import batched
+from typing import Callable, Iterable
+from urllib.parse import urlparse
+
+from django.db import connections, transaction
+from loguru import logger
+
+from catalog.common import *
+from catalog.models import *
+from journal.models import Mark
+
+_BATCH_SIZE = 100
+
+
+class ItemResolver:
+    """
+    Resolve urls to items concurrently
+
+    urls with an ExternalResource linked to an item are resolved in bulk without fetching,
+    others are fetched in a thread pool, with concurrent fetches to each site limited to
+    max_workers_per_site, and each of them followed by at least min_interval seconds.
+    """
+
+    max_workers = 8
+    max_workers_per_site = 2
+    min_interval = 0.5
+
+    def __init__(self, fetch: Callable[[str], Item | None] | None = None):
+        self.fetch = fetch or self.fetch_item
+        self._site_limits: dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fetch_item(url: str) -> Item | None:
+        site = SiteManager.get_site_by_url(url)
+        if not site:
+            return None
+        item = site.get_item()
+        if not item:
+            resource = site.get_resource_ready()
+            item = resource.item if resource else None
+        return item
+
+    @staticmethod
+    def get_site_key(url: str) -> str:
+        cls = SiteManager.get_site_cls_by_url(url)
+        return str(cls.SITE_NAME) if cls else (urlparse(url).hostname or "")
+
+    def lookup(self, urls: Iterable[str]) -> dict[str, Item]:
+        """items of urls with existing ExternalResource, loaded in one query per id type"""
+        keys: dict[str, dict[str, str]] = {}
+        for url in urls:
+            cls = SiteManager.get_site_cls_by_url(url)
+            if not cls or not cls.ID_TYPE:
+                continue
+            id_value = cls.url_to_id(url)
+            if id_value:
+                keys.setdefault(cls.ID_TYPE, {})[id_value] = url
+        item_ids = {}
+        for id_type, values in keys.items():
+            for id_value, item_id in ExternalResource.objects.filter(
+                id_type=id_type, id_value__in=values.keys(), item__isnull=False
+            ).values_list("id_value", "item_id"):
+                item_ids[values[id_value]] = item_id
+        items = Item.objects.in_bulk(set(item_ids.values()))
+        return {
+            url: items[item_id]
+            for url, item_id in item_ids.items()
+            if item_id in items
+            and not items[item_id].is_deleted
+            and not items[item_id].merged_to_item_id
+        }
+
+    def _fetch(self, url: str) -> Item | None:
+        key = self.get_site_key(url)
+        with self._lock:
+            limit = self._site_limits.setdefault(
+                key, threading.Semaphore(self.max_workers_per_site)
+            )
+        with limit:
+            started = time.monotonic()
+            try:
+                return self.fetch(url)
+            except Exception as e:
+                logger.error(f"fetching error: {url}", extra={"exception": e})
+                return None
+            finally:
+                # each thread has its own db connection
+                connections.close_all()
+                time.sleep(max(0, self.min_interval - (time.monotonic() - started)))
+
+    def resolve(
+        self,
+        urls: Iterable[str],
+        on_resolved: Callable[[str, Item | None], None] | None = None,
+    ) -> dict[str, Item | None]:
+        """resolve unique urls to items, on_resolved(url, item) is called as each is done"""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        result: dict[str, Item | None] = dict(self.lookup(urls))
+        if on_resolved:
+            for url, item in result.items():
+                on_resolved(url, item)
+        pending = [u for u in urls if u not in result]
+        if pending:
+            logger.info(f"fetching {len(pending)} of {len(urls)} urls")
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                for url, item in zip(pending, executor.map(self._fetch, pending)):
+                    result[url] = item
+                    if on_resolved:
+                        on_resolved(url, item)
+        return result
+
+
+def apply_marks(
+    rows: Iterable,
+    apply: Callable[..., Mark | None],
+    on_error: Callable | None = None,
+    on_batch: Callable[[tuple], None] | None = None,
+    batch_size: int = _BATCH_SIZE,
+):
+    """
+    call apply(row) for rows in transactions of batch_size rows
+
+    apply() should update Mark with defer_post=True and return it, or None if unchanged;
+    posts of these marks are published after each transaction is committed,
+    on_error(row) is called if apply() raises, and on_batch(rows) after each batch
+    """
+    for batch in batched(rows, batch_size):
+        marks = []
+        with transaction.atomic():
+            for row in batch:
+                try:
+                    with transaction.atomic():
+                        mark = apply(row)
+                except Exception as e:
+                    logger.error(f"import error: {row}", extra={"exception": e})
+                    mark = None
+                    if on_error:
+                        on_error(row)
+                if mark:
+                    marks.append(mark)
+        for mark in marks:
+            try:
+                mark.publish()
+            except Exception as e:
+                logger.error(f"publish error: {mark.item}", extra={"exception": e})
+        if on_batch:
+            on_batch(batch)
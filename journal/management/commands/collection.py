@@ -60,7 +60,12 @@ class Command(BaseCommand):
             title=data["title"],
             brief=data["brief"],
         )
+        items = []
         for item in data["items"]:
             i = Item.get_by_url(item["url"])
-            collection.append_item(i, note=item["note"])
-            self.stderr.write(self.style.SUCCESS(f"Added {i}"))
+            if i is None:
+                self.stderr.write(self.style.ERROR(f"Not found {item['url']}"))
+                continue
+            items.append((i, {"note": item["note"]}))
+        collection.append_items(items)
+        self.stderr.write(self.style.SUCCESS(f"Added {len(items)} items"))
@@ -40,6 +40,21 @@ class Command(BaseCommand):
             action="store_true",
             help="check and fix remaining journal for merged and deleted items",
         )
+        parser.add_argument(
+            "--rebuild-rating-summary",
+            action="store_true",
+            help="rebuild rating stats for all items",
+        )
+        parser.add_argument(
+            "--rebuild-mark-count",
+            action="store_true",
+            help="rebuild daily mark count for all items",
+        )
+        parser.add_argument(
+            "--rebuild-shelf-count",
+            action="store_true",
+            help="rebuild shelf and review count for all identities",
+        )
 
     def integrity(self):
         self.stdout.write(f"Checking deleted items with remaining journals...")
@@ -60,6 +75,21 @@ class Command(BaseCommand):
         if options["integrity"]:
             self.integrity()
 
+        if options["rebuild_rating_summary"]:
+            self.stdout.write(f"Rebuilding rating summary...")
+            cnt = RatingSummary.rebuild()
+            self.stdout.write(f"{cnt} items rated.")
+
+        if options["rebuild_mark_count"]:
+            self.stdout.write(f"Rebuilding mark count...")
+            cnt = ItemMarkCount.rebuild()
+            self.stdout.write(f"{cnt} daily counts created.")
+
+        if options["rebuild_shelf_count"]:
+            self.stdout.write(f"Rebuilding shelf count...")
+            cnt = ShelfCount.rebuild()
+            self.stdout.write(f"{cnt} shelf counts created.")
+
         if options["purge"]:
             for pcls in [Content, ListMember]:
                 for cls in pcls.__subclasses__():
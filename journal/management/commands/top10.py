@@ -53,8 +53,7 @@ class Command(BaseCommand):
                     brief="*根据用户标记数统计*",
                     defaults={"visibility": 2},
                 )
-                for i in items:
-                    c.append_item(i)
+                c.append_items(items)
 
         # top10 = list(
         #     Comment.objects.filter(
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.13 on 2024-06-10 12:00
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+import journal.models.rating
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_alter_model_i18n"),
+        ("journal", "0026_pinned_tag_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RatingSummary",
+            fields=[
+                (
+                    "item",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating_summary",
+                        serialize=False,
+                        to="catalog.item",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("total", models.PositiveIntegerField(default=0)),
+                (
+                    "distribution",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.PositiveIntegerField(),
+                        default=journal.models.rating._default_distribution,
+                        size=10,
+                    ),
+                ),
+                ("edited_time", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.13 on 2024-06-12 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_alter_model_i18n"),
+        ("journal", "0027_ratingsummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ItemMarkCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "category",
+                    models.CharField(
+                        choices=[
+                            ("book", "Book"),
+                            ("movie", "Movie"),
+                            ("tv", "TV"),
+                            ("music", "Music"),
+                            ("game", "Game"),
+                            ("podcast", "Podcast"),
+                            ("performance", "Performance"),
+                            ("fanfic", "FanFic"),
+                            ("exhibition", "Exhibition"),
+                            ("collection", "Collection"),
+                        ],
+                        max_length=100,
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("local_count", models.PositiveIntegerField(default=0)),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="catalog.item",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["category", "day"],
+                        name="journal_ite_categor_6773c2_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="itemmarkcount",
+            constraint=models.UniqueConstraint(
+                fields=("item", "day"), name="unique_item_mark_count"
+            ),
+        ),
+    ]
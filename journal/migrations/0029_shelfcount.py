@@ -0,0 +1,65 @@
+# Generated by Django 4.2.13 on 2024-06-14 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0021_alter_user_language"),
+        ("journal", "0028_itemmarkcount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShelfCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "category",
+                    models.CharField(
+                        choices=[
+                            ("book", "Book"),
+                            ("movie", "Movie"),
+                            ("tv", "TV"),
+                            ("music", "Music"),
+                            ("game", "Game"),
+                            ("podcast", "Podcast"),
+                            ("performance", "Performance"),
+                            ("fanfic", "FanFic"),
+                            ("exhibition", "Exhibition"),
+                            ("collection", "Collection"),
+                        ],
+                        max_length=100,
+                    ),
+                ),
+                ("shelf_type", models.CharField(max_length=100)),
+                ("visibility", models.PositiveSmallIntegerField(default=0)),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="users.apidentity",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="shelfcount",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "category", "shelf_type", "visibility"),
+                name="unique_shelf_count",
+            ),
+        ),
+    ]
@@ -13,16 +13,25 @@ from .common import (
     q_piece_visible_to_user,
 )
 from .like import Like
-from .mark import Mark
+from .mark import Mark, MarkSet
 from .mixins import UserOwnedObjectMixin
 from .note import Note
-from .rating import Rating
+from .rating import Rating, RatingSummary
 from .renderers import render_md
 from .review import Review
-from .shelf import Shelf, ShelfLogEntry, ShelfManager, ShelfMember, ShelfType
+from .shelf import (
+    ItemMarkCount,
+    Shelf,
+    ShelfCount,
+    ShelfLogEntry,
+    ShelfManager,
+    ShelfMember,
+    ShelfType,
+)
 from .tag import Tag, TagManager, TagMember
 from .utils import (
     journal_exists_for_item,
+    prefetch_viewer_state,
     remove_data_by_user,
     reset_journal_visibility_for_user,
     update_journal_for_merged_item,
@@ -46,11 +55,15 @@ __all__ = [
     "q_piece_visible_to_user",
     "Like",
     "Mark",
+    "MarkSet",
     "Note",
     "Rating",
+    "RatingSummary",
     "render_md",
     "Review",
+    "ItemMarkCount",
     "Shelf",
+    "ShelfCount",
     "ShelfLogEntry",
     "ShelfManager",
     "ShelfMember",
@@ -59,6 +72,7 @@ __all__ = [
     "TagManager",
     "TagMember",
     "journal_exists_for_item",
+    "prefetch_viewer_state",
     "remove_data_by_user",
     "reset_journal_visibility_for_user",
     "update_journal_for_merged_item",
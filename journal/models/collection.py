@@ -1,24 +1,36 @@
 import re
+import uuid
 from functools import cached_property
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterable
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
 from django.utils.translation import gettext_lazy as _
 
 from catalog.collection.models import Collection as CatalogCollection
 from catalog.common import jsondata
 from catalog.common.utils import piece_cover_path
 from catalog.models import Item
+from takahe.db_routes import use_primary
 from takahe.utils import Takahe
 from users.models import APIdentity
 
 from .common import Piece
-from .itemlist import List, ListMember
+from .itemlist import List, ListMember, list_add_many
 from .renderers import render_md
+from .shelf import ShelfMember, ShelfType
 
 _RE_HTML_TAG = re.compile(r"<[^>]*>")
 
+# stats are cached with versions of owner and collection, which are changed when
+# owner's shelves or members of collection are changed, see register_stats_models()
+_STATS_CACHE_KEY = "collection_stats:{}:{}:{}:{}"
+_STATS_VERSION_CACHE_KEY = "collection_stats_ver:{}:{}"
+_STATS_CACHE_TIMEOUT = 86400 * 7
+
 
 class CollectionMember(ListMember):
     parent = models.ForeignKey(
@@ -75,29 +87,167 @@ class Collection(List):
         html = render_md(self.brief)
         return _RE_HTML_TAG.sub(" ", html)
 
+    def append_items(self, items, **params) -> list[CollectionMember]:
+        """
+        append items to the end of list in a few queries, return their members
+
+        each of items can be an Item or a tuple of (Item, params) for fields of its own,
+        params are used for all items, e.g. collection.append_items([(item, {"note": "abc"})]);
+        items already in list are skipped, and list_add_many is sent once with new members;
+        members are created in bulk without post_save, so this is not available for
+        other lists, whose members have handlers of post_save to update counters etc.
+        """
+        entries = [i if isinstance(i, tuple) else (i, {}) for i in items]
+        if any(item is None for item, _ in entries):
+            raise ValueError("item is None")
+        existing = {
+            m.item_id: m
+            for m in self.members.filter(item_id__in={i.pk for i, _ in entries})
+        }
+        position = self._next_position()
+        members: list[CollectionMember] = []
+        new_members: list[CollectionMember] = []
+        for item, p in entries:
+            member = existing.get(item.pk)
+            if not member:
+                member = self.MEMBER_CLASS(
+                    owner=self.owner,
+                    parent=self,
+                    position=position,
+                    item=item,
+                    **(params | p),
+                )
+                position += 1
+                existing[item.pk] = member
+                new_members.append(member)
+            members.append(member)
+        Piece.bulk_create_pieces(new_members)  # type:ignore
+        if new_members:
+            list_add_many.send(
+                sender=self.__class__, instance=self, members=new_members
+            )
+        return members
+
     def featured_since(self, owner: APIdentity):
         f = FeaturedCollection.objects.filter(target=self, owner=owner).first()
         return f.created_time if f else None
 
-    def get_stats(self, owner: APIdentity):
-        items = list(self.members.all().values_list("item_id", flat=True))
-        stats = {"total": len(items)}
-        for st, shelf in owner.shelf_manager.shelf_list.items():
-            stats[st] = shelf.members.all().filter(item_id__in=items).count()
-        stats["percentage"] = (
-            round(stats["complete"] * 100 / stats["total"]) if stats["total"] else 0
-        )
+    def get_stats(self, owner: APIdentity, cached: bool = True):
+        return Collection.get_stats_for_collections(owner, [self], cached)[self.pk]
+
+    def get_progress(self, owner: APIdentity, cached: bool = True):
+        return self.get_stats(owner, cached)["percentage"]
+
+    @staticmethod
+    def _compute_stats(owner: APIdentity, collection_ids: list[int]):
+        stats = {
+            pk: {"total": 0} | {st: 0 for st in ShelfType.values}
+            for pk in collection_ids
+        }
+        for pk, total in (
+            CollectionMember.objects.filter(parent_id__in=collection_ids)
+            .values("parent_id")
+            .annotate(total=Count("pk"))
+            .values_list("parent_id", "total")
+        ):
+            stats[pk]["total"] = total
+        for pk, st, count in (
+            ShelfMember.objects.filter(
+                owner=owner, item__collectionmember__parent_id__in=collection_ids
+            )
+            .values("item__collectionmember__parent_id", "parent__shelf_type")
+            .annotate(count=Count("pk"))
+            .values_list(
+                "item__collectionmember__parent_id", "parent__shelf_type", "count"
+            )
+        ):
+            stats[pk][st] = count
+        for s in stats.values():
+            s["percentage"] = (
+                round(s[ShelfType.COMPLETE] * 100 / s["total"]) if s["total"] else 0
+            )
+        return stats
+
+    @staticmethod
+    def _get_stats_versions(keys: list[str]) -> dict[str, str]:
+        versions = cache.get_many(keys)
+        missing = {k: uuid.uuid4().hex for k in keys if k not in versions}
+        if missing:
+            cache.set_many(missing, timeout=None)
+            versions.update(missing)
+        return versions
+
+    @classmethod
+    def get_stats_for_collections(
+        cls, owner: APIdentity, collections: "Iterable[Collection]", cached: bool = True
+    ) -> dict[int, dict]:
+        """
+        stats of owner's progress for collections, by their pks
+
+        number of members in total and on each shelf of owner, and percentage completed,
+        computed with one grouped join for all collections and cached if cached is True.
+        """
+        collection_ids = list({c.pk for c in collections})
+        if not collection_ids:
+            return {}
+        stats = {}
+        keys = {}
+        if cached:
+            owner_key = _STATS_VERSION_CACHE_KEY.format("owner", owner.pk)
+            version_keys = {
+                pk: _STATS_VERSION_CACHE_KEY.format("collection", pk)
+                for pk in collection_ids
+            }
+            versions = cls._get_stats_versions([owner_key, *version_keys.values()])
+            keys = {
+                _STATS_CACHE_KEY.format(
+                    owner.pk, versions[owner_key], pk, versions[version_keys[pk]]
+                ): pk
+                for pk in collection_ids
+            }
+            for key, s in cache.get_many(list(keys.keys())).items():
+                stats[keys[key]] = s
+        missing = [pk for pk in collection_ids if pk not in stats]
+        if missing:
+            # read from primary, replicas may lag behind the change cleared the cache
+            with use_primary():
+                computed = cls._compute_stats(owner, missing)
+            stats.update(computed)
+            if cached:
+                cache.set_many(
+                    {k: computed[pk] for k, pk in keys.items() if pk in computed},
+                    timeout=_STATS_CACHE_TIMEOUT,
+                )
         return stats
 
-    def get_progress(self, owner: APIdentity):
-        items = list(self.members.all().values_list("item_id", flat=True))
-        if len(items) == 0:
-            return 0
-        shelf = owner.shelf_manager.shelf_list["complete"]
-        return round(
-            shelf.members.all().filter(item_id__in=items).count() * 100 / len(items)
+    @staticmethod
+    def _renew_stats_version(kind: str, pk: int):
+        cache.set(
+            _STATS_VERSION_CACHE_KEY.format(kind, pk), uuid.uuid4().hex, timeout=None
         )
 
+    @staticmethod
+    def _shelfmember_changed_handler(sender, instance, **kwargs):
+        Collection._renew_stats_version("owner", instance.owner_id)
+
+    @staticmethod
+    def _member_changed_handler(sender, instance, **kwargs):
+        Collection._renew_stats_version("collection", instance.parent_id)
+
+    @staticmethod
+    def _members_added_handler(sender, instance, **kwargs):
+        Collection._renew_stats_version("collection", instance.pk)
+
+    @classmethod
+    def register_stats_models(cls):
+        for model, handler in [
+            (ShelfMember, cls._shelfmember_changed_handler),
+            (CollectionMember, cls._member_changed_handler),
+        ]:
+            post_save.connect(handler, sender=model)
+            post_delete.connect(handler, sender=model)
+        list_add_many.connect(cls._members_added_handler, sender=cls)
+
     def save(self, *args, **kwargs):
         from takahe.utils import Takahe
 
@@ -3,16 +3,17 @@ import uuid
 from abc import abstractmethod
 from datetime import datetime
 from functools import cached_property
-from typing import TYPE_CHECKING, Any, Self
+from typing import TYPE_CHECKING, Any, Iterable, Self
 
 import django_rq
 
 # from deepmerge import always_merger
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import PermissionDenied, RequestAborted
 from django.core.signing import b62_decode, b62_encode
-from django.db import models
-from django.db.models import CharField, Q
+from django.db import models, router, transaction
+from django.db.models import CharField, Max, Q
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from loguru import logger
@@ -50,7 +51,7 @@ def q_owned_piece_visible_to_user(viewing_user: User, owner: APIdentity):
         return Q(owner=owner)
     # elif viewer.is_blocked_by(owner):
     #     return Q(pk__in=[])
-    elif viewer.is_following(owner):
+    elif owner.pk in viewer.following:
         return Q(owner=owner, visibility__in=[0, 1])
     else:
         return Q(owner=owner, visibility=0)
@@ -62,7 +63,7 @@ def max_visiblity_to_user(viewing_user: User, owner: APIdentity):
     viewer = viewing_user.identity
     if viewer == owner:
         return 2
-    elif viewer.is_following(owner):
+    elif owner.pk in viewer.following:
         return 1
     else:
         return 0
@@ -134,11 +135,7 @@ class Piece(PolymorphicModel, UserOwnedObjectMixin):
 
     @property
     def like_count(self):
-        return (
-            Takahe.get_post_stats(self.latest_post.pk).get("likes", 0)
-            if self.latest_post
-            else 0
-        )
+        return (self.latest_post.stats or {}).get("likes", 0) if self.latest_post else 0
 
     def is_liked_by(self, identity):
         return self.latest_post and Takahe.post_liked_by(
@@ -148,9 +145,7 @@ class Piece(PolymorphicModel, UserOwnedObjectMixin):
     @property
     def reply_count(self):
         return (
-            Takahe.get_post_stats(self.latest_post.pk).get("replies", 0)
-            if self.latest_post
-            else 0
+            (self.latest_post.stats or {}).get("replies", 0) if self.latest_post else 0
         )
 
     def get_replies(self, viewing_identity):
@@ -198,6 +193,114 @@ class Piece(PolymorphicModel, UserOwnedObjectMixin):
         pk = self.latest_post_id
         return Takahe.get_post(pk) if pk else None
 
+    @classmethod
+    def prefetch_latest_posts(cls, pieces: Iterable["Piece"]):
+        """
+        load latest post (with its stats) for a list of pieces in two queries,
+        so that latest_post_id / latest_post / like_count / reply_count of each
+        piece can be used in a list without further queries.
+        """
+        pieces = [p for p in pieces if "latest_post" not in p.__dict__]
+        if not pieces:
+            return
+        post_ids = dict(
+            PiecePost.objects.filter(piece_id__in={p.pk for p in pieces})
+            .values("piece_id")
+            .annotate(latest_post_id=Max("post_id"))
+            .values_list("piece_id", "latest_post_id")
+        )
+        posts = Takahe.get_posts_by_pks([i for i in post_ids.values() if i])
+        for p in pieces:
+            pk = post_ids.get(p.pk)
+            p.__dict__["latest_post_id"] = pk
+            p.__dict__["latest_post"] = posts.get(pk) if pk else None
+
+    @classmethod
+    def prefetch_pieces_for_posts(cls, posts: Iterable["Post"]):
+        """
+        load piece and item of a list of posts in a few queries,
+        so that post.piece and post.item of each can be used without further queries.
+        """
+        from .shelf import ShelfLogEntryPost, ShelfMember
+
+        posts = [p for p in posts if p and "piece" not in p.__dict__]
+        if not posts:
+            return
+        post_ids = {p.pk for p in posts}
+        piece_ids: dict[int, list[int]] = {}
+        for post_id, piece_id in PiecePost.objects.filter(
+            post_id__in=post_ids
+        ).values_list("post_id", "piece_id"):
+            piece_ids.setdefault(post_id, []).append(piece_id)
+        pieces = Piece.objects.in_bulk({i for ids in piece_ids.values() for i in ids})
+        post_pieces: dict[int, Piece | None] = {}
+        for post_id, ids in piece_ids.items():
+            pcs = [pieces[i] for i in ids if i in pieces]
+            if len(pcs) == 1:
+                post_pieces[post_id] = pcs[0]
+            else:
+                post_pieces[post_id] = next(
+                    (p for p in pcs if p.__class__ == ShelfMember), None
+                )
+        # posts without a piece, or with several pieces but no shelf member,
+        # may still be linked to an item by the first shelf log
+        pieceless_post_ids = post_ids - {i for i, p in post_pieces.items() if p}
+        log_item_ids = dict(
+            ShelfLogEntryPost.objects.filter(post_id__in=pieceless_post_ids)
+            .order_by("-log_entry_id")
+            .values_list("post_id", "log_entry__item_id")
+        )
+        item_ids = set(log_item_ids.values())
+        item_ids.update(
+            p.item_id for p in post_pieces.values() if getattr(p, "item_id", None)
+        )
+        items = Item.objects.in_bulk(item_ids)
+        for post in posts:
+            piece = post_pieces.get(post.pk)
+            item = None
+            if piece and getattr(piece, "item_id", None):
+                item = items.get(piece.item_id)  # type:ignore
+                if item:
+                    piece.item = item  # type:ignore
+            elif not piece:
+                item = items.get(log_item_ids.get(post.pk))  # type:ignore
+            post.__dict__["piece"] = piece
+            post.__dict__["item"] = item
+
+    @classmethod
+    def bulk_create_pieces(cls, pieces: "list[Piece]") -> "list[Piece]":
+        """
+        insert new pieces of the same subclass in two queries.
+
+        pieces are multi-table models which can't be bulk_create()d, so rows of Piece
+        are created in bulk first and then rows of the subclass with the same pks;
+        like bulk_create(), save() is not called and no signal is sent.
+        """
+        if not pieces:
+            return pieces
+        model = pieces[0].__class__
+        if any(p.__class__ != model for p in pieces):
+            raise ValueError("pieces must be of the same class")
+        ctype = ContentType.objects.get_for_model(model, for_concrete_model=False)
+        db = router.db_for_write(model)
+        with transaction.atomic(using=db):
+            parents = Piece.objects.using(db).bulk_create(
+                [
+                    Piece(polymorphic_ctype_id=ctype.pk, uid=p.uid, local=p.local)
+                    for p in pieces
+                ]
+            )
+            for p, parent in zip(pieces, parents):
+                p.polymorphic_ctype_id = ctype.pk
+                p.id = p.pk = parent.pk
+            model._base_manager._insert(  # type:ignore
+                pieces, fields=model._meta.local_concrete_fields, using=db
+            )
+        for p in pieces:
+            p._state.adding = False
+            p._state.db = db
+        return pieces
+
     @cached_property
     def all_post_ids(self):
         post_ids = list(
@@ -2,7 +2,8 @@ from functools import cached_property
 from typing import TYPE_CHECKING, Self
 
 import django.dispatch
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import Max
 from django.utils import timezone
 
 from catalog.models import Item, ItemCategory
@@ -12,6 +13,9 @@ from .common import Piece, VisibilityType
 
 list_add = django.dispatch.Signal()
 list_remove = django.dispatch.Signal()
+# sent once with all new members by Collection.append_items(), which creates them
+# in bulk so that post_save is not sent for each of them
+list_add_many = django.dispatch.Signal()
 
 
 class List(Piece):
@@ -67,6 +71,9 @@ class List(Piece):
             summary[c.category] += 1
         return summary
 
+    def _next_position(self) -> int:
+        return (self.members.aggregate(p=Max("position"))["p"] or 0) + 1
+
     def append_item(self, item, **params):
         """
         named metadata fields should be specified directly, not in metadata dict!
@@ -77,13 +84,11 @@ class List(Piece):
         member = self.get_member_for_item(item)
         if member:
             return member
-        ml = self.ordered_members
         p = {"parent": self}
         p.update(params)
-        lm = ml.last()
         member = self.MEMBER_CLASS.objects.create(
             owner=self.owner,
-            position=lm.position + 1 if lm else 1,
+            position=self._next_position(),
             item=item,
             **p,
         )
@@ -98,39 +103,54 @@ class List(Piece):
             )
             member.delete()
 
+    def _update_positions(self, positions: dict[int, int]):
+        """set positions of members by their pks in one query"""
+        if not positions:
+            return
+        model = self.MEMBER_CLASS
+        db = router.db_for_write(model)
+        table = connections[db].ops.quote_name(model._meta.db_table)
+        pk = connections[db].ops.quote_name(model._meta.pk.column)  # type:ignore
+        values = ", ".join(["(%s, %s)"] * len(positions))
+        sql = f"""
+            UPDATE {table} SET position = v.position, edited_time = %s
+            FROM (VALUES {values}) AS v(id, position)
+            WHERE {table}.{pk} = v.id AND {table}.parent_id = %s
+                AND {table}.position <> v.position
+        """
+        params = [timezone.now()]
+        for member_id, position in positions.items():
+            params += [int(member_id), int(position)]
+        params.append(self.pk)
+        with connections[db].cursor() as cursor:
+            cursor.execute(sql, params)
+
     def update_member_order(self, ordered_member_ids):
-        for m in self.members.all():
-            try:
-                i = ordered_member_ids.index(m.pk)
-                if m.position != i + 1:
-                    m.position = i + 1
-                    m.save()
-            except ValueError:
-                pass
+        positions = {}
+        for i, member_id in enumerate(ordered_member_ids):
+            positions.setdefault(member_id, i + 1)
+        self._update_positions(positions)
 
-    def move_up_item(self, item):
-        members = self.ordered_members
+    def _swap_member(self, item, up: bool):
         member = self.get_member_for_item(item)
-        if member:
-            other = members.filter(position__lt=member.position).last()
-            if other:
-                p = other.position
-                other.position = member.position
-                member.position = p
-                other.save()
-                member.save()
+        if not member:
+            return
+        if up:
+            other = self.members.filter(position__lt=member.position)
+            other = other.order_by("-position").first()
+        else:
+            other = self.members.filter(position__gt=member.position)
+            other = other.order_by("position").first()
+        if other:
+            self._update_positions(
+                {member.pk: other.position, other.pk: member.position}
+            )
+
+    def move_up_item(self, item):
+        self._swap_member(item, True)
 
     def move_down_item(self, item):
-        members = self.ordered_members
-        member = self.get_member_for_item(item)
-        if member:
-            other = members.filter(position__gt=member.position).first()
-            if other:
-                p = other.position
-                other.position = member.position
-                member.position = p
-                other.save()
-                member.save()
+        self._swap_member(item, False)
 
     def update_item_metadata(self, item, metadata):
         member = self.get_member_for_item(item)
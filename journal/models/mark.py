@@ -1,6 +1,6 @@
 from datetime import datetime
 from functools import cached_property
-from typing import Any
+from typing import Any, Iterable
 
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -14,6 +14,7 @@ from .note import Note
 from .rating import Rating
 from .review import Review
 from .shelf import Shelf, ShelfLogEntry, ShelfManager, ShelfMember, ShelfType
+from .tag import TagMember
 
 
 class Mark:
@@ -204,8 +205,14 @@ class Mark:
         metadata: dict[str, Any] | None = None,
         created_time: datetime | None = None,
         share_to_mastodon: bool = False,
+        defer_post: bool = False,
     ):
-        """change shelf, comment or rating"""
+        """
+        change shelf, comment or rating
+
+        with defer_post, post is not published until publish() is called,
+        so that marks can be updated in a transaction without waiting for timeline
+        """
         if created_time and created_time >= timezone.now():
             created_time = None
         if visibility is None:
@@ -277,14 +284,23 @@ class Mark:
                     self.item, self.owner, rating_grade, visibility
                 )
                 self.rating_grade = rating_grade
-        # publish a new or updated ActivityPub post
+        self._deferred_post = (update_mode, share_to_mastodon)
+        if not defer_post:
+            self.publish()
+
+    def publish(self):
+        """publish a new or updated ActivityPub post for last update()"""
+        if not self.shelfmember or not hasattr(self, "_deferred_post"):
+            return
+        update_mode, share_to_mastodon = self._deferred_post
+        del self._deferred_post
         post = self.shelfmember.sync_to_timeline(update_mode)
         if share_to_mastodon:
             self.shelfmember.sync_to_social_accounts(update_mode)
         # auto add bookmark
         if (
             post
-            and shelf_type == ShelfType.PROGRESS
+            and self.shelfmember.shelf_type == ShelfType.PROGRESS
             and self.item.category
             in (self.owner.user.preference.auto_bookmark_cats or [])
         ):
@@ -300,3 +316,92 @@ class Mark:
 
     def delete_all_logs(self):
         self.logs.delete()
+
+
+class MarkSet:
+    """
+    Marks of an owner for a list of items,
+    with shelf members, ratings, comments, reviews, tags and notes of all items
+    loaded in a few queries, instead of a few queries for each mark.
+    """
+
+    def __init__(
+        self,
+        owner: APIdentity,
+        items: Iterable[Item],
+        shelfmembers: Iterable[ShelfMember] = (),
+    ):
+        self.owner = owner
+        self.marks: dict[int, Mark] = {}
+        for item in items:
+            if item.pk not in self.marks:
+                self.marks[item.pk] = Mark(owner, item)
+        item_ids = list(self.marks.keys())
+        members = {m.item_id: m for m in shelfmembers}
+        missing = [i for i in item_ids if i not in members]
+        if missing:
+            for m in ShelfMember.objects.filter(owner=owner, item_id__in=missing):
+                members[m.item_id] = m
+        shelves = {s.pk: s for s in owner.shelf_manager.shelf_list.values()}
+        for m in members.values():
+            if not ShelfMember.parent.is_cached(m) and m.parent_id in shelves:
+                m.parent = shelves[m.parent_id]
+        ratings = {
+            r.item_id: r
+            for r in Rating.objects.filter(owner=owner, item_id__in=item_ids)
+        }
+        comments = {
+            c.item_id: c
+            for c in Comment.objects.filter(owner=owner, item_id__in=item_ids)
+        }
+        reviews = {
+            r.item_id: r
+            for r in Review.objects.filter(owner=owner, item_id__in=item_ids)
+        }
+        tags: dict[int, list[str]] = {}
+        for item_id, title in TagMember.objects.filter(
+            parent__owner=owner, item_id__in=item_ids
+        ).values_list("item_id", "parent__title"):
+            tags.setdefault(item_id, []).append(title)
+        notes: dict[int, list[Note]] = {}
+        for note in Note.objects.filter(owner=owner, item_id__in=item_ids).order_by(
+            "-created_time"
+        ):
+            notes.setdefault(note.item_id, []).append(note)
+        for item_id, mark in self.marks.items():
+            mark.shelfmember = members.get(item_id)
+            mark.rating = ratings.get(item_id)
+            mark.rating_grade = (mark.rating.grade or None) if mark.rating else None
+            mark.comment = comments.get(item_id)
+            mark.review = reviews.get(item_id)
+            mark.tags = sorted(tags.get(item_id, []))
+            mark.notes = notes.get(item_id, [])
+
+    def __getitem__(self, item: Item | int) -> Mark:
+        return self.marks[item if isinstance(item, int) else item.pk]
+
+    def __iter__(self):
+        return iter(self.marks.values())
+
+    def __len__(self):
+        return len(self.marks)
+
+    @classmethod
+    def attach(cls, members: Iterable[Any]):
+        """
+        load marks for shelf members, list members or pieces like reviews, and set
+        them as `mark` of each, members of the same owner are loaded together
+        """
+        by_owner: dict[int, list] = {}
+        for m in members:
+            by_owner.setdefault(m.owner_id, []).append(m)
+        owners = APIdentity.objects.in_bulk(by_owner.keys())
+        for owner_id, ms in by_owner.items():
+            owner = owners.get(owner_id)
+            if not owner:
+                continue
+            shelfmembers = [m for m in ms if isinstance(m, ShelfMember)]
+            marks = cls(owner, [m.item for m in ms], shelfmembers)
+            for m in ms:
+                m.owner = owner
+                m.mark = marks[m.item_id]
@@ -1,9 +1,12 @@
 from datetime import datetime
 from typing import Any
 
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import Avg, Count, Q
+from django.db import models, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
 from django.utils.translation import gettext_lazy as _
 
 from catalog.models import Item
@@ -74,47 +77,15 @@ class Rating(Content):
 
     @staticmethod
     def get_rating_for_item(item: Item) -> float | None:
-        stat = Rating.objects.filter(grade__isnull=False)
-        if item.class_name in RATING_INCLUDES_CHILD_ITEMS:
-            stat = stat.filter(item_id__in=item.child_item_ids + [item.pk])
-        else:
-            stat = stat.filter(item=item)
-        stat = stat.aggregate(average=Avg("grade"), count=Count("item"))
-        return round(stat["average"], 1) if stat["count"] >= MIN_RATING_COUNT else None
+        return RatingSummary.get_for_item(item).rating
 
     @staticmethod
     def get_rating_count_for_item(item: Item) -> int:
-        stat = Rating.objects.filter(grade__isnull=False)
-        if item.class_name in RATING_INCLUDES_CHILD_ITEMS:
-            stat = stat.filter(item_id__in=item.child_item_ids + [item.pk])
-        else:
-            stat = stat.filter(item=item)
-        stat = stat.aggregate(count=Count("item"))
-        return stat["count"]
+        return RatingSummary.get_for_item(item).count
 
     @staticmethod
     def get_rating_distribution_for_item(item: Item):
-        stat = Rating.objects.filter(grade__isnull=False)
-        if item.class_name in RATING_INCLUDES_CHILD_ITEMS:
-            stat = stat.filter(item_id__in=item.child_item_ids + [item.pk])
-        else:
-            stat = stat.filter(item=item)
-        stat = stat.values("grade").annotate(count=Count("grade")).order_by("grade")
-        g = [0] * 11
-        t = 0
-        for s in stat:
-            g[s["grade"]] = s["count"]
-            t += s["count"]
-        if t < MIN_RATING_COUNT:
-            return [0] * 5
-        r = [
-            100 * (g[1] + g[2]) // t,
-            100 * (g[3] + g[4]) // t,
-            100 * (g[5] + g[6]) // t,
-            100 * (g[7] + g[8]) // t,
-            100 * (g[9] + g[10]) // t,
-        ]
-        return r
+        return RatingSummary.get_for_item(item).rating_dist
 
     @staticmethod
     def update_item_rating(
@@ -139,3 +110,125 @@ class Rating(Content):
     def get_item_rating(item: Item, owner: APIdentity) -> int | None:
         rating = Rating.objects.filter(owner=owner, item=item).first()
         return (rating.grade or None) if rating else None
+
+
+def _default_distribution():
+    return [0] * 10
+
+
+class RatingSummary(models.Model):
+    """
+    Rating stats of an item, ratings of child items are included for RATING_INCLUDES_CHILD_ITEMS
+
+    it's updated along with Rating save/delete, use `journal --rebuild-rating-summary` to rebuild all
+    """
+
+    item = models.OneToOneField(
+        Item, primary_key=True, on_delete=models.CASCADE, related_name="rating_summary"
+    )
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    distribution = ArrayField(
+        models.PositiveIntegerField(), size=10, default=_default_distribution
+    )  # count of grade 1 to 10
+    edited_time = models.DateTimeField(auto_now=True)
+
+    @property
+    def rating(self) -> float | None:
+        return (
+            round(self.total / self.count, 1)
+            if self.count >= MIN_RATING_COUNT
+            else None
+        )
+
+    @property
+    def rating_dist(self) -> list[int]:
+        t = self.count
+        if t < MIN_RATING_COUNT:
+            return [0] * 5
+        g = self.distribution
+        return [100 * (g[i] + g[i + 1]) // t for i in range(0, 10, 2)]
+
+    @classmethod
+    def get_for_item(cls, item: Item) -> "RatingSummary":
+        try:
+            return item.rating_summary  # type:ignore
+        except cls.DoesNotExist:
+            return cls(item_id=item.pk)
+
+    @staticmethod
+    def get_item_ids_for_item(item: Item) -> list[int]:
+        if item.class_name in RATING_INCLUDES_CHILD_ITEMS:
+            return item.child_item_ids + [item.pk]
+        return [item.pk]
+
+    def set_distribution(self, distribution: list[int]):
+        self.distribution = distribution
+        self.count = sum(distribution)
+        self.total = sum((g + 1) * c for g, c in enumerate(distribution))
+
+    @staticmethod
+    def _get_distributions(item_ids: list[int] | None = None) -> dict[int, list[int]]:
+        stat = Rating.objects.filter(grade__isnull=False, grade__gte=1, grade__lte=10)
+        if item_ids is not None:
+            stat = stat.filter(item_id__in=item_ids)
+        stat = stat.values("item_id", "grade").annotate(count=Count("grade"))
+        dists = {}
+        for s in stat:
+            dists.setdefault(s["item_id"], _default_distribution())[
+                s["grade"] - 1
+            ] += s["count"]
+        return dists
+
+    @staticmethod
+    def _merge_distributions(dists: list[list[int]]) -> list[int]:
+        return [sum(d) for d in zip(_default_distribution(), *dists)]
+
+    @classmethod
+    def update_for_item(cls, item: Item) -> "RatingSummary":
+        item_ids = cls.get_item_ids_for_item(item)
+        dists = cls._get_distributions(item_ids)
+        summary = cls(item_id=item.pk)
+        summary.set_distribution(cls._merge_distributions(list(dists.values())))
+        summary.save()
+        item.rating_summary = summary  # type:ignore
+        return summary
+
+    @classmethod
+    def update_for_rated_item(cls, item: Item):
+        cls.update_for_item(item)
+        parent = item.parent_item
+        if parent and parent.class_name in RATING_INCLUDES_CHILD_ITEMS:
+            cls.update_for_item(parent)
+
+    @classmethod
+    def rebuild(cls) -> int:
+        dists = cls._get_distributions()
+        summaries = {item_id: cls(item_id=item_id) for item_id in dists.keys()}
+        for item_id, summary in summaries.items():
+            summary.set_distribution(dists[item_id])
+        parent_cts = ContentType.objects.filter(
+            app_label="catalog", model__in=RATING_INCLUDES_CHILD_ITEMS
+        )
+        for item in Item.objects.filter(polymorphic_ctype__in=parent_cts).iterator():
+            item_ids = cls.get_item_ids_for_item(item)
+            if not any(i in dists for i in item_ids):
+                continue
+            summary = cls(item_id=item.pk)
+            summary.set_distribution(
+                cls._merge_distributions([dists[i] for i in item_ids if i in dists])
+            )
+            summaries[item.pk] = summary
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(summaries.values(), batch_size=1000)
+        return len(summaries)
+
+    @staticmethod
+    def _rating_changed_handler(sender, instance: Rating, **kwargs):
+        RatingSummary.update_for_rated_item(instance.item)
+
+    @classmethod
+    def register_rating_model(cls):
+        post_save.connect(cls._rating_changed_handler, sender=Rating)
+        post_delete.connect(cls._rating_changed_handler, sender=Rating)
@@ -1,14 +1,21 @@
-from datetime import datetime
+import time
+from datetime import date, datetime, timedelta
+from datetime import timezone as datetime_timezone
 from functools import cached_property
 from typing import TYPE_CHECKING, override
 
 from django.conf import settings
-from django.db import connection, models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum, Value, Window
+from django.db.models.functions import RowNumber, TruncDate
+from django.db.models.signals import post_delete, post_init, post_save
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from loguru import logger
 
-from catalog.models import Item, ItemCategory
+from catalog.models import Item, ItemCategory, item_content_types
+from takahe.db_routes import use_primary
 from takahe.utils import Takahe
 from users.models import APIdentity
 
@@ -21,6 +28,16 @@ if TYPE_CHECKING:
     from .mark import Mark
     from .rating import Rating
 
+# number of calendar entries of owner for each visibility level, in buckets of UTC
+# time, which can be shown in dates of any timezone and updated by changes in place
+_CALENDAR_CACHE_KEY = "calendar:{}:{}"
+_CALENDAR_LOCK_KEY = "calendar_lock:{}"
+_CALENDAR_LOCK_TIMEOUT = 10
+_CALENDAR_LOCK_RETRIES = 20
+_CALENDAR_BUCKET_MINUTES = 15  # offsets of all timezones are multiples of it
+_CALENDAR_VISIBILITIES = [0, 1, 2]
+_CALENDAR_CACHE_TIMEOUT = 86400 * 7
+
 
 class ShelfType(models.TextChoices):
     WISHLIST = "wishlist", _("WISHLIST")  # type:ignore[reportCallIssue]
@@ -556,6 +573,290 @@ class ShelfLogEntryPost(models.Model):
         ]
 
 
+class ItemMarkCount(models.Model):
+    """
+    Daily number of marks (ShelfMember) created for each item, in days of TIME_ZONE
+
+    it is updated whenever ShelfMember is saved or deleted,
+    so that popular items in recent days can be found with range sums of this table
+    """
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="+")
+    category = models.CharField(choices=ItemCategory.choices, max_length=100)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    local_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["item", "day"], name="unique_item_mark_count"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["category", "day"]),
+        ]
+
+    @classmethod
+    def recent(cls, days: int):
+        today = timezone.localdate(timezone=timezone.get_default_timezone())
+        return cls.objects.filter(day__gt=today - timedelta(days=days))
+
+    @classmethod
+    def update_for_item(cls, item: Item, day: date):
+        start = timezone.make_aware(
+            datetime.combine(day, datetime.min.time()), timezone.get_default_timezone()
+        )
+        counts = dict(
+            ShelfMember.objects.filter(
+                item_id=item.pk,
+                created_time__gte=start,
+                created_time__lt=start + timedelta(days=1),
+            )
+            .values_list("local")
+            .annotate(num=Count("id"))
+            .order_by()
+        )
+        total = sum(counts.values())
+        if total:
+            cls.objects.update_or_create(
+                item_id=item.pk,
+                day=day,
+                defaults={
+                    "category": item.category,
+                    "count": total,
+                    "local_count": counts.get(True, 0),
+                },
+            )
+        else:
+            cls.objects.filter(item_id=item.pk, day=day).delete()
+
+    @classmethod
+    def rebuild(cls) -> int:
+        categories = {ct: c.category for c, ct in item_content_types().items()}
+        rows = (
+            ShelfMember.objects.annotate(
+                day=TruncDate("created_time", tzinfo=timezone.get_default_timezone())
+            )
+            .values("item_id", "item__polymorphic_ctype_id", "day")
+            .annotate(count=Count("id"), local_count=Count("id", filter=Q(local=True)))
+            .order_by()
+        )
+        counts = [
+            cls(
+                item_id=r["item_id"],
+                category=categories[r["item__polymorphic_ctype_id"]],
+                day=r["day"],
+                count=r["count"],
+                local_count=r["local_count"],
+            )
+            for r in rows.iterator()
+            if r["item__polymorphic_ctype_id"] in categories
+        ]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(counts, batch_size=1000)
+        return len(counts)
+
+    @staticmethod
+    def _shelfmember_loaded_handler(sender, instance: ShelfMember, **kwargs):
+        # remember original item and time to update the old counter if they are changed
+        instance._mark_count_key = (  # type:ignore
+            instance.__dict__.get("item_id"),
+            instance.__dict__.get("created_time"),
+        )
+
+    @staticmethod
+    def _shelfmember_changed_handler(sender, instance: ShelfMember, **kwargs):
+        day = timezone.localdate(instance.created_time, timezone.get_default_timezone())
+        ItemMarkCount.update_for_item(instance.item, day)
+        item_id, created_time = getattr(instance, "_mark_count_key", (None, None))
+        if item_id and created_time:
+            old_day = timezone.localdate(created_time, timezone.get_default_timezone())
+            if item_id != instance.item_id:
+                ItemMarkCount.update_for_item(Item.objects.get(pk=item_id), old_day)
+            elif old_day != day:
+                ItemMarkCount.update_for_item(instance.item, old_day)
+        instance._mark_count_key = (
+            instance.item_id,
+            instance.created_time,
+        )  # type:ignore
+
+    @classmethod
+    def register_shelfmember_model(cls):
+        post_init.connect(cls._shelfmember_loaded_handler, sender=ShelfMember)
+        post_save.connect(cls._shelfmember_changed_handler, sender=ShelfMember)
+        post_delete.connect(cls._shelfmember_changed_handler, sender=ShelfMember)
+
+
+class ShelfCount(models.Model):
+    """
+    Number of marks on each shelf and reviews of an identity, by item category and visibility
+
+    it is updated whenever ShelfMember or Review is saved or deleted,
+    so that profile page does not have to count them; use `journal --rebuild-shelf-count` to rebuild all
+    """
+
+    owner = models.ForeignKey(APIdentity, on_delete=models.CASCADE, related_name="+")
+    category = models.CharField(choices=ItemCategory.choices, max_length=100)
+    shelf_type = models.CharField(max_length=100)  # ShelfType or "reviewed"
+    visibility = models.PositiveSmallIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "category", "shelf_type", "visibility"],
+                name="unique_shelf_count",
+            ),
+        ]
+
+    @classmethod
+    def get_counts(
+        cls, owner_id: int, max_visiblity: int
+    ) -> dict[tuple[str, str], int]:
+        """number of marks and reviews visible for (category, shelf_type)"""
+        rows = (
+            cls.objects.filter(owner_id=owner_id, visibility__lte=max_visiblity)
+            .values_list("category", "shelf_type")
+            .annotate(n=Sum("count"))
+            .order_by()
+        )
+        return {(category, shelf_type): n for category, shelf_type, n in rows}
+
+    @staticmethod
+    def _get_pieces(shelf_type: str):
+        from .review import Review
+
+        if shelf_type == _REVIEWED:
+            return Review.objects.all()
+        return ShelfMember.objects.filter(parent__shelf_type=shelf_type)
+
+    @classmethod
+    def update_for_shelf(
+        cls, owner_id: int, category: str, shelf_type: str, visibility: int
+    ):
+        count = (
+            cls._get_pieces(shelf_type)
+            .filter(owner_id=owner_id, visibility=visibility)
+            .filter(q_item_in_category(ItemCategory(category)))
+            .count()
+        )
+        if count:
+            cls.objects.update_or_create(
+                owner_id=owner_id,
+                category=category,
+                shelf_type=shelf_type,
+                visibility=visibility,
+                defaults={"count": count},
+            )
+        else:
+            cls.objects.filter(
+                owner_id=owner_id,
+                category=category,
+                shelf_type=shelf_type,
+                visibility=visibility,
+            ).delete()
+
+    @classmethod
+    def update_for_reviews(cls, owner_id: int, category: str, visibility: int):
+        """update count of reviews, for reviews changed without saving each of them"""
+        cls.update_for_shelf(owner_id, category, _REVIEWED, visibility)
+
+    @classmethod
+    def rebuild(cls, owner_id: int | None = None) -> int:
+        from .review import Review
+
+        categories = {ct: c.category for c, ct in item_content_types().items()}
+        counts = {}
+        rows = [
+            ShelfMember.objects.values_list(
+                "owner_id",
+                "item__polymorphic_ctype_id",
+                "parent__shelf_type",
+                "visibility",
+            ),
+            Review.objects.annotate(shelf_type=Value(_REVIEWED)).values_list(
+                "owner_id", "item__polymorphic_ctype_id", "shelf_type", "visibility"
+            ),
+        ]
+        for qs in rows:
+            if owner_id:
+                qs = qs.filter(owner_id=owner_id)
+            for owner, ctype, shelf_type, visibility, n in (
+                qs.annotate(n=Count("id")).order_by().iterator()
+            ):
+                if ctype not in categories:
+                    continue
+                k = (owner, categories[ctype], shelf_type, visibility)
+                counts[k] = counts.get(k, 0) + n
+        with transaction.atomic():
+            qs = cls.objects.all()
+            if owner_id:
+                qs = qs.filter(owner_id=owner_id)
+            qs.delete()
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        owner_id=owner,
+                        category=category,
+                        shelf_type=shelf_type,
+                        visibility=visibility,
+                        count=n,
+                    )
+                    for (owner, category, shelf_type, visibility), n in counts.items()
+                ],
+                batch_size=1000,
+            )
+        return len(counts)
+
+    @staticmethod
+    def _get_state(instance):
+        return (
+            instance.__dict__.get("owner_id"),
+            instance.__dict__.get("item_id"),
+            instance.__dict__.get("parent_id"),
+            instance.__dict__.get("visibility"),
+        )
+
+    @staticmethod
+    def _piece_loaded_handler(sender, instance, **kwargs):
+        # remember original state to update the old counter if it's changed
+        instance._shelf_count_state = ShelfCount._get_state(instance)
+
+    @staticmethod
+    def _piece_changed_handler(sender, instance, **kwargs):
+        state = ShelfCount._get_state(instance)
+        shelf_type = (
+            instance.parent.shelf_type
+            if isinstance(instance, ShelfMember)
+            else _REVIEWED
+        )
+        ShelfCount.update_for_shelf(
+            instance.owner_id, instance.item.category, shelf_type, instance.visibility
+        )
+        old_state = getattr(instance, "_shelf_count_state", None)
+        if old_state and old_state[0] and old_state[1] and old_state != state:
+            owner_id, item_id, parent_id, visibility = old_state
+            item = Item.objects.filter(pk=item_id).first()
+            if parent_id:
+                shelf_type = Shelf.objects.get(pk=parent_id).shelf_type
+            if item:
+                ShelfCount.update_for_shelf(
+                    owner_id, item.category, shelf_type, visibility
+                )
+        instance._shelf_count_state = state
+
+    @classmethod
+    def register_piece_models(cls):
+        from .review import Review
+
+        for model in [ShelfMember, Review]:
+            post_init.connect(cls._piece_loaded_handler, sender=model)
+            post_save.connect(cls._piece_changed_handler, sender=model)
+            post_delete.connect(cls._piece_changed_handler, sender=model)
+
+
 class ShelfManager:
     """
     ShelfManager
@@ -597,6 +898,47 @@ class ShelfManager:
         else:
             return qs
 
+    @staticmethod
+    def get_latest_pieces_by_category(
+        qs, shelf_field: str | None = None, limit: int = 10
+    ) -> dict[tuple[str, str | None], list]:
+        """
+        latest pieces in qs for each category (and value of shelf_field), in one windowed query
+
+        items of a category may be in several content types, so rows are ranked within
+        each content type first, and trimmed to limit per category after merge
+        """
+        categories = {ct: c.category for c, ct in item_content_types().items()}
+        partition = [F("item__polymorphic_ctype_id")]
+        if shelf_field:
+            partition.append(F(shelf_field))
+        pieces = (
+            qs.annotate(
+                item_ctype=F("item__polymorphic_ctype_id"),
+                shelf=(
+                    F(shelf_field)
+                    if shelf_field
+                    else Value(None, output_field=models.CharField())
+                ),
+                rank=Window(
+                    RowNumber(),
+                    partition_by=partition,
+                    order_by=F("created_time").desc(),
+                ),
+            )
+            .filter(rank__lte=limit)
+            .order_by("-created_time")
+            .prefetch_related("item")
+        )
+        result = {}
+        for p in pieces:
+            if p.item_ctype not in categories:
+                continue
+            lst = result.setdefault((categories[p.item_ctype], p.shelf), [])
+            if len(lst) < limit:
+                lst.append(p)
+        return result
+
     def get_members(
         self, shelf_type: ShelfType, item_category: ItemCategory | None = None
     ):
@@ -668,48 +1010,256 @@ class ShelfManager:
     def get_manager_for_user(owner: APIdentity):
         return ShelfManager(owner)
 
+    @staticmethod
+    def get_calendar_type(model_name: str) -> str:
+        if model_name[:2] == "tv":
+            return "tv"
+        elif model_name[:7] == "podcast":
+            return "podcast"
+        elif model_name == "album":
+            return "music"
+        elif model_name == "edition":
+            return "book"
+        elif model_name not in [
+            "book",
+            "movie",
+            "tv",
+            "music",
+            "game",
+            "podcast",
+            "performance",
+        ]:
+            return "other"
+        return model_name
+
+    @staticmethod
+    def _get_calendar_bucket(t: datetime) -> str:
+        t = t.astimezone(datetime_timezone.utc)
+        t = t.replace(
+            minute=t.minute - t.minute % _CALENDAR_BUCKET_MINUTES,
+            second=0,
+            microsecond=0,
+        )
+        return t.strftime("%Y-%m-%dT%H:%M")
+
+    @staticmethod
+    def _add_calendar_count(
+        counts: dict[str, dict[str, int]], bucket: str, typ: str, delta: int
+    ):
+        types = counts.setdefault(bucket, {})
+        n = types.get(typ, 0) + delta
+        if n > 0:
+            types[typ] = n
+        else:
+            types.pop(typ, None)
+            if not types:
+                del counts[bucket]
+
+    def _load_calendar_counts(self, max_visiblity: int) -> dict[str, dict[str, int]]:
+        from .comment import Comment
+
+        since = timezone.now() - timedelta(days=367)
+        counts = {}
+        for qs in [
+            ShelfMember.objects.filter(parent=self.get_shelf(ShelfType.COMPLETE)),
+            Comment.objects.filter(owner=self.owner),
+        ]:
+            for created_time, model in qs.filter(
+                created_time__gte=since, visibility__lte=int(max_visiblity)
+            ).values_list("created_time", "item__polymorphic_ctype__model"):
+                self._add_calendar_count(
+                    counts,
+                    self._get_calendar_bucket(created_time),
+                    self.get_calendar_type(model),
+                    1,
+                )
+        return counts
+
+    @staticmethod
+    def _lock_calendar(owner_id: int) -> bool:
+        """lock cached calendar of owner to fill or update it, False if timed out"""
+        key = _CALENDAR_LOCK_KEY.format(owner_id)
+        for _ in range(_CALENDAR_LOCK_RETRIES):
+            if cache.add(key, 1, timeout=_CALENDAR_LOCK_TIMEOUT):
+                return True
+            time.sleep(0.05)
+        return False
+
+    @staticmethod
+    def _unlock_calendar(owner_id: int):
+        cache.delete(_CALENDAR_LOCK_KEY.format(owner_id))
+
     def get_calendar_data(self, max_visiblity: int):
-        shelf_id = self.get_shelf(ShelfType.COMPLETE).pk
-        timezone_offset = timezone.localtime(timezone.now()).strftime("%z")
-        timezone_offset = timezone_offset[: len(timezone_offset) - 2]
-        calendar_data = {}
-        queries = [
-            (
-                "SELECT to_char(DATE(journal_shelfmember.created_time::timestamp AT TIME ZONE %s), 'YYYY-MM-DD') AS dat, django_content_type.model typ, COUNT(1) count FROM journal_shelfmember, catalog_item, django_content_type WHERE journal_shelfmember.item_id = catalog_item.id AND django_content_type.id = catalog_item.polymorphic_ctype_id AND parent_id = %s AND journal_shelfmember.created_time >= NOW() - INTERVAL '366 days' AND journal_shelfmember.visibility <= %s GROUP BY item_id, dat, typ;",
-                [timezone_offset, shelf_id, int(max_visiblity)],
-            ),
-            (
-                "SELECT to_char(DATE(journal_comment.created_time::timestamp AT TIME ZONE %s), 'YYYY-MM-DD') AS dat, django_content_type.model typ, COUNT(1) count FROM journal_comment, catalog_item, django_content_type WHERE journal_comment.owner_id = %s AND journal_comment.item_id = catalog_item.id AND django_content_type.id = catalog_item.polymorphic_ctype_id AND journal_comment.created_time >= NOW() - INTERVAL '366 days' AND journal_comment.visibility <= %s GROUP BY item_id, dat, typ;",
-                [timezone_offset, self.owner.id, int(max_visiblity)],
-            ),
-        ]
-        for sql, params in queries:
-            with connection.cursor() as cursor:
-                cursor.execute(sql, params)
-                data = cursor.fetchall()
-                for line in data:
-                    date = line[0]
-                    typ = line[1]
-                    if date not in calendar_data:
-                        calendar_data[date] = {"items": []}
-                    if typ[:2] == "tv":
-                        typ = "tv"
-                    elif typ[:7] == "podcast":
-                        typ = "podcast"
-                    elif typ == "album":
-                        typ = "music"
-                    elif typ == "edition":
-                        typ = "book"
-                    elif typ not in [
-                        "book",
-                        "movie",
-                        "tv",
-                        "music",
-                        "game",
-                        "podcast",
-                        "performance",
-                    ]:
-                        typ = "other"
-                    if typ not in calendar_data[date]["items"]:
-                        calendar_data[date]["items"].append(typ)
-        return calendar_data
+        """
+        dates with types of items marked as complete or commented in last 366 days
+
+        number of entries for each type is cached for each visibility level in buckets
+        of UTC time, so that it can be shown in dates of any timezone, and updated in
+        place by ShelfMember and Comment changes, see update_calendar_data()
+        """
+        owner_id = self.owner.pk
+        key = _CALENDAR_CACHE_KEY.format(owner_id, int(max_visiblity))
+        counts = cache.get(key)
+        if counts is None:
+            locked = self._lock_calendar(owner_id)
+            try:
+                # it may have been filled while waiting for the lock
+                counts = cache.get(key) if locked else None
+                if counts is None:
+                    # read from primary, replicas may lag behind the change cleared it
+                    with use_primary():
+                        counts = self._load_calendar_counts(max_visiblity)
+                    if locked:
+                        cache.set(key, counts, timeout=_CALENDAR_CACHE_TIMEOUT)
+            finally:
+                if locked:
+                    self._unlock_calendar(owner_id)
+        since = (timezone.localdate() - timedelta(days=366)).isoformat()
+        days: dict[str, dict[str, None]] = {}
+        for bucket, types in counts.items():
+            t = datetime.fromisoformat(bucket).replace(tzinfo=datetime_timezone.utc)
+            dat = timezone.localdate(t).isoformat()
+            if dat >= since:
+                days.setdefault(dat, {}).update(dict.fromkeys(types))
+        return {dat: {"items": list(types)} for dat, types in sorted(days.items())}
+
+    @staticmethod
+    def update_calendar_data(
+        owner_id: int,
+        removed: tuple[str, str, int] | None,
+        added: tuple[str, str, int] | None,
+    ):
+        """
+        update cached calendar of owner in place,
+        removed / added is an entry of (bucket, type, visibility);
+        the calendar is cleared instead if it can't be locked in time
+        """
+        if removed == added:
+            return
+        keys = {
+            v: _CALENDAR_CACHE_KEY.format(owner_id, v) for v in _CALENDAR_VISIBILITIES
+        }
+        if not ShelfManager._lock_calendar(owner_id):
+            cache.delete_many(list(keys.values()))
+            return
+        try:
+            cached = cache.get_many(list(keys.values()))
+            for visibility, key in keys.items():
+                counts = cached.get(key)
+                if counts is None:
+                    continue
+                for entry, delta in [(removed, -1), (added, 1)]:
+                    if entry and entry[2] <= visibility:
+                        ShelfManager._add_calendar_count(
+                            counts, entry[0], entry[1], delta
+                        )
+            if cached:
+                cache.set_many(cached, timeout=_CALENDAR_CACHE_TIMEOUT)
+        finally:
+            ShelfManager._unlock_calendar(owner_id)
+
+    @staticmethod
+    def clear_calendar_data(owner_id: int):
+        cache.delete_many(
+            [_CALENDAR_CACHE_KEY.format(owner_id, v) for v in _CALENDAR_VISIBILITIES]
+        )
+
+    @staticmethod
+    def _get_calendar_entries(
+        states: list[tuple[int, datetime, int, int | None]],
+    ) -> list[tuple[str, str, int] | None]:
+        """
+        calendar entries for (item_id, created_time, visibility, shelf_id) of ShelfMember
+        or Comment, shelf_id is None for Comment; ShelfMember not in complete shelf
+        has no entry
+        """
+        shelf_ids = {state[3] for state in states if state[3]}
+        complete_shelf_ids = (
+            set(
+                Shelf.objects.filter(
+                    pk__in=shelf_ids, shelf_type=ShelfType.COMPLETE
+                ).values_list("pk", flat=True)
+            )
+            if shelf_ids
+            else set()
+        )
+        item_models = dict(
+            Item.objects.filter(pk__in={state[0] for state in states})
+            .non_polymorphic()
+            .values_list("pk", "polymorphic_ctype__model")
+        )
+        entries = []
+        for item_id, created_time, visibility, shelf_id in states:
+            model = item_models.get(item_id)
+            if not model or (shelf_id and shelf_id not in complete_shelf_ids):
+                entries.append(None)
+                continue
+            entries.append(
+                (
+                    ShelfManager._get_calendar_bucket(created_time),
+                    ShelfManager.get_calendar_type(model),
+                    visibility,
+                )
+            )
+        return entries
+
+    @staticmethod
+    def _get_calendar_state(instance):
+        return (
+            instance.__dict__.get("item_id"),
+            instance.__dict__.get("created_time"),
+            instance.__dict__.get("visibility"),
+            instance.__dict__.get("parent_id"),
+        )
+
+    @staticmethod
+    def _calendar_piece_loaded_handler(sender, instance, **kwargs):
+        instance._calendar_state = ShelfManager._get_calendar_state(instance)
+
+    @staticmethod
+    def _update_calendar_for_piece(instance, old_state, new_state):
+        instance._calendar_state = new_state
+        if old_state == new_state:
+            return
+        owner_id = instance.owner_id
+
+        def update():
+            if not cache.get_many(
+                [
+                    _CALENDAR_CACHE_KEY.format(owner_id, v)
+                    for v in _CALENDAR_VISIBILITIES
+                ]
+            ):
+                return
+            states = [s for s in [old_state, new_state] if s and s[0] and s[1]]
+            with use_primary():
+                entries = dict(zip(states, ShelfManager._get_calendar_entries(states)))
+            ShelfManager.update_calendar_data(
+                owner_id,
+                entries.get(old_state) if old_state else None,
+                entries.get(new_state) if new_state else None,
+            )
+
+        # update after commit, so that it applies to calendar filled with data before
+        # the change, and not at all if the change is rolled back
+        transaction.on_commit(update)
+
+    @staticmethod
+    def _calendar_piece_saved_handler(sender, instance, created, **kwargs):
+        state = ShelfManager._get_calendar_state(instance)
+        old_state = None if created else getattr(instance, "_calendar_state", None)
+        ShelfManager._update_calendar_for_piece(instance, old_state, state)
+
+    @staticmethod
+    def _calendar_piece_deleted_handler(sender, instance, **kwargs):
+        old_state = getattr(instance, "_calendar_state", None)
+        ShelfManager._update_calendar_for_piece(instance, old_state, None)
+
+    @classmethod
+    def register_calendar_models(cls):
+        from .comment import Comment
+
+        for model in [ShelfMember, Comment]:
+            post_init.connect(cls._calendar_piece_loaded_handler, sender=model)
+            post_save.connect(cls._calendar_piece_saved_handler, sender=model)
+            post_delete.connect(cls._calendar_piece_deleted_handler, sender=model)
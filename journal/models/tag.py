@@ -103,6 +103,28 @@ class TagManager:
         )
         return tag_titles
 
+    @staticmethod
+    def indexable_tags_for_items(item_ids) -> dict[int, list[str]]:
+        """same as indexable_tags_for_item() but for many items in one query"""
+        titles_by_item = {}
+        for t in (
+            Tag.objects.filter(items__in=item_ids, visibility=0)
+            .values("items", "title")
+            .annotate(frequency=Count("owner"))
+            .order_by("items", "-frequency")
+        ):
+            titles_by_item.setdefault(t["items"], []).append(t["title"])
+        return {
+            item_id: sorted(
+                [
+                    t
+                    for t in set(map(Tag.deep_cleanup_title, titles[:20]))
+                    if t and t != "_"
+                ]
+            )
+            for item_id, titles in titles_by_item.items()
+        }
+
     @staticmethod
     def tag_item_for_owner(
         owner: APIdentity,
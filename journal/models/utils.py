@@ -1,3 +1,5 @@
+from typing import Iterable
+
 from auditlog.context import set_actor
 from django.db import transaction
 from django.db.utils import IntegrityError
@@ -5,15 +7,16 @@ from django.utils.translation import gettext_lazy as _
 from loguru import logger
 
 from catalog.models import Item
+from takahe.utils import Takahe
 from users.models import APIdentity, User
 
 from .collection import Collection, CollectionMember, FeaturedCollection
 from .comment import Comment
-from .common import Content, Debris
+from .common import Content, Debris, Piece
 from .itemlist import ListMember
-from .rating import Rating
+from .rating import Rating, RatingSummary
 from .review import Review
-from .shelf import ShelfLogEntry, ShelfMember
+from .shelf import ShelfCount, ShelfLogEntry, ShelfManager, ShelfMember
 from .tag import Tag, TagMember
 
 
@@ -22,6 +25,36 @@ def reset_journal_visibility_for_user(owner: APIdentity, visibility: int):
     Comment.objects.filter(owner=owner).update(visibility=visibility)
     Rating.objects.filter(owner=owner).update(visibility=visibility)
     Review.objects.filter(owner=owner).update(visibility=visibility)
+    ShelfManager.clear_calendar_data(owner.pk)
+    ShelfCount.rebuild(owner.pk)
+
+
+def prefetch_viewer_state(
+    request, items: Iterable[Item] = (), pieces: Iterable[Piece] = ()
+):
+    """
+    load viewing user's state of items and pieces to be rendered in a page in bulk,
+    so that template tags in user_actions do not query for each of them:
+    whether an item is on viewer's shelves is kept in request.item_shelved,
+    whether latest post of a piece is liked / boosted is set to the post.
+    """
+    pieces = [p for p in pieces if p]
+    Piece.prefetch_latest_posts(pieces)
+    if not request.user.is_authenticated:
+        return
+    identity = request.user.identity
+    item_ids = {i.pk for i in items if i}
+    if item_ids:
+        shelved = set(
+            ShelfMember.objects.filter(
+                owner=identity, item_id__in=item_ids
+            ).values_list("item_id", flat=True)
+        )
+        if not hasattr(request, "item_shelved"):
+            request.item_shelved = {}
+        request.item_shelved.update({i: i in shelved for i in item_ids})
+    if pieces:
+        Takahe.prefetch_post_interactions([p.latest_post for p in pieces], identity.pk)
 
 
 def remove_data_by_user(owner: APIdentity):
@@ -73,6 +106,7 @@ def update_journal_for_merged_item(
     for p in delete_q:
         Debris.create_from_piece(p)
         p.delete()
+    RatingSummary.update_for_rated_item(legacy_item)
 
 
 def journal_exists_for_item(item: Item) -> bool:
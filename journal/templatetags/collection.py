@@ -28,6 +28,16 @@ def user_stats_of(collection: Collection, identity: APIdentity):
     return collection.get_stats(identity) if identity else {}
 
 
+@register.simple_tag()
+def user_stats_of_collections(collections, identity: APIdentity):
+    """list of (collection, stats) with stats of all collections loaded at once"""
+    collections = list(collections)
+    if not identity:
+        return [(c, {}) for c in collections]
+    stats = Collection.get_stats_for_collections(identity, collections)
+    return [(c, stats[c.pk]) for c in collections]
+
+
 @register.simple_tag()
 def prural_items(count: int, category: str):
     match category:
@@ -8,11 +8,16 @@ register = template.Library()
 
 @register.simple_tag(takes_context=True)
 def wish_item_action(context, item):
-    user = context["request"].user
+    request = context["request"]
+    user = request.user
     action = {}
     if user and user.is_authenticated and item:
+        # use state loaded by prefetch_viewer_state() if available
+        taken = getattr(request, "item_shelved", {}).get(item.pk)
+        if taken is None:
+            taken = user.shelf_manager.locate_item(item) is not None
         action = {
-            "taken": user.shelf_manager.locate_item(item) is not None,
+            "taken": taken,
             "url": reverse("journal:wish", args=[item.uuid]),
         }
     return action
@@ -21,7 +26,12 @@ def wish_item_action(context, item):
 @register.simple_tag(takes_context=True)
 def liked_piece(context, piece):
     user = context["request"].user
-    return user and user.is_authenticated and piece.is_liked_by(user.identity)
+    if not user or not user.is_authenticated:
+        return False
+    post = piece.latest_post
+    if post and post.liked_by_current_user is not None:
+        return post.liked_by_current_user
+    return piece.is_liked_by(user.identity)
 
 
 @register.simple_tag(takes_context=True)
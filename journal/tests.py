@@ -1,9 +1,15 @@
 import time
+from datetime import timedelta
+from datetime import timezone as datetime_timezone
+from types import SimpleNamespace
 
+from django.db.models import Sum
 from django.test import TestCase
+from django.utils import timezone
 
 from catalog.models import *
 from journal.models.common import Debris
+from takahe.utils import Takahe
 from users.models import User
 
 from .models import *
@@ -45,6 +51,55 @@ class CollectionTest(TestCase):
             return
         self.assertEqual(member2.note, "test")
 
+    def test_append_items(self):
+        book3 = Edition.objects.create(title="Fall of Hyperion")
+        collection = Collection.objects.create(title="test", owner=self.user.identity)
+        collection.append_item(self.book1)
+        members = collection.append_items(
+            [self.book1, (self.book2, {"note": "test"}), book3, self.book2]
+        )
+        self.assertEqual(len(members), 4)
+        self.assertEqual(collection.members.count(), 3)
+        self.assertEqual(
+            list(collection.ordered_items), [self.book1, self.book2, book3]
+        )
+        member2 = collection.get_member_for_item(self.book2)
+        self.assertIsInstance(member2, CollectionMember)
+        self.assertEqual(member2.note, "test")  # type:ignore
+        self.assertEqual(member2.pk, members[1].pk)  # type:ignore
+        member3 = collection.get_member_for_item(book3)
+        self.assertEqual(member3.owner, self.user.identity)  # type:ignore
+        collection.update_member_order([members[2].pk, members[1].pk, members[0].pk])
+        self.assertEqual(
+            list(collection.ordered_items), [book3, self.book2, self.book1]
+        )
+        collection.move_down_item(book3)
+        self.assertEqual(
+            list(collection.ordered_items), [self.book2, book3, self.book1]
+        )
+
+    def test_stats(self):
+        identity = self.user.identity
+        c1 = Collection.objects.create(title="c1", owner=identity)
+        c1.append_items([self.book1, self.book2])
+        c2 = Collection.objects.create(title="c2", owner=identity)
+        c2.append_item(self.book2)
+        c3 = Collection.objects.create(title="c3", owner=identity)
+        stats = Collection.get_stats_for_collections(identity, [c1, c2, c3])
+        self.assertEqual(stats[c1.pk]["total"], 2)
+        self.assertEqual(stats[c1.pk]["complete"], 0)
+        self.assertEqual(stats[c3.pk]["percentage"], 0)
+        Mark(identity, self.book2).update(ShelfType.COMPLETE)
+        Mark(identity, self.book1).update(ShelfType.WISHLIST)
+        stats = Collection.get_stats_for_collections(identity, [c1, c2, c3])
+        self.assertEqual(stats[c1.pk]["complete"], 1)
+        self.assertEqual(stats[c1.pk]["wishlist"], 1)
+        self.assertEqual(stats[c1.pk]["percentage"], 50)
+        self.assertEqual(stats[c2.pk]["percentage"], 100)
+        c2.append_item(self.book1)
+        self.assertEqual(c2.get_progress(identity), 50)
+        self.assertEqual(c2.get_stats(identity, cached=False)["total"], 2)
+
 
 class ShelfTest(TestCase):
     databases = "__all__"
@@ -159,6 +214,20 @@ class TagTest(TestCase):
         m = Mark(self.user2.identity, self.book1)
         self.assertEqual(m.tags, [t2, t3])
 
+    def test_indexable_tags_for_items(self):
+        TagManager.tag_item_for_owner(self.user1.identity, self.book1, ["A", "b"])
+        TagManager.tag_item_for_owner(self.user2.identity, self.book1, ["a"])
+        TagManager.tag_item_for_owner(
+            self.user3.identity, self.book2, ["c"], default_visibility=2
+        )
+        TagManager.tag_item_for_owner(self.user3.identity, self.movie1, ["d"])
+        with self.assertNumQueries(1):
+            tags = TagManager.indexable_tags_for_items(
+                [self.book1.pk, self.book2.pk, self.movie1.pk]
+            )
+        self.assertEqual(tags, {self.book1.pk: ["a", "b"], self.movie1.pk: ["d"]})
+        self.assertEqual(tags[self.book1.pk], self.book1.tags)
+
 
 class MarkTest(TestCase):
     databases = "__all__"
@@ -200,6 +269,51 @@ class MarkTest(TestCase):
         mark = Mark(self.user1.identity, self.book1)
         self.assertIsNone(mark.review)
 
+    def test_prefetch_latest_posts(self):
+        book2 = Edition.objects.create(title="Andymion")
+        Review.update_item_review(self.book1, self.user1.identity, "Critic", "Review")
+        Review.update_item_review(book2, self.user1.identity, "Critic", "Review")
+        reviews = list(Review.objects.filter(owner=self.user1.identity))
+        with self.assertNumQueries(1), self.assertNumQueries(1, using="takahe"):
+            Piece.prefetch_latest_posts(reviews)
+        with self.assertNumQueries(0), self.assertNumQueries(0, using="takahe"):
+            for r in reviews:
+                self.assertEqual(r.like_count, 0)
+                self.assertEqual(r.reply_count, 0)
+        for r in reviews:
+            fresh = Review.objects.get(pk=r.pk)
+            self.assertEqual(r.latest_post_id, fresh.latest_post_id)
+
+    def test_prefetch_viewer_state(self):
+        book2 = Edition.objects.create(title="Andymion")
+        Mark(self.user1.identity, self.book1).update(ShelfType.WISHLIST)
+        Review.update_item_review(self.book1, self.user1.identity, "Critic", "Review")
+        reviews = list(Review.objects.filter(owner=self.user1.identity))
+        request = SimpleNamespace(user=self.user1)
+        prefetch_viewer_state(request, items=[self.book1, book2], pieces=reviews)
+        self.assertEqual(request.item_shelved, {self.book1.pk: True, book2.pk: False})
+        self.assertEqual(reviews[0].latest_post.liked_by_current_user, False)
+        self.assertEqual(reviews[0].latest_post.boosted_by_current_user, False)
+
+    def test_prefetch_pieces_for_posts(self):
+        Mark(self.user1.identity, self.book1).update(ShelfType.WISHLIST, "c", 9)
+        member = Mark(self.user1.identity, self.book1).shelfmember
+        post = Takahe.get_post(member.latest_post_id)
+        Piece.prefetch_pieces_for_posts([post])
+        with self.assertNumQueries(0):
+            self.assertEqual(post.piece, member)
+            self.assertEqual(post.item, self.book1)
+        # post with several pieces but no shelf member falls back to shelf log
+        mark = Mark(self.user1.identity, self.book1)
+        PiecePost.objects.filter(post_id=post.pk).delete()
+        mark.comment.link_post_id(post.pk)
+        mark.rating.link_post_id(post.pk)
+        post = Takahe.get_post(post.pk)
+        Piece.prefetch_pieces_for_posts([post])
+        with self.assertNumQueries(0):
+            self.assertEqual(post.piece, None)
+            self.assertEqual(post.item, self.book1)
+
     def test_tag(self):
         TagManager.tag_item_for_owner(
             self.user1.identity, self.book1, [" Sci-Fi ", " fic "]
@@ -207,6 +321,314 @@ class MarkTest(TestCase):
         mark = Mark(self.user1.identity, self.book1)
         self.assertEqual(mark.tags, ["Sci-Fi", "fic"])
 
+    def test_markset(self):
+        owner = self.user1.identity
+        book2 = Edition.objects.create(title="Andymion")
+        Mark(owner, self.book1).update(ShelfType.WISHLIST, "a gentle comment", 9)
+        Mark(owner, book2).update(ShelfType.COMPLETE)
+        TagManager.tag_item_for_owner(owner, self.book1, ["Sci-Fi", "fic"])
+        members = list(ShelfMember.objects.filter(owner=owner).order_by("pk"))
+        MarkSet.attach(members)
+        with self.assertNumQueries(0):
+            marks = [m.mark for m in members]
+            self.assertEqual(marks[0].shelf_type, ShelfType.WISHLIST)
+            self.assertEqual(marks[0].comment_text, "a gentle comment")
+            self.assertEqual(marks[0].rating_grade, 9)
+            self.assertEqual(marks[0].tags, ["Sci-Fi", "fic"])
+            self.assertEqual(marks[0].review, None)
+            self.assertEqual(marks[1].shelf_type, ShelfType.COMPLETE)
+            self.assertEqual(marks[1].rating_grade, None)
+            self.assertEqual(marks[1].tags, [])
+            self.assertEqual(members[1].tags, [])
+        marks = MarkSet(owner, [self.book1, book2])
+        self.assertEqual(marks[book2].shelf_type, ShelfType.COMPLETE)
+        self.assertEqual(marks[self.book1.pk].rating_grade, 9)
+
+
+class CalendarTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.book1 = Edition.objects.create(title="Hyperion")
+        self.movie1 = Movie.objects.create(title="Fight Club")
+        self.user1 = User.register(email="a@b.com", username="user")
+
+    def assertCalendarUpdated(self, shelf_manager):
+        cached = {v: shelf_manager.get_calendar_data(v) for v in [0, 1, 2]}
+        shelf_manager.clear_calendar_data(shelf_manager.owner.pk)
+        for v in [0, 1, 2]:
+            self.assertEqual(
+                {d: sorted(t["items"]) for d, t in cached[v].items()},
+                {
+                    d: sorted(t["items"])
+                    for d, t in shelf_manager.get_calendar_data(v).items()
+                },
+            )
+
+    def test_calendar(self):
+        shelf_manager = self.user1.identity.shelf_manager
+        self.assertEqual(shelf_manager.get_calendar_data(2), {})
+        self.assertEqual(shelf_manager.get_calendar_data(0), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            Mark(self.user1.identity, self.book1).update(
+                ShelfType.COMPLETE, visibility=1
+            )
+        today = timezone.localdate().isoformat()
+        # cached calendar is updated in place, not loaded again
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                shelf_manager.get_calendar_data(2), {today: {"items": ["book"]}}
+            )
+            self.assertEqual(shelf_manager.get_calendar_data(0), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            Mark(self.user1.identity, self.movie1).update(ShelfType.WISHLIST, "comment")
+        self.assertCalendarUpdated(shelf_manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            Mark(self.user1.identity, self.book1).update(
+                ShelfType.COMPLETE, created_time=timezone.now() - timedelta(days=30)
+            )
+        self.assertCalendarUpdated(shelf_manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            Mark(self.user1.identity, self.book1).update(ShelfType.PROGRESS)
+        self.assertCalendarUpdated(shelf_manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            Mark(self.user1.identity, self.movie1).delete()
+        self.assertEqual(shelf_manager.get_calendar_data(2), {})
+
+    def test_calendar_timezone(self):
+        shelf_manager = self.user1.identity.shelf_manager
+        t = (timezone.now() - timedelta(days=10)).astimezone(datetime_timezone.utc)
+        t = t.replace(hour=20)
+        Mark(self.user1.identity, self.book1).update(ShelfType.COMPLETE, created_time=t)
+        day = t.date()
+        for tz, d in [("UTC", day), ("Asia/Tokyo", day + timedelta(days=1))] * 2:
+            with timezone.override(tz):
+                self.assertEqual(
+                    list(shelf_manager.get_calendar_data(2).keys()), [d.isoformat()]
+                )
+
+
+class ItemMarkCountTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.book1 = Edition.objects.create(title="Hyperion")
+        self.book2 = Edition.objects.create(title="Andymion")
+        self.user1 = User.register(email="a@b.com", username="user")
+        self.user2 = User.register(email="x@b.com", username="user2")
+
+    def get_counts(self, days=7):
+        return dict(
+            ItemMarkCount.recent(days)
+            .values("item_id")
+            .annotate(num=Sum("count"))
+            .values_list("item_id", "num")
+        )
+
+    def test_mark_count(self):
+        Mark(self.user1.identity, self.book1).update(ShelfType.WISHLIST)
+        Mark(self.user2.identity, self.book1).update(ShelfType.COMPLETE)
+        Mark(self.user1.identity, self.book2).update(ShelfType.PROGRESS)
+        self.assertEqual(self.get_counts(), {self.book1.pk: 2, self.book2.pk: 1})
+        c = ItemMarkCount.objects.get(item=self.book1)
+        self.assertEqual(c.category, ItemCategory.Book)
+        self.assertEqual(c.local_count, 2)
+        Mark(self.user1.identity, self.book1).update(ShelfType.PROGRESS)
+        self.assertEqual(self.get_counts(), {self.book1.pk: 2, self.book2.pk: 1})
+        Mark(self.user1.identity, self.book2).update(
+            ShelfType.PROGRESS, created_time=timezone.now() - timedelta(days=30)
+        )
+        self.assertEqual(self.get_counts(), {self.book1.pk: 2})
+        self.assertEqual(self.get_counts(60), {self.book1.pk: 2, self.book2.pk: 1})
+        Mark(self.user2.identity, self.book1).delete()
+        self.assertEqual(self.get_counts(), {self.book1.pk: 1})
+        counts = set(ItemMarkCount.objects.values_list("item_id", "day", "count"))
+        ItemMarkCount.rebuild()
+        self.assertEqual(
+            set(ItemMarkCount.objects.values_list("item_id", "day", "count")), counts
+        )
+
+
+class ShelfCountTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.book1 = Edition.objects.create(title="Hyperion")
+        self.book2 = Edition.objects.create(title="Andymion")
+        self.movie1 = Movie.objects.create(title="Fight Club")
+        self.user1 = User.register(email="a@b.com", username="user")
+
+    def test_shelf_count(self):
+        owner = self.user1.identity
+        Mark(owner, self.book1).update(ShelfType.WISHLIST, visibility=0)
+        Mark(owner, self.book2).update(ShelfType.WISHLIST, visibility=1)
+        Mark(owner, self.movie1).update(ShelfType.COMPLETE, visibility=2)
+        Review.update_item_review(self.book1, owner, "title", "body", visibility=0)
+        self.assertEqual(
+            ShelfCount.get_counts(owner.pk, 2),
+            {
+                (ItemCategory.Book, ShelfType.WISHLIST): 2,
+                (ItemCategory.Movie, ShelfType.COMPLETE): 1,
+                (ItemCategory.Book, "reviewed"): 1,
+            },
+        )
+        self.assertEqual(
+            ShelfCount.get_counts(owner.pk, 0),
+            {
+                (ItemCategory.Book, ShelfType.WISHLIST): 1,
+                (ItemCategory.Book, "reviewed"): 1,
+            },
+        )
+        Mark(owner, self.book2).update(ShelfType.PROGRESS, visibility=0)
+        Mark(owner, self.movie1).delete()
+        self.assertEqual(
+            ShelfCount.get_counts(owner.pk, 2),
+            {
+                (ItemCategory.Book, ShelfType.WISHLIST): 1,
+                (ItemCategory.Book, ShelfType.PROGRESS): 1,
+                (ItemCategory.Book, "reviewed"): 1,
+            },
+        )
+        counts = set(ShelfCount.objects.values_list("category", "shelf_type", "count"))
+        ShelfCount.rebuild()
+        self.assertEqual(
+            set(ShelfCount.objects.values_list("category", "shelf_type", "count")),
+            counts,
+        )
+
+    def test_latest_pieces(self):
+        owner = self.user1.identity
+        Mark(owner, self.book1).update(ShelfType.WISHLIST)
+        Mark(owner, self.book2).update(ShelfType.WISHLIST)
+        Mark(owner, self.movie1).update(ShelfType.COMPLETE)
+        latest = ShelfManager.get_latest_pieces_by_category(
+            ShelfMember.objects.filter(owner=owner), "parent__shelf_type", limit=1
+        )
+        self.assertEqual(
+            {k: [m.item for m in v] for k, v in latest.items()},
+            {
+                (ItemCategory.Book, ShelfType.WISHLIST): [self.book2],
+                (ItemCategory.Movie, ShelfType.COMPLETE): [self.movie1],
+            },
+        )
+
+
+class RatingTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.show = TVShow.objects.create(title="Doctor Who")
+        self.season = TVSeason.objects.create(title="Doctor Who S1", show=self.show)
+        self.users = [
+            User.register(email=f"u{i}@b.com", username=f"user{i}") for i in range(6)
+        ]
+
+    def test_rating_summary(self):
+        for i, user in enumerate(self.users[:4]):
+            Rating.update_item_rating(self.season, user.identity, 6 + i)
+        Rating.update_item_rating(self.show, self.users[4].identity, 10)
+        season = TVSeason.objects.get(pk=self.season.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(season.rating_count, 4)
+            self.assertIsNone(season.rating)
+            self.assertEqual(season.rating_dist, [0] * 5)
+        show = TVShow.objects.get(pk=self.show.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(show.rating_count, 5)
+            self.assertEqual(show.rating, 8.0)
+            self.assertEqual(show.rating_dist, [0, 0, 20, 40, 40])
+        Rating.update_item_rating(self.season, self.users[0].identity, None)
+        Rating.update_item_rating(self.season, self.users[1].identity, 1)
+        show = TVShow.objects.get(pk=self.show.pk)
+        self.assertEqual(show.rating_count, 4)
+        self.assertEqual(show.rating_dist, [0] * 5)
+        RatingSummary.objects.all().delete()
+        self.assertEqual(RatingSummary.rebuild(), 2)
+        show = TVShow.objects.get(pk=self.show.pk)
+        self.assertEqual(show.rating_count, 4)
+        self.assertEqual(
+            show.rating_summary.distribution, [1, 0, 0, 0, 0, 0, 0, 1, 1, 1]
+        )
+
+
+class DoufenExportTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.book1 = Edition.objects.create(title="Hyperion")
+        self.book2 = Edition.objects.create(title="Andymion")
+        self.movie1 = Movie.objects.create(title="Fight Club")
+        self.user1 = User.register(email="a@b.com", username="user")
+
+    def test_export_then_import(self):
+        from journal.exporters.doufen import export_marks_task
+        from journal.importers.douban import DoubanImporter
+
+        Mark(self.user1.identity, self.book1).update(
+            ShelfType.COMPLETE, "a gentle comment", 8, ["sci-fi", "fic"]
+        )
+        Mark(self.user1.identity, self.book2).update(ShelfType.COMPLETE)
+        Mark(self.user1.identity, self.movie1).update(ShelfType.WISHLIST)
+        export_marks_task(self.user1)
+        status = self.user1.preference.export_status
+        self.assertFalse(status["marks_pending"])
+        self.assertEqual(status["marks_processed"], 3)
+        importer = DoubanImporter(self.user1, 0, 0)
+        importer.file = status["marks_file"]
+        importer.load_sheets()
+        self.assertEqual(importer.total, 3)
+        books = importer.mark_data["读过"]
+        self.assertEqual([r[0] for r in books], ["Hyperion", "Andymion"])
+        self.assertEqual(books[0][5], 4)
+        self.assertEqual(books[0][6], "fic,sci-fi")
+        self.assertEqual(books[0][7], "a gentle comment")
+        self.assertEqual(books[1][8], self.book2.absolute_url)
+        self.assertEqual(len(importer.mark_data["想看"]), 1)
+
+
+class ImportPipelineTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.book1 = Edition.objects.create(title="Hyperion")
+        self.book2 = Edition.objects.create(title="Andymion")
+        ExternalResource.objects.create(
+            item=self.book1,
+            id_type=IdType.Goodreads,
+            id_value="77566",
+            url="https://www.goodreads.com/book/show/77566",
+        )
+        self.user1 = User.register(email="a@b.com", username="user")
+
+    def test_resolve(self):
+        from journal.importers.pipeline import ItemResolver
+
+        url1 = "https://www.goodreads.com/book/show/77566"
+        url2 = "https://www.goodreads.com/book/show/1"
+        fetched = []
+        resolver = ItemResolver(lambda url: fetched.append(url))
+        self.assertEqual(resolver.lookup([url1, url2]), {url1: self.book1})
+        resolver.min_interval = 0
+        items = resolver.resolve([url1, url2, url1])
+        self.assertEqual(items, {url1: self.book1, url2: None})
+        self.assertEqual(fetched, [url2])
+
+    def test_apply_marks(self):
+        from journal.importers.pipeline import apply_marks
+
+        def apply(item):
+            if item == self.book2:
+                raise ValueError()
+            mark = Mark(self.user1.identity, item)
+            mark.update(ShelfType.COMPLETE, defer_post=True)
+            return mark
+
+        failed = []
+        apply_marks([self.book1, self.book2], apply, on_error=failed.append)
+        self.assertEqual(failed, [self.book2])
+        self.assertIsNotNone(Mark(self.user1.identity, self.book1).latest_post_id)
+        self.assertIsNone(Mark(self.user1.identity, self.book2).shelf_type)
+
 
 class DebrisTest(TestCase):
     databases = "__all__"
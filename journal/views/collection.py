@@ -194,11 +194,14 @@ def collection_retrieve_items(
     if not collection.is_visible_to(request.user):
         raise PermissionDenied(_("Insufficient permission"))
     form = CollectionForm(instance=collection)
+    members = list(collection.ordered_members.prefetch_related("item"))
+    prefetch_viewer_state(request, items=[m.item for m in members])
     return render(
         request,
         "collection_items.html",
         {
             "collection": collection,
+            "members": members,
             "form": form,
             "collection_edit": edit or request.GET.get("edit"),
             "msg": msg,
@@ -340,6 +343,8 @@ def user_collection_list(request: AuthedHttpRequest, user_name):
         .filter(q_owned_piece_visible_to_user(request.user, target))
         .order_by("-edited_time")
     )
+    collections = list(collections)
+    Piece.prefetch_latest_posts(collections)
     return render(
         request,
         "user_collection_list.html",
@@ -363,6 +368,8 @@ def user_liked_collection_list(request: AuthedHttpRequest, user_name):
     ).order_by("-edited_time")
     if target.user != request.user:
         collections = collections.filter(q_piece_visible_to_user(request.user))
+    collections = list(collections)
+    Piece.prefetch_latest_posts(collections)
     return render(
         request,
         "user_collection_list.html",
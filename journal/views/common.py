@@ -103,6 +103,9 @@ def render_list(
     paginator = Paginator(queryset, PAGE_SIZE)  # type:ignore
     page_number = int(request.GET.get("page", default=1))
     members = paginator.get_page(page_number)
+    members.object_list = members.object_list.prefetch_related("item")
+    prefetch_viewer_state(request, items=[m.item for m in members])
+    MarkSet.attach(members)
     pagination = PageLinksGenerator(page_number, paginator.num_pages, request.GET)
     shelf_labels = (
         ShelfManager.get_labels_for_category(item_category) if item_category else []
@@ -50,6 +50,16 @@ def profile(request: AuthedHttpRequest, user_name):
         ItemCategory.Game,
         ItemCategory.Performance,
     ]
+    counts = ShelfCount.get_counts(
+        target.pk, max_visiblity_to_user(request.user, target)
+    )
+    latest_members = ShelfManager.get_latest_pieces_by_category(
+        ShelfMember.objects.filter(qv).exclude(parent__shelf_type=ShelfType.DROPPED),
+        "parent__shelf_type",
+    )
+    latest_reviews = ShelfManager.get_latest_pieces_by_category(
+        Review.objects.filter(qv)
+    )
     for category in visbile_categories:
         shelf_list[category] = {}
         for shelf_type in ShelfType:
@@ -57,23 +67,15 @@ def profile(request: AuthedHttpRequest, user_name):
                 continue
             label = target.shelf_manager.get_label(shelf_type, category)
             if label is not None:
-                members = target.shelf_manager.get_latest_members(
-                    shelf_type, category
-                ).filter(qv)
                 shelf_list[category][shelf_type] = {
                     "title": label,
-                    "count": members.count(),
-                    "members": members[:10].prefetch_related("item"),
+                    "count": counts.get((category, shelf_type), 0),
+                    "members": latest_members.get((category, shelf_type), []),
                 }
-        reviews = (
-            Review.objects.filter(q_item_in_category(category))
-            .filter(qv)
-            .order_by("-created_time")
-        )
         shelf_list[category]["reviewed"] = {
             "title": target.shelf_manager.get_label("reviewed", category),
-            "count": reviews.count(),
-            "members": reviews[:10].prefetch_related("item"),
+            "count": counts.get((category, "reviewed"), 0),
+            "members": latest_reviews.get((category, None), []),
         }
     collections = Collection.objects.filter(qv).order_by("-created_time")
     liked_collections = Collection.objects.filter(
@@ -11,7 +11,6 @@ from django.utils import timezone
 from loguru import logger
 
 from catalog.common import jsondata
-from takahe.utils import Takahe
 
 from .common import SocialAccount
 
@@ -199,28 +198,18 @@ class BlueskyAccount(SocialAccount):
             )
         return True
 
-    def sync_graph(self):
-        c = 0
-
+    def get_graph_identity_ids(self):
         def get_identity_ids(accts: list):
             return set(
                 BlueskyAccount.objects.filter(
-                    domain=Bluesky._DOMAIN, uid__in=accts
+                    domain=Bluesky._DOMAIN, uid__in=accts, user__identity__isnull=False
                 ).values_list("user__identity", flat=True)
             )
 
-        me = self.user.identity.pk
-        for target_identity in get_identity_ids(self.following):
-            if not Takahe.get_is_following(me, target_identity):
-                Takahe.follow(me, target_identity, True)
-                c += 1
-
-        for target_identity in get_identity_ids(self.mutes):
-            if not Takahe.get_is_muting(me, target_identity):
-                Takahe.mute(me, target_identity)
-                c += 1
-
-        return c
+        return {
+            "following": get_identity_ids(self.following),
+            "muting": get_identity_ids(self.mutes),
+        }
 
     def post(
         self,
@@ -8,6 +8,7 @@ from loguru import logger
 from typedmodels.models import TypedModel
 
 from catalog.common import jsondata
+from takahe.utils import Takahe
 
 
 class Platform(models.TextChoices):
@@ -126,5 +127,15 @@ class SocialAccount(TypedModel):
         logger.debug(f"{self} refreshed")
         return True
 
+    def get_graph_identity_ids(self) -> dict[str, set[int]]:
+        """
+        ids of local identities followed, blocked and muted by this account,
+        in a dict with keys of following, blocking and muting
+        """
+        return {}
+
     def sync_graph(self) -> int:
-        return 0
+        graph = self.get_graph_identity_ids()
+        if not graph:
+            return 0
+        return Takahe.sync_relationships(self.user.identity.pk, **graph)
@@ -3,6 +3,7 @@ import random
 import re
 import string
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from enum import StrEnum
 from urllib.parse import quote
 
@@ -71,6 +72,9 @@ API_REVOKE_TOKEN = "/oauth/revoke"
 # GET
 API_GET_RELATIONSHIPS = "/api/v1/accounts/relationships"
 
+# page size of followers, following, mutes, blocks and domain_blocks
+RELATED_ACCOUNTS_PAGE_SIZE = 80
+
 # toot
 # POST
 API_PUBLISH_TOOT = "/api/v1/statuses"
@@ -711,6 +715,8 @@ class MastodonAccount(SocialAccount):
             url = f"/api/v1/accounts/{self.account_data['id']}/{api_path}"
         else:
             url = f"/api/v1/{api_path}"
+        # largest page size allowed by Mastodon, following pages are linked with it
+        url += f"?limit={RELATED_ACCOUNTS_PAGE_SIZE}"
         results = []
         while url:
             try:
@@ -780,11 +786,15 @@ class MastodonAccount(SocialAccount):
         return True
 
     def refresh_graph(self, save=True):
-        self.followers = self.get_related_accounts("followers")
-        self.following = self.get_related_accounts("following")
-        self.mutes = self.get_related_accounts("mutes")
-        self.blocks = self.get_related_accounts("blocks")
-        self.domain_blocks = self.get_related_accounts("domain_blocks")
+        # lists are paged separately, so they are fetched concurrently
+        paths = ["followers", "following", "mutes", "blocks", "domain_blocks"]
+        with ThreadPoolExecutor(len(paths)) as executor:
+            results = dict(zip(paths, executor.map(self.get_related_accounts, paths)))
+        self.followers = results["followers"]
+        self.following = results["following"]
+        self.mutes = results["mutes"]
+        self.blocks = results["blocks"]
+        self.domain_blocks = results["domain_blocks"]
         if save:
             self.save(
                 update_fields=[
@@ -797,45 +807,22 @@ class MastodonAccount(SocialAccount):
             )
         return True
 
-    def sync_graph(self):
-        c = 0
-
-        def get_identity_ids(accts: list):
-            return set(
-                MastodonAccount.objects.filter(handle__in=accts).values_list(
-                    "user__identity", flat=True
-                )
-            )
-
-        def get_identity_ids_in_domains(domains: list):
+    def get_graph_identity_ids(self):
+        def get_identity_ids(q: models.Q):
             return set(
-                MastodonAccount.objects.filter(domain__in=domains).values_list(
-                    "user__identity", flat=True
-                )
+                MastodonAccount.objects.filter(
+                    q, user__identity__isnull=False
+                ).values_list("user__identity", flat=True)
             )
 
-        me = self.user.identity.pk
-        for target_identity in get_identity_ids(self.following):
-            if not Takahe.get_is_following(me, target_identity):
-                Takahe.follow(me, target_identity, True)
-                c += 1
-
-        for target_identity in get_identity_ids(self.blocks):
-            if not Takahe.get_is_blocking(me, target_identity):
-                Takahe.block(me, target_identity)
-                c += 1
-
-        for target_identity in get_identity_ids_in_domains(self.domain_blocks):
-            if not Takahe.get_is_blocking(me, target_identity):
-                Takahe.block(me, target_identity)
-                c += 1
-
-        for target_identity in get_identity_ids(self.mutes):
-            if not Takahe.get_is_muting(me, target_identity):
-                Takahe.mute(me, target_identity)
-                c += 1
-
-        return c
+        return {
+            "following": get_identity_ids(models.Q(handle__in=self.following)),
+            "blocking": get_identity_ids(
+                models.Q(handle__in=self.blocks)
+                | models.Q(domain__in=self.domain_blocks)
+            ),
+            "muting": get_identity_ids(models.Q(handle__in=self.mutes)),
+        }
 
     def boost(self, post_url: str):
         boost_toot(self._api_domain, self.access_token, post_url)
@@ -62,7 +62,8 @@ class ActivityManager:
         self.owner = owner
 
     def get_timeline(self, before_time=None):
-        following = [x for x in self.owner.following if x not in self.owner.muting]
+        r = self.owner.relationships
+        following = [x for x in r["following"] if x not in r["muting"]]
         q = Q(owner_id__in=following, visibility__lt=2) | Q(owner=self.owner)
         if before_time:
             q = q & Q(created_time__lt=before_time)
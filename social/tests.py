@@ -2,10 +2,12 @@ from django.test import TestCase
 
 from catalog.models import *
 from journal.models import *
+from takahe.models import TimelineEvent
 from takahe.utils import Takahe
 from users.models import User
 
 from .models import *
+from .views import NotificationEvent
 
 
 class SocialTest(TestCase):
@@ -77,3 +79,43 @@ class SocialTest(TestCase):
         self.alice.identity.block(self.bob.identity)
         Takahe._force_state_cycle()
         self.assertEqual(len(bob_feed.get_timeline()), 0)
+
+    def test_notification(self):
+        Mark(self.alice.identity, self.book1).update(ShelfType.WISHLIST, visibility=0)
+        shelfmember = Mark(self.alice.identity, self.book1).shelfmember
+        post = shelfmember.latest_post
+        self.assertIsNotNone(post)
+        like = Takahe.like_post(post.pk, self.bob.identity.pk)
+        boost = Takahe.boost_post(post.pk, self.bob.identity.pk)
+        reply = Takahe.reply_post(
+            post.pk, self.bob.identity.pk, "Nice!", Takahe.Visibilities.public
+        )
+        # events are fanned out by takahe, create them as it would
+        for t, subject_post, interaction in [
+            ("liked", post, like),
+            ("boosted", post, boost),
+            ("mentioned", reply, None),
+        ]:
+            TimelineEvent.objects.create(
+                identity_id=self.alice.identity.pk,
+                type=t,
+                subject_post=subject_post,
+                subject_post_interaction=interaction,
+                subject_identity_id=self.bob.identity.pk,
+            )
+        tles = list(
+            Takahe.get_events(self.alice.identity.pk, ["liked", "boosted", "mentioned"])
+        )
+        self.assertEqual(len(tles), 3)
+        with self.assertNumQueries(14), self.assertNumQueries(1, using="takahe"):
+            events = NotificationEvent.load(tles)
+        events = {e.type: e for e in events}
+        for t in ["liked", "boosted", "mentioned"]:
+            e = events[t]
+            self.assertEqual(e.piece, shelfmember)
+            self.assertEqual(e.item, self.book1)
+            self.assertEqual(e.post, post)
+            self.assertEqual(e.template, t + "_shelfmember")
+            self.assertEqual(e.identity, self.bob.identity)
+        self.assertEqual(events["mentioned"].reply, reply)
+        self.assertFalse(hasattr(events["liked"], "reply"))
@@ -5,7 +5,7 @@ from django.views.decorators.http import require_http_methods
 
 from catalog.models import *
 from journal.models import *
-from takahe.models import PostInteraction, TimelineEvent
+from takahe.models import Post, TimelineEvent
 from takahe.utils import Takahe
 
 from .models import *
@@ -97,22 +97,10 @@ def data(request):
         )
         .order_by("-id")[:PAGE_SIZE]
     )
-    interactions = PostInteraction.objects.filter(
-        identity_id=identity_id,
-        post_id__in=[event.subject_post_id for event in events],
-        type__in=["like", "boost"],
-        state__in=["new", "fanned_out"],
-    ).values_list("post_id", "type")
-    for event in events:
-        if event.subject_post_id:
-            event.subject_post.liked_by_current_user = (
-                event.subject_post_id,
-                "like",
-            ) in interactions
-        event.subject_post.boosted_by_current_user = (
-            event.subject_post_id,
-            "boost",
-        ) in interactions
+    Takahe.prefetch_post_interactions(
+        [event.subject_post for event in events], identity_id
+    )
+    Piece.prefetch_pieces_for_posts([event.subject_post for event in events])
     return render(request, "feed_events.html", {"feed_type": typ, "events": events})
 
 
@@ -159,28 +147,89 @@ def notification(request):
 
 
 class NotificationEvent:
-    def __init__(self, tle) -> None:
+    def __init__(
+        self,
+        tle,
+        identity: APIdentity | None,
+        post: Post | None,
+        reply: Post | None,
+        piece: Piece | None,
+    ) -> None:
         self.event = tle
         self.type = tle.type
         self.template = tle.type
         self.created = tle.created
-        self.identity = (
-            APIdentity.objects.filter(pk=tle.subject_identity.pk).first()
-            if tle.subject_identity
-            else None
-        )
-        self.post = tle.subject_post
-        if self.type == "mentioned":
-            # for reply, self.post is the original post
-            self.reply = self.post
-            self.replies = [self.post]
-            self.post = self.post.in_reply_to_post() if self.post else None
-        self.piece = Piece.get_by_post_id(self.post.id) if self.post else None
+        self.identity = identity
+        self.post = post
+        if reply:
+            self.reply = reply
+            self.replies = [reply]
+        self.piece = piece
         self.item = getattr(self.piece, "item") if hasattr(self.piece, "item") else None
         if self.piece and self.template in ["liked", "boosted", "mentioned"]:
             cls = self.piece.__class__.__name__.lower()
             self.template += "_" + cls
 
+    @classmethod
+    def load(cls, tles) -> list["NotificationEvent"]:
+        """
+        build notification events with identities, replied posts, pieces and items
+        of all timeline events loaded together, one query for each kind
+        """
+        tles = list(tles)
+        identities = APIdentity.objects.in_bulk(
+            {tle.subject_identity_id for tle in tles if tle.subject_identity_id}
+        )
+        reply_uris = {
+            tle.subject_post.in_reply_to
+            for tle in tles
+            if tle.type == "mentioned"
+            and tle.subject_post
+            and tle.subject_post.in_reply_to
+        }
+        replied_posts = {
+            p.object_uri: p
+            for p in Post.objects.filter(object_uri__in=reply_uris).select_related(
+                "author"
+            )
+        }
+        posts = []
+        replies = []
+        for tle in tles:
+            post = tle.subject_post
+            reply = None
+            if tle.type == "mentioned" and post:
+                # for reply, post is the original post
+                reply = post
+                post = replied_posts.get(post.in_reply_to) if post.in_reply_to else None
+            posts.append(post)
+            replies.append(reply)
+        piece_ids = {}
+        for post_id, piece_id in (
+            PiecePost.objects.filter(post_id__in={p.pk for p in posts if p})
+            .order_by("-pk")
+            .values_list("post_id", "piece_id")
+        ):
+            piece_ids[post_id] = piece_id  # first piece of each post is kept
+        pieces = Piece.objects.in_bulk(piece_ids.values())
+        items = Item.objects.in_bulk(
+            {p.item_id for p in pieces.values() if getattr(p, "item_id", None)}
+        )
+        for p in pieces.values():
+            if getattr(p, "item_id", None) in items:
+                p.item = items[p.item_id]  # type:ignore
+        MarkSet.attach([p for p in pieces.values() if isinstance(p, ShelfMember)])
+        return [
+            cls(
+                tle,
+                identities.get(tle.subject_identity_id),  # type:ignore
+                post,
+                reply,
+                pieces.get(piece_ids.get(post.pk)) if post else None,  # type:ignore
+            )
+            for tle, post, reply in zip(tles, posts, replies)
+        ]
+
 
 @login_required
 @require_http_methods(["GET"])
@@ -196,7 +245,7 @@ def events(request):
     last = request.GET.get("last")
     if last:
         es = es.filter(created__lt=last)
-    nes = [NotificationEvent(e) for e in es[:PAGE_SIZE]]
+    nes = NotificationEvent.load(es[:PAGE_SIZE])
     return render(
         request,
         "events.html",
@@ -8,3 +8,6 @@ class TakaheConfig(AppConfig):
     def ready(self):
         # register cron jobs
         from .jobs import TakaheStats  # isort:skip
+        from .utils import Takahe
+
+        Takahe.register_token_model()
@@ -1,27 +1,138 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
 from django.conf import settings
+from django.db import connections
 
 _is_testing = "testserver" in settings.ALLOWED_HOSTS
 
+_PIN_COOKIE = "neodb_primary"
+_SAFE_METHODS = ["GET", "HEAD", "OPTIONS"]
+
+# replica state of current context: None if replicas should not be used, otherwise
+# a dict with "pinned" and "written" set to True once anything is written to primary,
+# and "replicas" with one replica picked for each database, so reads in the context
+# never see data going backwards from replicas with different lag
+_replica_state: ContextVar[dict[str, Any] | None] = ContextVar(
+    "replica_state", default=None
+)
+
+
+def _get_replicas(db: str) -> list[str]:
+    return getattr(settings, "DATABASE_REPLICAS", {}).get(db, [])
+
+
+def _pick_replicas() -> dict[str, str]:
+    return {
+        db: random.choice(replicas)
+        for db, replicas in getattr(settings, "DATABASE_REPLICAS", {}).items()
+        if replicas
+    }
+
+
+def _get_primary(db: str | None) -> str | None:
+    for primary, replicas in getattr(settings, "DATABASE_REPLICAS", {}).items():
+        if db in replicas:
+            return primary
+    return db
+
+
+@contextmanager
+def use_replicas(pinned: bool = False):
+    """
+    reads in this context may go to replicas until anything is written,
+    this is used for each web request
+    """
+    token = _replica_state.set(
+        {"pinned": pinned, "written": False, "replicas": _pick_replicas()}
+    )
+    try:
+        yield _replica_state.get()
+    finally:
+        _replica_state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """reads in this context go to primary database, for code needs read-your-writes"""
+    token = _replica_state.set(None)
+    try:
+        yield
+    finally:
+        _replica_state.reset(token)
+
 
 class TakaheRouter:
+    """
+    route takahe models to takahe database, and reads in use_replicas() context
+    to replicas of each database in settings.DATABASE_REPLICAS
+    """
+
+    @staticmethod
+    def _primary_for(model) -> str:
+        return "takahe" if model._meta.app_label == "takahe" else "default"
+
     def db_for_read(self, model, **hints):
-        if model._meta.app_label == "takahe":
-            return "takahe"
-        return None
+        db = self._primary_for(model)
+        state = _replica_state.get()
+        replica = state["replicas"].get(db) if state else None
+        if (
+            state is None
+            or state["pinned"]
+            or not replica
+            or connections[db].in_atomic_block
+        ):
+            return "takahe" if db == "takahe" else None
+        return replica
 
     def db_for_write(self, model, **hints):
-        if model._meta.app_label == "takahe":
-            return "takahe"
-        return None
+        state = _replica_state.get()
+        if state is not None:
+            state["pinned"] = state["written"] = True
+        db = self._primary_for(model)
+        if _get_replicas(db):
+            # instance loaded from replica should be saved to primary
+            return db
+        return "takahe" if db == "takahe" else None
 
     def allow_relation(self, obj1, obj2, **hints):
         # skip this check but please make sure
         # not create relations between takahe models and other apps
         if obj1._meta.app_label == "takahe" or obj2._meta.app_label == "takahe":
             return obj1._meta.app_label == obj2._meta.app_label
+        if _get_primary(obj1._state.db) == _get_primary(obj2._state.db):
+            return True
         return None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if _get_primary(db) != db:
+            return False
         if app_label == "takahe" or db == "takahe":
             return _is_testing and app_label == db
         return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    let reads of safe requests go to replicas, a request is pinned to primary after
+    it writes, and so are requests of the same client for the next few seconds
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = request.method not in _SAFE_METHODS or _PIN_COOKIE in request.COOKIES
+        with use_replicas(pinned) as state:
+            response = self.get_response(request)
+        if state["written"]:
+            response.set_cookie(
+                _PIN_COOKIE,
+                "1",
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -1,3 +1,91 @@
-from django.test import TestCase
+from collections import defaultdict
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from catalog.models import Edition
+from takahe.models import Identity
+from users.models import User
+
+from .db_routes import TakaheRouter, use_primary, use_replicas
+from .utils import Takahe
+
+
+@override_settings(DATABASE_REPLICAS={"default": ["default_replica_0"], "takahe": []})
+class RouterTest(SimpleTestCase):
+    def test_replica(self):
+        router = TakaheRouter()
+        self.assertIsNone(router.db_for_read(Edition))
+        self.assertEqual(router.db_for_read(Identity), "takahe")
+        with use_replicas():
+            self.assertEqual(router.db_for_read(Edition), "default_replica_0")
+            self.assertEqual(router.db_for_read(Identity), "takahe")
+            with use_primary():
+                self.assertIsNone(router.db_for_read(Edition))
+            self.assertEqual(router.db_for_write(Edition), "default")
+            self.assertIsNone(router.db_for_read(Edition))
+        with use_replicas(pinned=True):
+            self.assertIsNone(router.db_for_read(Edition))
+        self.assertFalse(router.allow_migrate("default_replica_0", "catalog"))
+
+    @override_settings(
+        DATABASE_REPLICAS={"default": [f"default_replica_{i}" for i in range(4)]}
+    )
+    def test_replica_per_context(self):
+        router = TakaheRouter()
+        with use_replicas():
+            replica = router.db_for_read(Edition)
+            self.assertIn(replica, settings.DATABASE_REPLICAS["default"])
+            for _ in range(20):
+                self.assertEqual(router.db_for_read(Edition), replica)
+
+
+@override_settings(
+    DATABASE_REPLICAS={
+        "default": ["default_replica_0"],
+        "takahe": ["takahe_replica_0"],
+    },
+    RELATIONSHIP_CACHE_TIMEOUT=60,
+)
+class ReplicaCacheTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = User.register(email="a@b.com", username="user")
+        self.book = Edition.objects.create(title="Hyperion")
+        self.reads = []
+        router_read = TakaheRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            db = router_read(router, model, **hints)
+            self.reads.append(db)
+            # replicas don't exist in tests, record the route but read from primary
+            return router._primary_for(model) if db and "replica" in db else db
+
+        # test case runs in a transaction, which would keep all reads on primary
+        no_transaction = defaultdict(lambda: SimpleNamespace(in_atomic_block=False))
+        for p in [
+            mock.patch.object(TakaheRouter, "db_for_read", db_for_read),
+            mock.patch("takahe.db_routes.connections", no_transaction),
+        ]:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_cache_fill_from_primary(self):
+        identity = self.user.identity
+        shelf_manager = identity.shelf_manager
+        self.reads.clear()
+        with use_replicas():
+            Edition.objects.filter(pk=self.book.pk).first()
+            self.assertEqual(self.reads, ["default_replica_0"])
+            self.reads.clear()
+            shelf_manager.clear_calendar_data(identity.pk)
+            shelf_manager.get_calendar_data(2)
+            Takahe.clear_relationship_cache(identity.pk)
+            Takahe.get_relationship_ids(identity.pk)
+        self.client.get(self.book.api_url)
+        self.assertTrue(self.reads)
+        self.assertNotIn("default_replica_0", self.reads)
+        self.assertNotIn("takahe_replica_0", self.reads)
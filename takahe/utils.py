@@ -1,3 +1,4 @@
+import hashlib
 import io
 from datetime import timedelta
 from typing import TYPE_CHECKING
@@ -7,11 +8,13 @@ from django.conf import settings
 from django.core.cache import cache
 from django.core.files.images import ImageFile
 from django.core.signing import b62_encode
-from django.db.models import Count
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.utils import timezone
 from django.utils.translation import gettext as _
 from PIL import Image
 
+from .db_routes import use_primary
 from .models import *
 
 if TYPE_CHECKING:
@@ -19,6 +22,9 @@ if TYPE_CHECKING:
     from users.models import APIdentity
     from users.models import User as NeoUser
 
+_RELATIONSHIP_CACHE_KEY = "relationships:{}"
+_TOKEN_AUTH_CACHE_KEY = "token_auth:{}"
+
 
 class Takahe:
     Visibilities = Post.Visibilities
@@ -219,6 +225,47 @@ class Takahe:
             mute=False,
         ).exists()
 
+    @staticmethod
+    def get_relationship_ids(identity_pk: int) -> dict[str, list[int]]:
+        """
+        ids of identities followed, muted, blocked by and blocking the identity,
+        loaded in two queries, and cached if NEODB_RELATIONSHIP_CACHE_TIMEOUT is set
+        """
+        timeout = settings.RELATIONSHIP_CACHE_TIMEOUT
+        key = _RELATIONSHIP_CACHE_KEY.format(identity_pk)
+        if timeout:
+            r = cache.get(key)
+            if r is not None:
+                return r
+        # read from primary, replicas may lag behind the change cleared the cache
+        with use_primary():
+            r = {
+                "following": list(
+                    Follow.objects.filter(
+                        source_id=identity_pk, state="accepted"
+                    ).values_list("target", flat=True)
+                ),
+                "muting": [],
+                "blocking": [],
+                "blocked_by": [],
+            }
+            for source_id, target_id, mute in Block.objects.filter(
+                Q(source_id=identity_pk) | Q(target_id=identity_pk, mute=False),
+                state__in=["new", "sent", "awaiting_expiry"],
+            ).values_list("source_id", "target_id", "mute"):
+                if source_id != identity_pk:
+                    r["blocked_by"].append(source_id)
+                else:
+                    r["muting" if mute else "blocking"].append(target_id)
+        if timeout:
+            cache.set(key, r, timeout=timeout)
+        return r
+
+    @staticmethod
+    def clear_relationship_cache(*identity_pks: int):
+        if settings.RELATIONSHIP_CACHE_TIMEOUT:
+            cache.delete_many([_RELATIONSHIP_CACHE_KEY.format(i) for i in identity_pks])
+
     @staticmethod
     def get_following_ids(identity_pk: int):
         targets = Follow.objects.filter(
@@ -259,6 +306,7 @@ class Takahe:
         ):
             follow.state = to_state
             follow.save()
+            Takahe.clear_relationship_cache(source_pk, target_pk)
         return follow
 
     @staticmethod
@@ -279,6 +327,7 @@ class Takahe:
             )
             follow.uri = source.actor_uri + f"follow/{follow.pk}/"
             follow.save()
+        Takahe.clear_relationship_cache(source_pk, target_pk)
 
     @staticmethod
     def unfollow(source_pk: int, target_pk: int):
@@ -350,13 +399,15 @@ class Takahe:
             if not is_mute:
                 Takahe.unfollow(source_pk, target_pk)
                 Takahe.reject_follow_request(target_pk, source_pk)
-            return block
+        Takahe.clear_relationship_cache(source_pk, target_pk)
+        return block
 
     @staticmethod
     def undo_block_or_mute(source_pk: int, target_pk: int, is_mute: bool):
         Block.objects.filter(
             source_id=source_pk, target_id=target_pk, mute=is_mute
         ).update(state="undone")
+        Takahe.clear_relationship_cache(source_pk, target_pk)
 
     @staticmethod
     def block(source_pk: int, target_pk: int):
@@ -374,6 +425,96 @@ class Takahe:
     def unmute(source_pk: int, target_pk: int):
         return Takahe.undo_block_or_mute(source_pk, target_pk, True)
 
+    @staticmethod
+    def sync_relationships(
+        identity_pk: int,
+        following: set[int] | None = None,
+        blocking: set[int] | None = None,
+        muting: set[int] | None = None,
+    ) -> int:
+        """
+        follow, block and mute identities which are not yet, in a few bulk queries,
+        existing relationships not in these sets are kept, return number of new ones
+        """
+        source = Identity.objects.get(pk=identity_pk)
+        if not source.local:
+            raise ValueError(f"Cannot sync relationships of remote identity {source}")
+        blocking = set(blocking or []) - {identity_pk}
+        muting = set(muting or []) - {identity_pk}
+        # block implies unfollow, as it's done by block_or_mute()
+        following = set(following or []) - blocking - {identity_pk}
+        changed: set[int] = set()
+        c = 0
+        now = timezone.now()
+        with transaction.atomic(using="takahe"):
+            follows = dict(
+                Follow.objects.filter(
+                    source_id=identity_pk, target_id__in=following
+                ).values_list("target_id", "state")
+            )
+            new_follows = []
+            for target_pk in following - follows.keys():
+                follow = Follow(
+                    source_id=identity_pk,
+                    target_id=target_pk,
+                    boosts=True,
+                    state="accepted",
+                )
+                follow.uri = source.actor_uri + f"follow/{follow.pk}/"
+                new_follows.append(follow)
+            Follow.objects.bulk_create(new_follows)
+            pending = [t for t, state in follows.items() if state != "accepted"]
+            Follow.objects.filter(source_id=identity_pk, target_id__in=pending).update(
+                state="accepted", updated=now
+            )
+            changed.update(f.target_id for f in new_follows)
+            changed.update(pending)
+            c += len(new_follows) + len(pending)
+
+            for targets, is_mute in [(blocking, False), (muting, True)]:
+                blocks = {
+                    b.target_id: b
+                    for b in Block.objects.filter(
+                        source_id=identity_pk, target_id__in=targets, mute=is_mute
+                    )
+                }
+                renewed = [
+                    b
+                    for b in blocks.values()
+                    if b.state not in ["new", "sent", "awaiting_expiry"]
+                ]
+                new_blocks = Block.objects.bulk_create(
+                    [
+                        Block(
+                            source_id=identity_pk,
+                            target_id=target_pk,
+                            mute=is_mute,
+                            state="new",
+                        )
+                        for target_pk in targets - blocks.keys()
+                    ]
+                )
+                for block in renewed + new_blocks:
+                    block.state = "new"
+                    block.uri = source.actor_uri + f"block/{block.pk}/"
+                    block.updated = now
+                Block.objects.bulk_update(
+                    renewed + new_blocks, ["state", "uri", "updated"]
+                )
+                added = {b.target_id for b in renewed + new_blocks}
+                if not is_mute and added:
+                    Follow.objects.filter(
+                        source_id=identity_pk, target_id__in=added
+                    ).exclude(state="undone").update(state="undone", updated=now)
+                    Follow.objects.filter(
+                        source_id__in=added, target_id=identity_pk
+                    ).exclude(state="rejecting").update(state="rejecting", updated=now)
+                changed.update(added)
+                c += len(added)
+        if changed:
+            Takahe.clear_relationship_cache(identity_pk, *changed)
+        return c
+
     @staticmethod
     def _force_state_cycle():  # for unit testing only
         Follow.objects.filter(
@@ -492,6 +633,10 @@ class Takahe:
             .prefetch_related("author", "attachments")
         )
 
+    @staticmethod
+    def get_posts_by_pks(post_pks: list[int]) -> dict[int, Post]:
+        return Post.objects.in_bulk(post_pks)
+
     @staticmethod
     def get_post_url(post_pk: int) -> str | None:
         post = Post.objects.filter(pk=post_pk).first() if post_pk else None
@@ -670,6 +815,27 @@ class Takahe:
             post=post,
         ).first()
 
+    @staticmethod
+    def prefetch_post_interactions(posts: list[Post], identity_pk: int):
+        """
+        set liked_by_current_user / boosted_by_current_user of posts in one query,
+        so they can be rendered without checking interactions one by one
+        """
+        posts = [p for p in posts if p]
+        if not posts:
+            return
+        interactions = set(
+            PostInteraction.objects.filter(
+                identity_id=identity_pk,
+                post_id__in=[p.pk for p in posts],
+                type__in=["like", "boost"],
+                state__in=["new", "fanned_out"],
+            ).values_list("post_id", "type")
+        )
+        for post in posts:
+            post.liked_by_current_user = (post.pk, "like") in interactions
+            post.boosted_by_current_user = (post.pk, "boost") in interactions
+
     @staticmethod
     def get_post_stats(post_pk: int) -> dict:
         post = Post.objects.filter(pk=post_pk).first()
@@ -953,6 +1119,53 @@ class Takahe:
     def get_token(token: str) -> Token | None:
         return Token.objects.filter(token=token).first()
 
+    @staticmethod
+    def get_token_auth_cache_key(token: str) -> str:
+        # tokens are hashed so that they are not exposed in cache
+        return _TOKEN_AUTH_CACHE_KEY.format(hashlib.sha256(token.encode()).hexdigest())
+
+    @staticmethod
+    def clear_token_auth_cache(*tokens: str):
+        cache.delete_many([Takahe.get_token_auth_cache_key(t) for t in tokens])
+
+    @staticmethod
+    def clear_identity_token_auth_cache(*identity_pks: int):
+        Takahe.clear_token_auth_cache(
+            *Token.objects.filter(identity_id__in=identity_pks).values_list(
+                "token", flat=True
+            )
+        )
+
+    @staticmethod
+    def _token_changed_handler(sender, instance, **kwargs):
+        Takahe.clear_token_auth_cache(instance.token)
+
+    @staticmethod
+    def _identity_changed_handler(sender, instance, **kwargs):
+        Takahe.clear_identity_token_auth_cache(instance.pk)
+
+    @staticmethod
+    def _user_changed_handler(sender, instance, **kwargs):
+        from users.models import APIdentity
+
+        Takahe.clear_identity_token_auth_cache(
+            *APIdentity.objects.filter(user_id=instance.pk).values_list("pk", flat=True)
+        )
+
+    @staticmethod
+    def register_token_model():
+        """
+        clear cached auth of tokens when they, or their identities or users,
+        are changed or deleted in this process
+        """
+        post_save.connect(Takahe._token_changed_handler, sender=Token)
+        post_delete.connect(Takahe._token_changed_handler, sender=Token)
+        post_save.connect(Takahe._identity_changed_handler, sender="users.APIdentity")
+        post_delete.connect(Takahe._identity_changed_handler, sender="users.APIdentity")
+        post_save.connect(Takahe._user_changed_handler, sender="users.User")
+        # before the identity is detached from the deleted user
+        pre_delete.connect(Takahe._user_changed_handler, sender="users.User")
+
     @staticmethod
     def bookmark(post_pk: int, identity_pk: int):
         Bookmark.objects.get_or_create(post_id=post_pk, identity_id=identity_pk)
@@ -21,3 +21,14 @@ class LanguageMiddleware(LocaleMiddleware):
     def process_request(self, request):
         user = getattr(request, "user", None)
         request.LANGUAGE_CODE = activate_language_for_user(user, request)
+
+
+class RelationshipSnapshotMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from .models.apidentity import relationship_snapshot
+
+        with relationship_snapshot():
+            return self.get_response(request)
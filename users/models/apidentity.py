@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import cached_property
 
 from django.conf import settings
@@ -10,6 +12,23 @@ from takahe.utils import Takahe
 from .preference import Preference
 from .user import User
 
+_relationship_snapshots: ContextVar[dict[int, dict[str, list[int]]] | None] = (
+    ContextVar("relationship_snapshots", default=None)
+)
+
+
+@contextmanager
+def relationship_snapshot():
+    """
+    relationships of each identity are loaded once and reused within this context,
+    this is used for each web request so that visibility checks do not repeat queries
+    """
+    token = _relationship_snapshots.set({})
+    try:
+        yield
+    finally:
+        _relationship_snapshots.reset(token)
+
 
 class APIdentity(models.Model):
     """
@@ -110,9 +129,25 @@ class APIdentity(models.Model):
         else:
             return f"{self.username}@{self.domain_name}"
 
+    @property
+    def relationships(self) -> dict[str, list[int]]:
+        snapshots = _relationship_snapshots.get()
+        if snapshots is None:
+            return Takahe.get_relationship_ids(self.pk)
+        if self.pk not in snapshots:
+            snapshots[self.pk] = Takahe.get_relationship_ids(self.pk)
+        return snapshots[self.pk]
+
+    @staticmethod
+    def _relationships_changed(*identities: "APIdentity"):
+        snapshots = _relationship_snapshots.get()
+        if snapshots:
+            for i in identities:
+                snapshots.pop(i.pk, None)
+
     @property
     def following(self):
-        return Takahe.get_following_ids(self.pk)
+        return self.relationships["following"]
 
     @property
     def followers(self):
@@ -120,11 +155,11 @@ class APIdentity(models.Model):
 
     @property
     def muting(self):
-        return Takahe.get_muting_ids(self.pk)
+        return self.relationships["muting"]
 
     @property
     def blocking(self):
-        return Takahe.get_blocking_ids(self.pk)
+        return self.relationships["blocking"]
 
     @property
     def following_identities(self):
@@ -152,7 +187,8 @@ class APIdentity(models.Model):
 
     @property
     def rejecting(self):
-        return Takahe.get_rejecting_ids(self.pk)
+        r = self.relationships
+        return list(set(r["blocking"] + r["blocked_by"]))
 
     @property
     def ignoring(self):
@@ -160,9 +196,11 @@ class APIdentity(models.Model):
 
     def follow(self, target: "APIdentity", force_accept: bool = False):
         Takahe.follow(self.pk, target.pk, force_accept)
+        self._relationships_changed(self, target)
 
     def unfollow(self, target: "APIdentity"):  # this also cancels follow request
         Takahe.unfollow(self.pk, target.pk)
+        self._relationships_changed(self, target)
 
     @property
     def requested_followers(self):
@@ -174,21 +212,27 @@ class APIdentity(models.Model):
 
     def accept_follow_request(self, target: "APIdentity"):
         Takahe.accept_follow_request(target.pk, self.pk)
+        self._relationships_changed(self, target)
 
     def reject_follow_request(self, target: "APIdentity"):
         Takahe.reject_follow_request(target.pk, self.pk)
+        self._relationships_changed(self, target)
 
     def block(self, target: "APIdentity"):
         Takahe.block(self.pk, target.pk)
+        self._relationships_changed(self, target)
 
     def unblock(self, target: "APIdentity"):
         Takahe.unblock(self.pk, target.pk)
+        self._relationships_changed(self, target)
 
     def mute(self, target: "APIdentity"):
         Takahe.mute(self.pk, target.pk)
+        self._relationships_changed(self, target)
 
     def unmute(self, target: "APIdentity"):
         Takahe.unmute(self.pk, target.pk)
+        self._relationships_changed(self, target)
 
     def is_rejecting(self, target: "APIdentity"):
         return self != target and (
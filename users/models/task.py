@@ -1,3 +1,5 @@
+import time
+
 import django_rq
 from auditlog.context import set_actor
 from django.db import models
@@ -12,6 +14,8 @@ class Task(models.Model):
     TaskQueue = "default"
     TaskType = "unknown"
     DefaultMetadata = {}
+    ProgressInterval = 5  # seconds between saving progress
+    ProgressRows = 100  # number of updates between saving progress
 
     class States(models.IntegerChoices):
         pending = 0, _("Pending")  # type:ignore[reportCallIssue]
@@ -64,14 +68,14 @@ class Task(models.Model):
             with set_actor(task.user):
                 task.run()
             task.state = cls.States.complete
-            task.save(update_fields=["state"])
+            task.save(update_fields=["state", "metadata", "message"])
         except Exception as e:
             logger.error(
                 f"error running {cls.__name__}", extra={"exception": e, "task": task_id}
             )
             task.message = "Error occured."
             task.state = cls.States.failed
-            task.save(update_fields=["state", "message"])
+            task.save(update_fields=["state", "metadata", "message"])
         task = cls.objects.get(pk=task_id)
         if task.message:
             if task.state == cls.States.complete:
@@ -79,5 +83,26 @@ class Task(models.Model):
             else:
                 msg.error(task.user, f"[{task.type}] {task.message}")
 
+    def save_progress(self, force: bool = False):
+        """
+        save metadata and message changed by subclass during run()
+
+        to avoid writing on every update, they are saved only if ProgressInterval seconds
+        or ProgressRows calls passed since last save, unless forced;
+        _run() saves them when task is finished, so the final state is always persisted.
+        """
+        now = time.monotonic()
+        last_saved = getattr(self, "_progress_saved_time", None)
+        self._progress_pending = getattr(self, "_progress_pending", 0) + 1
+        if (
+            force
+            or last_saved is None
+            or self._progress_pending >= self.ProgressRows
+            or now - last_saved >= self.ProgressInterval
+        ):
+            self.save(update_fields=["metadata", "message"])
+            self._progress_saved_time = now
+            self._progress_pending = 0
+
     def run(self) -> None:
         raise NotImplementedError("subclass must implement this")
@@ -271,9 +271,12 @@ class User(AbstractUser):
         if skip_graph:
             return
         if not self.preference.mastodon_skip_relationship:
-            c = 0
+            # relationships from all accounts are merged and synced at once
+            graph: dict[str, set[int]] = {}
             for account in self.social_accounts.all():
-                c += account.sync_graph()
+                for k, ids in account.get_graph_identity_ids().items():
+                    graph.setdefault(k, set()).update(ids)
+            c = Takahe.sync_relationships(self.identity.pk, **graph) if graph else 0
             if c:
                 logger.debug(f"{self} graph updated with {c} new relationship.")
 
@@ -1,10 +1,14 @@
 from django.conf import settings
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
 
+from common.api import OAuthAccessTokenAuth
 from mastodon.models import MastodonAccount
+from takahe.models import Token
 from takahe.utils import Takahe
 
 from .models import *
+from .models.apidentity import relationship_snapshot
 
 
 class UserTest(TestCase):
@@ -72,6 +76,41 @@ class UserTest(TestCase):
         self.assertEqual(self.alice.rejecting, [])
         self.assertEqual(self.alice.ignoring, [])
 
+    def test_relationship_snapshot(self):
+        self.alice.follow(self.bob, force_accept=True)
+        self.alice.mute(self.bob)
+        with relationship_snapshot():
+            with self.assertNumQueries(2, using="takahe"):
+                self.assertEqual(self.alice.following, [self.bob.pk])
+                self.assertEqual(self.alice.ignoring, [self.bob.pk])
+                self.assertEqual(self.alice.rejecting, [])
+            self.alice.unmute(self.bob)
+            self.assertEqual(self.alice.ignoring, [])
+            self.alice.block(self.bob)
+            self.assertEqual(self.alice.following, [])
+            self.assertEqual(self.alice.rejecting, [self.bob.pk])
+            self.assertEqual(self.bob.rejecting, [self.alice.pk])
+
+    def test_sync_relationships(self):
+        carol = User.register(username="carol").identity
+        self.bob.follow(self.alice, force_accept=True)
+        c = Takahe.sync_relationships(
+            self.alice.pk,
+            following={self.bob.pk, carol.pk},
+            blocking={self.bob.pk},
+            muting={carol.pk},
+        )
+        self.assertEqual(c, 3)
+        Takahe._force_state_cycle()
+        self.assertEqual(self.alice.following, [carol.pk])
+        self.assertTrue(self.alice.is_blocking(self.bob))
+        self.assertTrue(self.alice.is_muting(carol))
+        self.assertEqual(self.bob.following, [])
+        c = Takahe.sync_relationships(
+            self.alice.pk, following={carol.pk}, muting={carol.pk}
+        )
+        self.assertEqual(c, 0)
+
     # def test_external_domain_block(self):
     #     self.alice.mastodon_domain_blocks.append(self.bob.mastodon_site)
     #     self.alice.save()
@@ -89,3 +128,56 @@ class UserTest(TestCase):
     #     self.assertFalse(self.alice.is_blocking(self.bob))
     #     self.assertFalse(self.bob.is_blocked_by(self.alice))
     #     self.assertEqual(self.alice.merged_rejecting_ids(), [])
+
+
+class TaskTest(TestCase):
+    databases = "__all__"
+
+    def test_save_progress(self):
+        user = User.register(username="alice")
+        task = Task.objects.create(user=user, type="test", metadata={"processed": 0})
+        task.ProgressInterval = 3600
+        task.ProgressRows = 3
+        for i in range(1, 6):
+            task.metadata["processed"] = i
+            task.save_progress()
+            saved = Task.objects.get(pk=task.pk).metadata["processed"]
+            self.assertEqual(saved, {1: 1, 2: 1, 3: 1, 4: 4, 5: 4}[i])
+        task.save_progress(force=True)
+        self.assertEqual(Task.objects.get(pk=task.pk).metadata["processed"], 5)
+
+
+class APIAuthTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = User.register(username="alice")
+        app = Takahe.get_or_create_app(
+            "Test", "https://example.org", "", owner_pk=0, client_id="app-test"
+        )
+        self.token = Takahe.refresh_token(app, self.user.identity.pk, self.user.pk)
+        self.auth = OAuthAccessTokenAuth()
+
+    def authenticate(self):
+        request = RequestFactory().get("/api/me")
+        return self.auth.authenticate(request, self.token), request
+
+    def test_cached_token(self):
+        self.assertTrue(self.authenticate()[0])
+        with self.assertNumQueries(0), self.assertNumQueries(0, using="takahe"):
+            ok, request = self.authenticate()
+        self.assertTrue(ok)
+        self.assertEqual(request.user.pk, self.user.pk)
+
+    def test_revoked_token(self):
+        self.assertTrue(self.authenticate()[0])
+        tk = Token.objects.get(token=self.token)
+        tk.revoked = timezone.now()
+        tk.save()
+        self.assertFalse(self.authenticate()[0])
+
+    def test_inactive_user(self):
+        self.assertTrue(self.authenticate()[0])
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.authenticate()[0])